@@ -0,0 +1,125 @@
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.db.models import Q
+from django.utils.timezone import now
+
+from .models import ApiKeyIngestionSettings
+
+# Verified keys are remembered per worker process; other workers see a deactivation
+# at the latest after this many seconds.
+CACHE_TTL_SECONDS = 60
+# Keys that matched nothing are remembered for as long, so resending a bad key costs no hashing.
+# Anyone can add entries, so the cache is emptied once it holds this many.
+MISSED_KEYS_MAX_ENTRIES = 10000
+# Scans of the legacy PBKDF2 hashes a worker process runs per minute at most. A legacy key takes
+# the indexed digest path once it was used, so only keys unused since then can be turned away.
+LEGACY_SCANS_PER_MINUTE = 30
+
+_verified_keys = {}
+_missed_keys = {}
+_legacy_scans = deque()
+_verified_keys_lock = threading.Lock()
+
+
+def _digest(raw_key: str) -> str:
+    return hmac.new(settings.API_KEY_HMAC_SECRET.encode(), raw_key.encode(), hashlib.sha256).hexdigest()
+
+
+def generate_api_key() -> tuple:
+    """
+    Returns (raw_key, key_prefix, key_digest). The raw key is '<prefix>.<secret>';
+    only the prefix and the keyed digest are stored.
+    """
+    key_prefix = secrets.token_hex(6)
+    raw_key = f"{key_prefix}.{secrets.token_urlsafe(24)}"
+    return raw_key, key_prefix, _digest(raw_key)
+
+
+def evict_api_key(setting_id: int):
+    with _verified_keys_lock:
+        for digest in [d for d, entry in _verified_keys.items() if entry[0] == setting_id]:
+            del _verified_keys[digest]
+        # The setting may now accept a key that missed before
+        _missed_keys.clear()
+
+
+def _remember_miss(digest: str):
+    with _verified_keys_lock:
+        if len(_missed_keys) >= MISSED_KEYS_MAX_ENTRIES:
+            _missed_keys.clear()
+        _missed_keys[digest] = time.monotonic()
+
+
+def _legacy_scan_allowed() -> bool:
+    started = time.monotonic()
+    with _verified_keys_lock:
+        while _legacy_scans and started - _legacy_scans[0] >= 60:
+            _legacy_scans.popleft()
+        if len(_legacy_scans) >= LEGACY_SCANS_PER_MINUTE:
+            return False
+        _legacy_scans.append(started)
+        return True
+
+
+def _usable_settings():
+    today = now().date()
+    return ApiKeyIngestionSettings.objects.filter(is_active=True).filter(
+        Q(expiration_date__isnull=True) | Q(expiration_date__gte=today)
+    )
+
+
+def _find_legacy_setting(raw_key: str, digest: str):
+    # Keys issued before prefixes existed are only stored as PBKDF2 hashes. The first
+    # successful use records their digest, so later requests take the indexed path.
+    setting = _usable_settings().filter(key_prefix__isnull=True, key_digest=digest).first()
+    if setting:
+        return setting
+
+    # Turned away without remembering a miss, as the key was not checked
+    if not _legacy_scan_allowed():
+        return None
+    for setting in _usable_settings().filter(key_prefix__isnull=True, key_digest='').only('id', 'api_key'):
+        if check_password(raw_key, setting.api_key):
+            ApiKeyIngestionSettings.objects.filter(id=setting.id).update(key_digest=digest)
+            return _usable_settings().get(id=setting.id)
+    _remember_miss(digest)
+    return None
+
+
+def resolve_api_key(raw_key: str):
+    """Returns the plant id the key grants ingestion access to, or None."""
+    digest = _digest(raw_key)
+    today = now().date()
+
+    with _verified_keys_lock:
+        entry = _verified_keys.get(digest)
+        missed_at = _missed_keys.get(digest)
+    if missed_at is not None and time.monotonic() - missed_at < CACHE_TTL_SECONDS:
+        return None
+    if entry:
+        setting_id, plant_id, expiration_date, cached_at = entry
+        if time.monotonic() - cached_at < CACHE_TTL_SECONDS and (expiration_date is None or expiration_date >= today):
+            return plant_id
+        evict_api_key(setting_id)
+
+    if '.' in raw_key:
+        key_prefix = raw_key.split('.', 1)[0]
+        setting = _usable_settings().filter(key_prefix=key_prefix).first()
+        if setting is None or not hmac.compare_digest(setting.key_digest, digest):
+            _remember_miss(digest)
+            return None
+    else:
+        setting = _find_legacy_setting(raw_key, digest)
+        if setting is None:
+            return None
+
+    with _verified_keys_lock:
+        _verified_keys[digest] = (setting.id, setting.plant_id, setting.expiration_date, time.monotonic())
+    return setting.plant_id
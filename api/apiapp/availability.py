@@ -0,0 +1,40 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+
+# Same key as ALERTLOG_WRITE_LOCK in the data unit's alert_rules; alert writes hold it shared until they commit
+ALERTLOG_WRITE_LOCK = 7315002
+
+
+def rebuild_availability(plant_ids=None) -> int:
+    """
+    Recomputes the daily availability counters of the given plants, or of every plant, from their
+    valid alerts. Alert writes wait until the rebuild commits. Returns the counter rows written.
+
+    The counters outlive AlertLog retention, so days before its cutoff keep their counts and are
+    only filled in where they have none.
+    """
+    scope = "plant_id = ANY(%(plant_ids)s)" if plant_ids else "TRUE"
+    params = {"plant_ids": list(plant_ids or []), "cutoff": date.min}
+    if settings.ALERTLOG_RETENTION_DAYS > 0:
+        params["cutoff"] = date.today() - timedelta(days=settings.ALERTLOG_RETENTION_DAYS)
+
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", [ALERTLOG_WRITE_LOCK])
+        cur.execute(f"DELETE FROM apiapp_plantavailabilityday WHERE {scope} AND day >= %(cutoff)s", params)
+        cur.execute(f"""
+            INSERT INTO apiapp_plantavailabilityday (plant_id, day, ok_count, triggered_count)
+            SELECT
+                plant_id,
+                read_date,
+                COUNT(*) FILTER (WHERE status = 'ok'),
+                COUNT(*) FILTER (WHERE status = 'triggered')
+            FROM apiapp_alertlog
+            WHERE is_valid = TRUE
+              AND status IN ('ok', 'triggered')
+              AND {scope}
+            GROUP BY 1, 2
+            ON CONFLICT (plant_id, day) DO NOTHING
+        """, params)
+        return cur.rowcount
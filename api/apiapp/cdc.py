@@ -0,0 +1,143 @@
+import csv
+import hashlib
+import json
+import os
+from datetime import date, datetime
+from itertools import islice
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import Q
+from django.utils.timezone import now
+
+from .models import PlantData, IngestionQueueItem, IngestionIdempotencyKey
+
+NUMERIC_COLUMNS = [
+    "total_string_capacity_kwp",
+    "yield_kwh",
+    "total_yield_kwh",
+    "specific_energy_kwh_per_kwp",
+    "peak_ac_power_kw",
+    "grid_connection_duration_h",
+]
+
+# Bigger payloads are not checked in the request; the loader still skips their unchanged rows
+MAX_CHECK_BYTES = 256 * 1024
+MAX_CHECK_ROWS = 500
+
+
+def row_content_hash(plant_id: int, values: list, read_date: date) -> str:
+    # Must stay identical to row_content_hash in the data unit's csv_db_write
+    canonical = "|".join([str(plant_id), *(repr(value) for value in values), read_date.isoformat()])
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _row_key(entry: dict, today: date):
+    try:
+        plant_id = int(entry.get("plant_id"))
+        values = [float(entry.get(column)) for column in NUMERIC_COLUMNS]
+
+        read_date = entry.get("read_date") or today
+        if isinstance(read_date, datetime):
+            read_date = read_date.date()
+        elif not isinstance(read_date, date):
+            read_date = date.fromisoformat(str(read_date).strip()[:10])
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+    return plant_id, read_date, row_content_hash(plant_id, values, read_date)
+
+
+def _staged_rows(path: str, file_type: str, plant_id: int):
+    # Defaults plant_id like iter_staged_rows in the data unit's file_handling: where a CSV cell is
+    # empty, but only where a JSON object has no such key
+    if file_type == "csv":
+        with open(path, newline='') as csvfile:
+            for row in csv.DictReader(csvfile):
+                if not row.get("plant_id"):
+                    row["plant_id"] = plant_id
+                yield row
+    else:
+        with open(path) as jsonfile:
+            data = json.load(jsonfile)
+        for row in ([data] if isinstance(data, dict) else data):
+            if isinstance(row, dict) and "plant_id" not in row:
+                row["plant_id"] = plant_id
+            yield row
+
+
+def payload_is_unchanged(payload_ref: str, file_type: str, plant_id: int) -> bool:
+    """
+    True when the staged payload is the latest one queued for the plant, or when nothing is
+    queued for its plants and every row in it matches the content hash of the valid PlantData
+    row stored for its (plant_id, read_date).
+    """
+    queued = IngestionQueueItem.objects.filter(status__in=['pending', 'claimed'])
+    latest_ref = queued.filter(plant_id=plant_id).order_by('-id').values_list('payload_ref', flat=True).first()
+    if latest_ref is not None:
+        # An earlier payload queued again after a different one must be loaded again, or the other one would win
+        return latest_ref == payload_ref
+
+    path = os.path.join(settings.PAYLOAD_STAGING_DIR, payload_ref)
+    if os.path.getsize(path) > MAX_CHECK_BYTES:
+        return False
+
+    today = now().date()
+    hashes = {}
+    try:
+        rows = list(islice(_staged_rows(path, file_type, plant_id), MAX_CHECK_ROWS + 1))
+    except (ValueError, UnicodeDecodeError, csv.Error):
+        return False
+    if not rows or len(rows) > MAX_CHECK_ROWS:
+        return False
+
+    for entry in rows:
+        key = _row_key(entry, today) if isinstance(entry, dict) else None
+        if key is None:
+            return False
+        row_plant_id, read_date, content_hash = key
+        # Later rows for the same day win, as in the loader
+        hashes[(row_plant_id, read_date)] = content_hash
+
+    # Rows may name other plants, whose stored data may be about to change as well
+    if queued.filter(plant_id__in={row_plant_id for row_plant_id, _ in hashes}).exists():
+        return False
+
+    matches = Q()
+    for (row_plant_id, read_date), content_hash in hashes.items():
+        matches |= Q(plant_id=row_plant_id, read_date=read_date, content_hash=content_hash)
+
+    unchanged = (
+        PlantData.objects.filter(matches, is_valid=True)
+        .values('plant_id', 'read_date')
+        .distinct()
+        .count()
+    )
+    return unchanged == len(hashes)
+
+
+def discard_unreferenced_payload(payload_ref: str):
+    if IngestionQueueItem.objects.filter(payload_ref=payload_ref, status__in=['pending', 'claimed']).exists():
+        return
+    try:
+        os.remove(os.path.join(settings.PAYLOAD_STAGING_DIR, payload_ref))
+    except FileNotFoundError:
+        pass
+
+
+def replay_idempotent_response(plant_id: int, key: str):
+    """Returns (status, body) stored for a previous request with the same Idempotency-Key, or None."""
+    stored = IngestionIdempotencyKey.objects.filter(plant_id=plant_id, key=key).first()
+    if stored is None:
+        return None
+    return stored.response_status, stored.response_body
+
+
+def remember_idempotent_response(plant_id: int, key: str, response_status: int, response_body: dict):
+    try:
+        IngestionIdempotencyKey.objects.create(
+            plant_id=plant_id, key=key, response_status=response_status, response_body=response_body
+        )
+    except IntegrityError:
+        # A concurrent retry with the same key got there first; its response stands
+        pass
@@ -0,0 +1,251 @@
+import json
+import logging
+import threading
+import time
+
+import requests
+import yaml
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+LAUNCH_MUTATION = """
+mutation LaunchPipelineExecution($executionParams: ExecutionParams!) {
+  launchPipelineExecution(executionParams: $executionParams) {
+    __typename
+    ... on LaunchRunSuccess {
+      run {
+        runId
+        pipelineName
+        __typename
+      }
+      __typename
+    }
+    ... on RunConfigValidationInvalid {
+      errors {
+        message
+        __typename
+      }
+      __typename
+    }
+    ... on PythonError {
+      message
+      stack
+      __typename
+    }
+  }
+}
+"""
+
+# Gateway errors mean the webserver never processed the mutation, so retrying cannot
+# launch the same run twice. Read timeouts are not retried for the same reason.
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+
+
+class DagsterLaunchError(Exception):
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details
+
+
+class DagsterUnavailableError(DagsterLaunchError):
+    pass
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and lets one trial call through after `reset_after_s`."""
+
+    def __init__(self, failure_threshold: int, reset_after_s: float):
+        self.failure_threshold = failure_threshold
+        self.reset_after_s = reset_after_s
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_after_s:
+                # Half-open: the next failure re-opens the breaker straight away
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def state(self) -> str:
+        with self.lock:
+            return "closed" if self.opened_at is None else "open"
+
+
+class LaunchMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.launches = 0
+        self.failures = 0
+        self.rejected = 0
+        self.retries = 0
+        self.total_latency_s = 0.0
+        self.max_latency_s = 0.0
+        self.last_latency_s = None
+
+    def record(self, latency_s: float, ok: bool, retries: int):
+        with self.lock:
+            self.launches += 1
+            self.retries += retries
+            if not ok:
+                self.failures += 1
+            self.total_latency_s += latency_s
+            self.max_latency_s = max(self.max_latency_s, latency_s)
+            self.last_latency_s = latency_s
+
+    def record_rejected(self):
+        with self.lock:
+            self.rejected += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "launches": self.launches,
+                "failures": self.failures,
+                "rejected_by_circuit_breaker": self.rejected,
+                "retries": self.retries,
+                "avg_latency_ms": round(self.total_latency_s / self.launches * 1000, 1) if self.launches else None,
+                "max_latency_ms": round(self.max_latency_s * 1000, 1),
+                "last_latency_ms": round(self.last_latency_s * 1000, 1) if self.last_latency_s is not None else None,
+            }
+
+
+class DagsterLauncher:
+    def __init__(self, graphql_url, connect_timeout_s, read_timeout_s, max_retries, backoff_s,
+                 failure_threshold, reset_after_s, pool_size=10):
+        self.graphql_url = graphql_url
+        self.timeout = (connect_timeout_s, read_timeout_s)
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.breaker = CircuitBreaker(failure_threshold, reset_after_s)
+        self.metrics = LaunchMetrics()
+
+        # One keep-alive session per worker process, shared by all request threads
+        self.session = requests.Session()
+        self.session.headers.update({'Content-Type': 'application/json'})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, payload: str):
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(self.graphql_url, data=payload, timeout=self.timeout)
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                    return response, attempt
+            except requests.exceptions.ConnectionError as e:
+                if attempt >= self.max_retries:
+                    e.retries = attempt
+                    raise
+            attempt += 1
+            time.sleep(self.backoff_s * (2 ** (attempt - 1)))
+
+    def launch_job(self, job_name: str, run_config: dict) -> dict:
+        if not self.breaker.allow():
+            self.metrics.record_rejected()
+            raise DagsterUnavailableError("Data unit is unavailable, try again later")
+
+        payload = json.dumps({
+            "query": LAUNCH_MUTATION,
+            "variables": {
+                "executionParams": {
+                    "selector": {
+                        "jobName": job_name,
+                        "repositoryName": "__repository__",
+                        "repositoryLocationName": "dagster_app",
+                        "assetSelection": [],
+                        "assetCheckSelection": []
+                    },
+                    "runConfigData": yaml.safe_dump(run_config),
+                    "mode": "default",
+                    "executionMetadata": {
+                        "tags": []
+                    }
+                }
+            }
+        })
+
+        started = time.monotonic()
+        retries = 0
+        try:
+            response, retries = self._post(payload)
+            response.raise_for_status()
+            dagster_response = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            retries = getattr(e, 'retries', retries)
+            self.breaker.record_failure()
+            self.metrics.record(time.monotonic() - started, False, retries)
+            logger.warning("Dagster launch of %s failed: %s", job_name, e)
+            raise DagsterUnavailableError("Failed to trigger processing job", str(e))
+
+        # The webserver answered, so it is healthy even if the launch itself was rejected
+        self.breaker.record_success()
+        latency = time.monotonic() - started
+        launch_resp = (dagster_response.get('data') or {}).get('launchPipelineExecution', {})
+        ok = 'errors' not in dagster_response and launch_resp.get('__typename') == 'LaunchRunSuccess'
+        self.metrics.record(latency, ok, retries)
+        logger.info("Dagster launch of %s took %.0f ms (%s)", job_name, latency * 1000, launch_resp.get('__typename'))
+
+        if 'errors' in dagster_response:
+            raise DagsterLaunchError("Failed to trigger processing job", dagster_response['errors'])
+        if not ok:
+            raise DagsterLaunchError("Processing job failed", launch_resp)
+        return launch_resp
+
+
+_launcher = None
+_launcher_lock = threading.Lock()
+
+
+def get_launcher() -> DagsterLauncher:
+    global _launcher
+    with _launcher_lock:
+        if _launcher is None:
+            _launcher = DagsterLauncher(
+                graphql_url=settings.DAGSTER_GRAPHQL_URL,
+                connect_timeout_s=settings.DAGSTER_CONNECT_TIMEOUT_S,
+                read_timeout_s=settings.DAGSTER_READ_TIMEOUT_S,
+                max_retries=settings.DAGSTER_LAUNCH_RETRIES,
+                backoff_s=settings.DAGSTER_LAUNCH_BACKOFF_S,
+                failure_threshold=settings.DAGSTER_BREAKER_FAILURES,
+                reset_after_s=settings.DAGSTER_BREAKER_RESET_S,
+            )
+        return _launcher
+
+
+def launch_ingestion_run(payload_ref: str, file_type: str, plant_id: int) -> dict:
+    return get_launcher().launch_job("file_ingestion_pipeline", {
+        "ops": {
+            "ingest_file_asset": {
+                "config": {
+                    "payload_ref": payload_ref,
+                    "file_type": file_type,
+                    "plant_id": plant_id
+                }
+            }
+        }
+    })
+
+
+def launch_metrics() -> dict:
+    launcher = get_launcher()
+    return {**launcher.metrics.snapshot(), "circuit_breaker": launcher.breaker.state}
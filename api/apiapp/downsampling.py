@@ -0,0 +1,36 @@
+def lttb_indices(x: list, y: list, threshold: int) -> list:
+    """
+    Largest-Triangle-Three-Buckets: the indices of at most `threshold` points of the series
+    (x ascending) that keep its visual shape. The first and last points are always kept.
+    """
+    n = len(x)
+    if threshold < 3 or threshold >= n:
+        return list(range(n))
+
+    # Every bucket but the first and last holds `every` points and contributes one of them
+    every = (n - 2) / (threshold - 2)
+    indices = [0]
+    selected = 0
+
+    for bucket in range(threshold - 2):
+        # The next bucket is represented by its average point
+        next_start = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, n)
+        avg_x = sum(x[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(y[next_start:next_end]) / (next_end - next_start)
+
+        # Keep the point of this bucket that forms the largest triangle with the last kept point and that average
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        ax, ay = x[selected], y[selected]
+        best, best_area = start, -1.0
+        for i in range(start, end):
+            area = abs((ax - avg_x) * (y[i] - ay) - (ax - x[i]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = i, area
+
+        indices.append(best)
+        selected = best
+
+    indices.append(n - 1)
+    return indices
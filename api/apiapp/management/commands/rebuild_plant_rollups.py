@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apiapp.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recomputes the weekly, monthly and yearly PlantData rollups from the valid PlantData rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plant', type=int, action='append', dest='plant_ids',
+                            help="Only rebuild this plant; may be given several times.")
+
+    def handle(self, *args, plant_ids=None, **options):
+        written = rebuild_rollups(plant_ids)
+        scope = f"plants {', '.join(map(str, plant_ids))}" if plant_ids else "all plants"
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} rollup rows for {scope}"))
@@ -0,0 +1,129 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:35
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('is_superuser', models.BooleanField(default=False, help_text='Designates that this user has all permissions without explicitly assigning them.', verbose_name='superuser status')),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('first_name', models.CharField(max_length=150)),
+                ('last_name', models.CharField(max_length=150)),
+                ('address', models.CharField(max_length=255)),
+                ('city', models.CharField(max_length=100)),
+                ('country', models.CharField(max_length=100)),
+                ('is_active', models.BooleanField(default=True)),
+                ('is_staff', models.BooleanField(default=False)),
+                ('is_email_confirmed', models.BooleanField(default=False)),
+                ('groups', models.ManyToManyField(blank=True, help_text='The groups this user belongs to. A user will get all permissions granted to each of their groups.', related_name='user_set', related_query_name='user', to='auth.group', verbose_name='groups')),
+                ('user_permissions', models.ManyToManyField(blank=True, help_text='Specific permissions for this user.', related_name='user_set', related_query_name='user', to='auth.permission', verbose_name='user permissions')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Plant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ingestion_type', models.CharField(choices=[('API', 'API Key'), ('AWS', 'AWS File System')], max_length=10)),
+                ('plant_name', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('devices_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='plant_settings', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Device',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('serial_number', models.CharField(blank=True, max_length=100)),
+                ('device_type', models.CharField(choices=[('inverter', 'Inverter'), ('meter', 'Meter'), ('sensor', 'Sensor')], max_length=50)),
+                ('is_active', models.BooleanField(default=True)),
+                ('plant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='devices', to='apiapp.plant')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AwsIngestionSettings',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_name', models.CharField(max_length=255)),
+                ('region', models.CharField(max_length=100)),
+                ('access_key_id', models.CharField(max_length=255)),
+                ('secret_access_key', models.CharField(max_length=255)),
+                ('file_prefix', models.CharField(blank=True, help_text='Optional path prefix inside the bucket', max_length=255)),
+                ('polling_interval_minutes', models.PositiveIntegerField(default=60)),
+                ('plant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='aws_settings', to='apiapp.plant')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ApiKeyIngestionSettings',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('api_key', models.CharField(blank=True, max_length=256)),
+                ('expiration_date', models.DateField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('plant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='api_settings', to='apiapp.plant')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AlarmPlant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('threshold_value', models.FloatField()),
+                ('metric_type', models.CharField(choices=[('yield', 'Yield (kWh)'), ('power', 'Peak AC Power (kW)'), ('specific_energy', 'Specific Energy (kWh/kWp)')], max_length=50)),
+                ('last_alarm_triggered', models.DateTimeField(blank=True, null=True)),
+                ('plant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='alarm_settings', to='apiapp.plant')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PlantData',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_string_capacity_kwp', models.FloatField()),
+                ('yield_kwh', models.FloatField()),
+                ('total_yield_kwh', models.FloatField()),
+                ('specific_energy_kwh_per_kwp', models.FloatField()),
+                ('peak_ac_power_kw', models.FloatField()),
+                ('grid_connection_duration_h', models.FloatField()),
+                ('read_date', models.DateField(default=django.utils.timezone.now)),
+                ('load_date', models.DateField(default=django.utils.timezone.now)),
+                ('is_valid', models.BooleanField(default=True)),
+                ('plant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='plant_data', to='apiapp.plant')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AlertLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read_date', models.DateField()),
+                ('status', models.CharField(choices=[('triggered', 'Threshold Triggered'), ('ok', 'Within Threshold'), ('n/a', 'Data of the last 7 days not available')], max_length=20)),
+                ('metric_type', models.CharField(max_length=50)),
+                ('avg_value', models.FloatField()),
+                ('threshold_value', models.FloatField()),
+                ('actual_value', models.FloatField()),
+                ('triggered_at', models.DateTimeField(blank=True, null=True)),
+                ('is_valid', models.BooleanField(default=True)),
+                ('unread', models.BooleanField(default=True)),
+                ('plant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alert_logs', to='apiapp.plant')),
+                ('plant_data', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alert_logs', to='apiapp.plantdata')),
+            ],
+        ),
+    ]
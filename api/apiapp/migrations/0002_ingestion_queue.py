@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionQueueItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload_ref', models.CharField(max_length=255)),
+                ('file_type', models.CharField(max_length=10)),
+                ('status', models.CharField(choices=[('pending', 'Waiting for a drain run'), ('claimed', 'Claimed by a drain run'), ('done', 'Loaded'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('enqueued_at', models.DateTimeField(auto_now_add=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('batch_id', models.CharField(blank=True, max_length=64)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('plant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingestion_queue', to='apiapp.plant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='apiapp_inge_status_33827b_idx')],
+            },
+        ),
+    ]
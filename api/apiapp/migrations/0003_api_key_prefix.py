@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0002_ingestion_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apikeyingestionsettings',
+            name='key_digest',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='apikeyingestionsettings',
+            name='key_prefix',
+            field=models.CharField(blank=True, max_length=16, null=True, unique=True),
+        ),
+    ]
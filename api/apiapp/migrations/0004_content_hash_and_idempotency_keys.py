@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0003_api_key_prefix'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plantdata',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='IngestionIdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('response_status', models.PositiveSmallIntegerField()),
+                ('response_body', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('plant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_keys', to='apiapp.plant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('plant', 'key'), name='unique_ingestion_idempotency_key')],
+            },
+        ),
+    ]
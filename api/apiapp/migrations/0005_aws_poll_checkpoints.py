@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0004_content_hash_and_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='awsingestionsettings',
+            name='last_polled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='awsingestionsettings',
+            name='next_poll_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='AwsIngestedObject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_key', models.CharField(max_length=1024)),
+                ('etag', models.CharField(max_length=255)),
+                ('ingested_at', models.DateTimeField(auto_now=True)),
+                ('plant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aws_ingested_objects', to='apiapp.plant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('plant', 'object_key'), name='unique_aws_object_per_plant')],
+            },
+        ),
+    ]
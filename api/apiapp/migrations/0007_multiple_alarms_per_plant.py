@@ -0,0 +1,44 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0006_pipeline_watermarks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alarmplant',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='alarmplant',
+            name='min_days',
+            field=models.PositiveIntegerField(default=5),
+        ),
+        migrations.AddField(
+            model_name='alarmplant',
+            name='window_days',
+            field=models.PositiveIntegerField(default=7),
+        ),
+        migrations.AddField(
+            model_name='alertlog',
+            name='alarm',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='alert_logs', to='apiapp.alarmplant'),
+        ),
+        migrations.AlterField(
+            model_name='alarmplant',
+            name='plant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alarms', to='apiapp.plant'),
+        ),
+        migrations.AlterField(
+            model_name='alertlog',
+            name='status',
+            field=models.CharField(choices=[('triggered', 'Threshold Triggered'), ('ok', 'Within Threshold'), ('n/a', 'Not enough data in the alarm window')], max_length=20),
+        ),
+    ]
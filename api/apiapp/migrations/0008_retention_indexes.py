@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0007_multiple_alarms_per_plant'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingestionidempotencykey',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='alertlog',
+            index=models.Index(fields=['read_date'], name='alertlog_read_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plantdata',
+            index=models.Index(condition=models.Q(('is_valid', False)), fields=['load_date'], name='plantdata_superseded_idx'),
+        ),
+    ]
@@ -0,0 +1,126 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Tables swapped for partitioned copies. Foreign keys between them are not recreated, as a partitioned
+# table cannot be referenced on id alone; AlertLog.plant_data is declared with db_constraint=False.
+PARTITIONED_TABLES = ("apiapp_alertlog", "apiapp_plantdata")
+
+# Months of empty partitions created ahead of today; the data unit's nightly maintenance keeps this lead
+PARTITION_MONTHS_AHEAD = 3
+
+# Creates the monthly partitions of a table range-partitioned on read_date for every month between the two
+# dates. Rows that landed in the default partition before their month existed are moved into the new one.
+CREATE_PARTITIONS_FUNCTION = """
+CREATE OR REPLACE FUNCTION apiapp_create_read_date_partitions(parent text, first_month date, last_month date)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    month_start date := date_trunc('month', first_month)::date;
+    month_end date;
+    partition_name text;
+    created integer := 0;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        month_end := (month_start + INTERVAL '1 month')::date;
+        partition_name := parent || '_p' || to_char(month_start, 'YYYYMM');
+
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS)', partition_name, parent);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM %I WHERE read_date >= %L AND read_date < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved',
+                parent || '_default', month_start, month_end, partition_name
+            );
+            EXECUTE format(
+                'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                parent, partition_name, month_start, month_end
+            );
+            created := created + 1;
+        END IF;
+
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END
+$$;
+"""
+
+
+def partition_by_read_date(table):
+    """
+    Swaps a table for a copy range-partitioned by month on read_date, keeping its rows, ids,
+    indexes and foreign keys other than those into the other partitioned table. The primary key
+    becomes (id, read_date), as every unique key of a partitioned table has to contain the partition key.
+    """
+    old = f"{table}_unpartitioned"
+    # By name, before or after the other table's own swap
+    skipped_targets = ", ".join(
+        f"'{name}', '{name}_unpartitioned'" for name in PARTITIONED_TABLES if name != table
+    )
+    return f"""
+        ALTER TABLE {table} RENAME TO {old};
+        ALTER TABLE {old} ALTER COLUMN id DROP IDENTITY IF EXISTS;
+
+        CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE (read_date);
+        CREATE SEQUENCE {table}_id_seq OWNED BY {table}.id;
+        ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{table}_id_seq');
+
+        -- Catches rows outside the created months until their partition exists
+        CREATE TABLE {table}_default PARTITION OF {table} DEFAULT;
+        SELECT apiapp_create_read_date_partitions(
+            '{table}',
+            COALESCE((SELECT MIN(read_date) FROM {old}), CURRENT_DATE),
+            (CURRENT_DATE + INTERVAL '{PARTITION_MONTHS_AHEAD} months')::date
+        );
+
+        INSERT INTO {table} SELECT * FROM {old};
+        SELECT setval('{table}_id_seq', COALESCE(MAX(id), 0) + 1, false) FROM {table};
+
+        DO $$
+        DECLARE
+            definitions text[];
+            definition text;
+        BEGIN
+            SELECT array_agg(regexp_replace(pg_get_indexdef(indexrelid), ' ON \\S+ USING ', ' ON {table} USING '))
+            INTO definitions
+            FROM pg_index
+            WHERE indrelid = '{old}'::regclass
+              AND NOT indisprimary;
+
+            SELECT definitions || array_agg(format('ALTER TABLE {table} ADD CONSTRAINT %I %s', conname, pg_get_constraintdef(oid)))
+            INTO definitions
+            FROM pg_constraint
+            WHERE conrelid = '{old}'::regclass
+              AND contype = 'f'
+              AND confrelid::regclass::text NOT IN ({skipped_targets});
+
+            DROP TABLE {old};
+            ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, read_date);
+            FOREACH definition IN ARRAY COALESCE(definitions, '{{}}')
+            LOOP
+                EXECUTE definition;
+            END LOOP;
+        END
+        $$;
+    """
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0008_retention_indexes'),
+    ]
+
+    operations = [
+        # Drops the constraint up front; a foreign key into the old PlantData table would follow its
+        # rename and block the drop
+        migrations.AlterField(
+            model_name='alertlog',
+            name='plant_data',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='alert_logs', to='apiapp.plantdata'),
+        ),
+        migrations.RunSQL(CREATE_PARTITIONS_FUNCTION),
+        migrations.RunSQL(partition_by_read_date('apiapp_alertlog')),
+        migrations.RunSQL(partition_by_read_date('apiapp_plantdata')),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0009_partition_by_read_date'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alertlog',
+            index=models.Index(condition=models.Q(('is_valid', True), ('unread', True)), fields=['plant', '-read_date', '-id'], name='alertlog_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plantdata',
+            index=models.Index(condition=models.Q(('is_valid', True)), fields=['plant', 'read_date'], name='plantdata_valid_plant_day_idx'),
+        ),
+    ]
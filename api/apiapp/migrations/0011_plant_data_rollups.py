@@ -0,0 +1,52 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Fills the rollups from the PlantData already stored; the loader maintains them from here on
+BACKFILL_ROLLUPS = """
+    INSERT INTO apiapp_plantdatarollup (
+        plant_id, granularity, period_start, days, yield_kwh,
+        specific_energy_kwh_per_kwp, peak_ac_power_kw, grid_connection_duration_h
+    )
+    SELECT
+        pd.plant_id,
+        g.granularity,
+        date_trunc(g.granularity, pd.read_date::timestamp)::date,
+        COUNT(*),
+        SUM(pd.yield_kwh),
+        SUM(pd.specific_energy_kwh_per_kwp),
+        SUM(pd.peak_ac_power_kw),
+        SUM(pd.grid_connection_duration_h)
+    FROM apiapp_plantdata pd
+    CROSS JOIN (VALUES ('week'), ('month'), ('year')) AS g(granularity)
+    WHERE pd.is_valid = TRUE
+    GROUP BY 1, 2, 3
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0010_plant_day_and_unread_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlantDataRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('week', 'Week'), ('month', 'Month'), ('year', 'Year')], max_length=10)),
+                ('period_start', models.DateField()),
+                ('days', models.IntegerField(default=0)),
+                ('yield_kwh', models.FloatField(default=0)),
+                ('specific_energy_kwh_per_kwp', models.FloatField(default=0)),
+                ('peak_ac_power_kw', models.FloatField(default=0)),
+                ('grid_connection_duration_h', models.FloatField(default=0)),
+                ('plant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='apiapp.plant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('plant', 'granularity', 'period_start'), name='unique_plant_rollup_period')],
+            },
+        ),
+        migrations.RunSQL(BACKFILL_ROLLUPS, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Counts the alerts already stored; the alert job maintains the counters from here on
+BACKFILL_AVAILABILITY = """
+    INSERT INTO apiapp_plantavailabilityday (plant_id, day, ok_count, triggered_count)
+    SELECT
+        plant_id,
+        read_date,
+        COUNT(*) FILTER (WHERE status = 'ok'),
+        COUNT(*) FILTER (WHERE status = 'triggered')
+    FROM apiapp_alertlog
+    WHERE is_valid = TRUE
+      AND status IN ('ok', 'triggered')
+    GROUP BY 1, 2
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0011_plant_data_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlantAvailabilityDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('ok_count', models.IntegerField(default=0)),
+                ('triggered_count', models.IntegerField(default=0)),
+                ('plant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_days', to='apiapp.plant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('plant', 'day'), name='unique_plant_availability_day')],
+            },
+        ),
+        migrations.RunSQL(BACKFILL_AVAILABILITY, migrations.RunSQL.noop),
+    ]
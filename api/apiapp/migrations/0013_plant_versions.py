@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:22
+
+import django.db.models.deletion
+import django.db.models.functions.datetime
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0012_plant_availability_days'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlantVersion',
+            fields=[
+                ('plant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='version', serialize=False, to='apiapp.plant')),
+                ('data_version', models.BigIntegerField(db_default=0, default=0)),
+                ('alert_version', models.BigIntegerField(db_default=0, default=0)),
+                ('config_version', models.BigIntegerField(db_default=0, default=0)),
+                ('modified_at', models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
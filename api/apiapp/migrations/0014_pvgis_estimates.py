@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0013_plant_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PvgisEstimate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('params', models.JSONField()),
+                ('response', models.JSONField()),
+                ('fetched_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -1,5 +1,6 @@
 import secrets
 from django.db import models
+from django.db.models.functions import Now
 from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser, BaseUserManager, PermissionsMixin
@@ -74,11 +75,67 @@ class PlantData(models.Model):
     read_date = models.DateField(default=timezone.now)
     load_date = models.DateField(default=timezone.now)
     is_valid = models.BooleanField(default=True)
+    # SHA-256 of the normalized row, used to skip resends of unchanged readings
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+
+    # Range-partitioned by month on read_date (migration 0009_partition_by_read_date), with (id, read_date) as the primary key
+    class Meta:
+        indexes = [
+            # Dashboards, the loader's supersede check and the alert windows all read valid rows of a plant by day
+            models.Index(fields=['plant', 'read_date'], condition=models.Q(is_valid=True), name='plantdata_valid_plant_day_idx'),
+            # Lets the retention job find superseded rows without scanning the valid ones
+            models.Index(fields=['load_date'], condition=models.Q(is_valid=False), name='plantdata_superseded_idx'),
+        ]
 
     def __str__(self):
         return f"{self.plant_id} - {self.plant_name} - {self.device_name}"
 
+
+class PlantDataRollup(models.Model):
+    """
+    Sums of a plant's valid PlantData per week, month or year. The data unit's loader adds inserted
+    rows and subtracts superseded ones; `manage.py rebuild_plant_rollups` recomputes them from PlantData.
+    """
+    GRANULARITIES = [
+        ('week', 'Week'),
+        ('month', 'Month'),
+        ('year', 'Year'),
+    ]
+
+    plant = models.ForeignKey(Plant, on_delete=models.CASCADE, related_name='rollups')
+    granularity = models.CharField(max_length=10, choices=GRANULARITIES)
+    period_start = models.DateField()
+    days = models.IntegerField(default=0)
+    yield_kwh = models.FloatField(default=0)
+    specific_energy_kwh_per_kwp = models.FloatField(default=0)
+    peak_ac_power_kw = models.FloatField(default=0)
+    grid_connection_duration_h = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['plant', 'granularity', 'period_start'], name='unique_plant_rollup_period'),
+        ]
+
+    def __str__(self):
+        return f"{self.plant_id} | {self.granularity} {self.period_start}"
+
     
+class PlantVersion(models.Model):
+    """
+    Counters bumped whenever something a plant's cached responses depend on changes: data_version by
+    the data unit's loader, alert_version by its alert job and config_version when the plant, its
+    devices or alarms are saved. Plants without a row are at version 0 of everything.
+    """
+    plant = models.OneToOneField(Plant, on_delete=models.CASCADE, primary_key=True, related_name='version')
+    data_version = models.BigIntegerField(default=0, db_default=0)
+    alert_version = models.BigIntegerField(default=0, db_default=0)
+    config_version = models.BigIntegerField(default=0, db_default=0)
+    modified_at = models.DateTimeField(default=timezone.now, db_default=Now())
+
+    def __str__(self):
+        return f"{self.plant_id} | data {self.data_version}, alerts {self.alert_version}, config {self.config_version}"
+
+
 class Device(models.Model):
     DEVICE_TYPES = [
         ('inverter', 'Inverter'),
@@ -97,7 +154,11 @@ class Device(models.Model):
 
 class ApiKeyIngestionSettings(models.Model):
     plant = models.OneToOneField(Plant, on_delete=models.CASCADE, related_name='api_settings')
+    # Legacy keys only have the PBKDF2 hash in api_key; newer keys are '<key_prefix>.<secret>'
+    # and are verified against key_digest (HMAC-SHA256) after an indexed lookup on the prefix.
     api_key = models.CharField(max_length=256, blank=True)
+    key_prefix = models.CharField(max_length=16, unique=True, null=True, blank=True)
+    key_digest = models.CharField(max_length=64, blank=True, db_index=True)
     expiration_date = models.DateField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
 
@@ -112,9 +173,27 @@ class AwsIngestionSettings(models.Model):
     secret_access_key = models.CharField(max_length=255)
     file_prefix = models.CharField(max_length=255, blank=True, help_text="Optional path prefix inside the bucket")
     polling_interval_minutes = models.PositiveIntegerField(default=60)
+    # Set by the data unit's S3 poller when it picks the plant up, jittered around the interval
+    last_polled_at = models.DateTimeField(null=True, blank=True)
+    next_poll_at = models.DateTimeField(null=True, blank=True, db_index=True)
 
     def __str__(self):
         return f"AWS Config for {self.plant.plant_name}"
+
+
+class AwsIngestedObject(models.Model):
+    plant = models.ForeignKey(Plant, on_delete=models.CASCADE, related_name='aws_ingested_objects')
+    object_key = models.CharField(max_length=1024)
+    etag = models.CharField(max_length=255)
+    ingested_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['plant', 'object_key'], name='unique_aws_object_per_plant'),
+        ]
+
+    def __str__(self):
+        return f"{self.object_key} ({self.plant_id})"
     
 class AlarmPlant(models.Model):
     METRIC_TYPES = [
@@ -123,24 +202,51 @@ class AlarmPlant(models.Model):
         ('specific_energy', 'Specific Energy (kWh/kWp)'),
     ]
 
-    plant = models.OneToOneField(Plant, on_delete=models.CASCADE, related_name='alarm_settings')
+    # A plant can have several alarms, each comparing one metric to its own trailing window
+    plant = models.ForeignKey(Plant, on_delete=models.CASCADE, related_name='alarms')
     threshold_value = models.FloatField()
     metric_type = models.CharField(max_length=50, choices=METRIC_TYPES)
+    window_days = models.PositiveIntegerField(default=7)
+    min_days = models.PositiveIntegerField(default=5)
+    is_active = models.BooleanField(default=True)
     last_alarm_triggered = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"Alarm for {self.plant.plant_name} - {self.metric_type}"
     
 
+class PlantAvailabilityDay(models.Model):
+    """
+    Valid 'ok' and 'triggered' alerts of a plant per day. The data unit's alert job counts the alerts
+    it inserts and invalidates; `manage.py rebuild_plant_availability` recomputes them from AlertLog.
+    Counters outlive the AlertLog rows that retention removes, so availability covers all history.
+    """
+    plant = models.ForeignKey(Plant, on_delete=models.CASCADE, related_name='availability_days')
+    day = models.DateField()
+    ok_count = models.IntegerField(default=0)
+    triggered_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['plant', 'day'], name='unique_plant_availability_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.plant_id} | {self.day}: {self.ok_count} ok, {self.triggered_count} triggered"
+
+    
 class AlertLog(models.Model):
     STATUS_CHOICES = [
         ('triggered', 'Threshold Triggered'),
         ('ok', 'Within Threshold'),
-        ('n/a', 'Data of the last 7 days not available'),
+        ('n/a', 'Not enough data in the alarm window'),
     ]
 
     plant = models.ForeignKey(Plant, on_delete=models.CASCADE, related_name='alert_logs')
-    plant_data = models.ForeignKey(PlantData, on_delete=models.CASCADE, related_name='alert_logs')
+    # No database constraint: PlantData is partitioned by read_date, so id alone cannot be referenced.
+    # Deletes through the ORM still cascade.
+    plant_data = models.ForeignKey(PlantData, on_delete=models.CASCADE, related_name='alert_logs', db_constraint=False)
+    alarm = models.ForeignKey(AlarmPlant, null=True, blank=True, on_delete=models.SET_NULL, related_name='alert_logs')
     read_date = models.DateField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES)
     metric_type = models.CharField(max_length=50)
@@ -151,5 +257,81 @@ class AlertLog(models.Model):
     is_valid = models.BooleanField(default=True)
     unread = models.BooleanField(default=True)
 
+    # Range-partitioned by month on read_date like PlantData
+    class Meta:
+        indexes = [
+            models.Index(fields=['read_date'], name='alertlog_read_date_idx'),
+            # Notifications list the unread valid alerts of a user's plants, newest first
+            models.Index(
+                fields=['plant', '-read_date', '-id'],
+                condition=models.Q(is_valid=True, unread=True),
+                name='alertlog_unread_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.status.upper()} | {self.plant.plant_name} | {self.metric_type} on {self.read_date}"
+
+class IngestionQueueItem(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Waiting for a drain run'),
+        ('claimed', 'Claimed by a drain run'),
+        ('done', 'Loaded'),
+        ('failed', 'Failed'),
+    ]
+
+    plant = models.ForeignKey(Plant, on_delete=models.CASCADE, related_name='ingestion_queue')
+    payload_ref = models.CharField(max_length=255)
+    file_type = models.CharField(max_length=10)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    enqueued_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    batch_id = models.CharField(max_length=64, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.status.upper()} | {self.plant_id} | {self.payload_ref}"
+
+
+
+class IngestionIdempotencyKey(models.Model):
+    plant = models.ForeignKey(Plant, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    response_status = models.PositiveSmallIntegerField()
+    response_body = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['plant', 'key'], name='unique_ingestion_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.plant_id} | {self.key}"
+
+
+class PipelineWatermark(models.Model):
+    """High-water marks of the data unit's incremental jobs, e.g. the last PlantData id evaluated for alerts."""
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+class PvgisEstimate(models.Model):
+    """PVGIS PVcalc responses by the digest of their normalized request parameters; see apiapp.pvgis."""
+    key = models.CharField(max_length=64, unique=True)
+    params = models.JSONField()
+    response = models.JSONField()
+    fetched_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+
     def __str__(self):
-        return f"{self.status.upper()} | {self.plant.plant_name} | {self.metric_type} on {self.read_date}"
\ No newline at end of file
+        return f"{self.params.get('lat')}, {self.params.get('lon')} until {self.expires_at}"
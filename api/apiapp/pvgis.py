@@ -0,0 +1,193 @@
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import Future
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .models import PvgisEstimate
+
+logger = logging.getLogger(__name__)
+
+# Namespace of the advisory locks that let one worker process fetch a given estimate at a time
+PVGIS_FETCH_LOCK = 7315003
+
+
+class PvgisUnavailableError(Exception):
+    pass
+
+
+class PvgisRequestError(Exception):
+    """PVGIS rejected the parameters; retrying or serving an older estimate would not help."""
+
+
+def normalize_params(latitude, longitude, peak_power, losses, tilt, azimuth, elevation, year_min, year_max) -> dict:
+    """
+    PVcalc parameters with every value at the precision PVGIS resolves. Coordinates snap to the grid of
+    its radiation database, so every location in one cell shares an estimate. Raises ValueError or
+    TypeError on missing or non-numeric values.
+    """
+    grid = settings.PVGIS_GRID_DEG
+    return {
+        "lat": round(round(float(latitude) / grid) * grid, 6),
+        "lon": round(round(float(longitude) / grid) * grid, 6),
+        "peakpower": round(float(peak_power), 3),
+        "loss": round(float(losses), 1),
+        "angle": round(float(tilt)),
+        "aspect": round(float(azimuth)),
+        "elevation": round(float(elevation)),
+        "start_year": int(year_min),
+        "end_year": int(year_max),
+        "outputformat": "json",
+    }
+
+
+def params_key(params: dict) -> str:
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def run_in_thread(task):
+    threading.Thread(target=task, daemon=True).start()
+
+
+class PvgisClient:
+    """
+    Serves PVcalc estimations from the database while fresh, and while stale for stale_s more as a
+    background refresh runs. Misses wait for one upstream call per parameter set, shared by concurrent
+    requests in this process and serialized across processes. If PVGIS fails, any stored estimate is
+    served instead.
+    """
+
+    def __init__(self, url, connect_timeout_s, read_timeout_s, ttl_s, stale_s, run_in_background=run_in_thread):
+        self.url = url
+        self.timeout = (connect_timeout_s, read_timeout_s)
+        self.ttl = timedelta(seconds=ttl_s)
+        self.stale = timedelta(seconds=stale_s)
+        self.run_in_background = run_in_background
+        self.lock = threading.Lock()
+        self.inflight = {}
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=10)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def estimate(self, params: dict) -> tuple:
+        """(PVcalc response, how it was served: 'hit', 'stale', 'miss' or 'stale-on-error')."""
+        key = params_key(params)
+        entry = PvgisEstimate.objects.filter(key=key).first()
+        now = timezone.now()
+
+        if entry and now < entry.expires_at:
+            return entry.response, "hit"
+        if entry and now < entry.expires_at + self.stale:
+            self.run_in_background(lambda: self._refresh(key, params))
+            return entry.response, "stale"
+
+        try:
+            return self._fetch_once(key, params), "miss"
+        except PvgisUnavailableError:
+            if entry is None:
+                raise
+            logger.warning("PVGIS unavailable, serving the estimate fetched at %s", entry.fetched_at)
+            return entry.response, "stale-on-error"
+
+    def _refresh(self, key: str, params: dict):
+        try:
+            self._fetch_once(key, params)
+        except (PvgisUnavailableError, PvgisRequestError) as e:
+            logger.warning("PVGIS background refresh failed: %s", e)
+        finally:
+            # Runs in its own thread, which would otherwise keep its database connection open
+            connection.close()
+
+    def _fetch_once(self, key: str, params: dict) -> dict:
+        with self.lock:
+            future = self.inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self.inflight[key] = Future()
+        if not leader:
+            return future.result()
+
+        try:
+            data = self._fetch_and_store(key, params)
+            future.set_result(data)
+            return data
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+
+    def _fetch_and_store(self, key: str, params: dict) -> dict:
+        with transaction.atomic():
+            with connection.cursor() as cur:
+                cur.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", [PVGIS_FETCH_LOCK, key])
+            # Another process may have fetched it while this one waited for the lock
+            entry = PvgisEstimate.objects.filter(key=key, expires_at__gt=timezone.now()).first()
+            if entry:
+                return entry.response
+
+            data = self._get(params)
+            fetched_at = timezone.now()
+            PvgisEstimate.objects.update_or_create(key=key, defaults={
+                "params": params,
+                "response": data,
+                "fetched_at": fetched_at,
+                "expires_at": fetched_at + self.ttl,
+            })
+            return data
+
+    def _get(self, params: dict) -> dict:
+        try:
+            response = self.session.get(self.url, params=params, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            raise PvgisUnavailableError(f"PVGIS request failed: {e}")
+
+        if 400 <= response.status_code < 500:
+            try:
+                message = response.json().get("message", response.text)
+            except ValueError:
+                message = response.text
+            raise PvgisRequestError(message)
+        try:
+            response.raise_for_status()
+            return response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise PvgisUnavailableError(f"PVGIS request failed: {e}")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_pvgis_client() -> PvgisClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = PvgisClient(
+                url=settings.PVGIS_URL,
+                connect_timeout_s=settings.PVGIS_CONNECT_TIMEOUT_S,
+                read_timeout_s=settings.PVGIS_READ_TIMEOUT_S,
+                ttl_s=settings.PVGIS_CACHE_TTL_S,
+                stale_s=settings.PVGIS_STALE_S,
+            )
+        return _client
+
+
+@receiver(setting_changed)
+def reset_pvgis_client(setting, **kwargs):
+    global _client
+    if setting.startswith("PVGIS_"):
+        with _client_lock:
+            _client = None
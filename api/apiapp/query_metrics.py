@@ -0,0 +1,134 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Placeholder lists of any length, so IN (...) filters over different id sets share one shape
+_PLACEHOLDER_LIST = re.compile(r"%s(?:\s*,\s*%s)+")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_shape(sql: str) -> str:
+    return _PLACEHOLDER_LIST.sub("%s, ...", sql)
+
+
+class QueryRecorder:
+    """Database execute wrapper counting the queries of one request, their time and how often each shape ran."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration_s = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration_s += time.monotonic() - started
+            self.count += 1
+            self.shapes[query_shape(sql)] += 1
+
+    def repeated_shapes(self, threshold: int) -> list:
+        """(shape, runs) of every statement sent at least threshold times, most repeated first."""
+        return [(shape, runs) for shape, runs in self.shapes.most_common() if runs >= threshold]
+
+
+class ViewQueryMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def record(self, view_name: str, recorder: QueryRecorder, over_budget: bool, repeated: bool):
+        with self.lock:
+            stats = self.views.setdefault(view_name, {
+                "requests": 0,
+                "queries": 0,
+                "max_queries": 0,
+                "db_time_s": 0.0,
+                "max_db_time_s": 0.0,
+                "over_budget": 0,
+                "repeated_shapes": 0,
+            })
+            stats["requests"] += 1
+            stats["queries"] += recorder.count
+            stats["max_queries"] = max(stats["max_queries"], recorder.count)
+            stats["db_time_s"] += recorder.duration_s
+            stats["max_db_time_s"] = max(stats["max_db_time_s"], recorder.duration_s)
+            stats["over_budget"] += over_budget
+            stats["repeated_shapes"] += repeated
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                view_name: {
+                    "requests": stats["requests"],
+                    "avg_queries": round(stats["queries"] / stats["requests"], 1),
+                    "max_queries": stats["max_queries"],
+                    "avg_db_time_ms": round(stats["db_time_s"] / stats["requests"] * 1000, 1),
+                    "max_db_time_ms": round(stats["max_db_time_s"] * 1000, 1),
+                    "requests_over_budget": stats["over_budget"],
+                    "requests_with_repeated_shapes": stats["repeated_shapes"],
+                }
+                for view_name, stats in sorted(self.views.items())
+            }
+
+
+view_query_metrics = ViewQueryMetrics()
+
+
+def query_metrics() -> dict:
+    return view_query_metrics.snapshot()
+
+
+class QueryMetricsMiddleware:
+    """
+    Records the query count and database time of every request per view. A view declares its
+    budget with a `query_budget` class attribute; requests over it, or repeating one statement
+    QUERY_REPEAT_THRESHOLD times (the usual N+1 pattern), are logged, and raise
+    QueryBudgetExceeded when QUERY_BUDGET_STRICT is on, as it is in the tests.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        request.query_recorder = recorder
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        view_name = getattr(request, "query_view_name", None)
+        if view_name is None:
+            return response
+
+        budget = request.query_budget
+        over_budget = budget is not None and recorder.count > budget
+        repeated = recorder.repeated_shapes(settings.QUERY_REPEAT_THRESHOLD)
+        view_query_metrics.record(view_name, recorder, over_budget, bool(repeated))
+
+        if settings.QUERY_METRICS_SERVER_TIMING:
+            response["Server-Timing"] = f'db;dur={recorder.duration_s * 1000:.1f};desc="{recorder.count} queries"'
+
+        problems = [f"{view_name} sent the same query {runs} times: {shape}" for shape, runs in repeated]
+        if over_budget:
+            problems.append(f"{view_name} sent {recorder.count} queries, over its budget of {budget}")
+        if problems and settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded("; ".join(problems))
+        for message in problems:
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, "view_class", view_func)
+        request.query_view_name = view.__name__
+        request.query_budget = getattr(view, "query_budget", None)
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import threading
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponseNotModified
+from django.utils.cache import parse_etags, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+
+class ResponseCacheMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def record(self, view_name: str, outcome: str):
+        with self.lock:
+            stats = self.views.setdefault(view_name, {"hits": 0, "misses": 0, "not_modified": 0})
+            stats[outcome] += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                view_name: {
+                    **stats,
+                    "hit_ratio": round(stats["hits"] / (stats["hits"] + stats["misses"]), 3)
+                    if stats["hits"] + stats["misses"] else None,
+                }
+                for view_name, stats in sorted(self.views.items())
+            }
+
+
+response_cache_metrics = ResponseCacheMetrics()
+
+
+def cache_metrics() -> dict:
+    return response_cache_metrics.snapshot()
+
+
+def response_digest(view_name: str, request, versions: list, kinds: tuple) -> str:
+    """
+    Hash of the view, user, path with its query string and today's date, for ranges relative to today, plus
+    the given versions of every plant. Any bump yields a new digest; entries under old ones are never read again.
+    """
+    signature = [
+        view_name,
+        request.user.pk,
+        request.get_full_path(),
+        date.today().isoformat(),
+        [(plant.plant_id, *(getattr(plant, kind) for kind in kinds)) for plant in versions],
+    ]
+    return hashlib.sha256(json.dumps(signature, cls=DjangoJSONEncoder).encode("utf-8")).hexdigest()
+
+
+def etag_matches(request, etag: str) -> bool:
+    # If-None-Match compares weakly, so a W/ prefix added by a proxy still matches
+    header = request.META.get("HTTP_IF_NONE_MATCH")
+    if not header:
+        return False
+    candidates = parse_etags(header)
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def set_validators(response, etag: str, versions: list):
+    response["ETag"] = etag
+    modified = [plant.modified_at for plant in versions if plant.modified_at is not None]
+    if modified:
+        response["Last-Modified"] = http_date(max(modified).timestamp())
+    # Per user, and revalidated on every use, which costs the client a 304 at most
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def cached_response(request, versions: list, kinds: tuple, build):
+    """
+    Answers a matching If-None-Match with 304 and otherwise serves the body stored for this request while
+    the `kinds` versions of the plants are unchanged, or the response of build(), storing it when
+    successful. Either carries an ETag and Last-Modified derived from the versions, which come from
+    plant_versions(). Nothing past the versions is queried unless the body has to be built.
+    """
+    view_name = type(request.parser_context["view"]).__name__
+    digest = response_digest(view_name, request, versions, kinds)
+    etag = f'"{digest}"'
+
+    if etag_matches(request, etag):
+        response_cache_metrics.record(view_name, "not_modified")
+        return set_validators(HttpResponseNotModified(), etag, versions)
+
+    if not settings.RESPONSE_CACHE_ENABLED:
+        response = build()
+    else:
+        cache = caches[settings.RESPONSE_CACHE_ALIAS]
+        key = f"response:{digest}"
+        data = cache.get(key)
+        response_cache_metrics.record(view_name, "hits" if data is not None else "misses")
+        if data is not None:
+            response = Response(data)
+        else:
+            response = build()
+            if response.status_code == 200:
+                cache.set(key, response.data)
+
+    if response.status_code == 200:
+        set_validators(response, etag, versions)
+    return response
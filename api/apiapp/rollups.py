@@ -0,0 +1,40 @@
+from django.db import connection, transaction
+
+# Same key as PLANTDATA_WRITE_LOCK in the data unit's csv_db_write; loads hold it shared until they commit
+PLANTDATA_WRITE_LOCK = 7315001
+
+ROLLUP_GRANULARITIES = ['week', 'month', 'year']
+
+
+def rebuild_rollups(plant_ids=None) -> int:
+    """
+    Recomputes the rollups of the given plants, or of every plant, from their valid PlantData.
+    Loads wait until the rebuild commits, so no delta is lost in between. Returns the rollup rows written.
+    """
+    scope = "plant_id = ANY(%(plant_ids)s)" if plant_ids else "TRUE"
+    params = {"plant_ids": list(plant_ids or []), "granularities": ROLLUP_GRANULARITIES}
+
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", [PLANTDATA_WRITE_LOCK])
+        cur.execute(f"DELETE FROM apiapp_plantdatarollup WHERE {scope}", params)
+        cur.execute(f"""
+            INSERT INTO apiapp_plantdatarollup (
+                plant_id, granularity, period_start, days, yield_kwh,
+                specific_energy_kwh_per_kwp, peak_ac_power_kw, grid_connection_duration_h
+            )
+            SELECT
+                pd.plant_id,
+                g.granularity,
+                date_trunc(g.granularity, pd.read_date::timestamp)::date,
+                COUNT(*),
+                SUM(pd.yield_kwh),
+                SUM(pd.specific_energy_kwh_per_kwp),
+                SUM(pd.peak_ac_power_kw),
+                SUM(pd.grid_connection_duration_h)
+            FROM apiapp_plantdata pd
+            CROSS JOIN unnest(%(granularities)s::varchar[]) AS g(granularity)
+            WHERE pd.is_valid = TRUE
+              AND {scope}
+            GROUP BY 1, 2, 3
+        """, params)
+        return cur.rowcount
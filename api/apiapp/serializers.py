@@ -2,8 +2,7 @@ from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from .models import User, Plant, AlarmPlant, Device, ApiKeyIngestionSettings, AwsIngestionSettings, AlertLog
 import hashlib
-import secrets
-from django.contrib.auth.hashers import make_password
+from .api_keys import generate_api_key
 
 class UserRegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True)
@@ -64,21 +63,23 @@ class AwsIngestionSettingsSerializer(serializers.ModelSerializer):
 class AlarmPlantSerializer(serializers.ModelSerializer):
     class Meta:
         model = AlarmPlant
-        fields = ['metric_type', 'threshold_value']
+        fields = ['metric_type', 'threshold_value', 'window_days', 'min_days']
 
 class PlantSerializer(serializers.ModelSerializer):
     devices = DeviceSerializer(many=True)
     aws_settings = AwsIngestionSettingsSerializer(required=False)
     alarm = AlarmPlantSerializer(required=False)
+    alarms = AlarmPlantSerializer(many=True, required=False)
 
     class Meta:
         model = Plant
-        fields = ['id','plant_name', 'ingestion_type', 'devices', 'aws_settings', 'alarm']
+        fields = ['id','plant_name', 'ingestion_type', 'devices', 'aws_settings', 'alarm', 'alarms']
 
     def create(self, validated_data):
         devices_data = validated_data.pop('devices')
         aws_data = validated_data.pop('aws_settings', None)
         alarm_data = validated_data.pop('alarm', None)
+        alarms_data = validated_data.pop('alarms', [])
 
         # Create Plant
         plant = Plant.objects.create(**validated_data)
@@ -88,18 +89,18 @@ class PlantSerializer(serializers.ModelSerializer):
             Device.objects.create(plant=plant, **device_data)
         plant.devices_count = len(devices_data)
         plant.save()
-        # Create Alarm if provided
+        # Create Alarms if provided
         if alarm_data:
-            AlarmPlant.objects.create(plant=plant, **alarm_data)
+            alarms_data = [alarm_data, *alarms_data]
+        AlarmPlant.objects.bulk_create([AlarmPlant(plant=plant, **data) for data in alarms_data])
         api_key = None
         if validated_data['ingestion_type'] == 'API':
-            api_key = secrets.token_urlsafe(16)  # Generate a random API key
+            # Only the public prefix and the keyed digest of the key are stored
+            api_key, key_prefix, key_digest = generate_api_key()
 
-            # Hash the API key before saving it to the database
-            hashed_api_key = make_password(api_key)
-
-            # Create the API Ingestion Settings with the hashed key
-            api_key_settings = ApiKeyIngestionSettings.objects.create(plant=plant, api_key=hashed_api_key)
+            api_key_settings = ApiKeyIngestionSettings.objects.create(
+                plant=plant, key_prefix=key_prefix, key_digest=key_digest
+            )
             # Return the plant with the api_key (this should be done in the view, not in the serializer)
             return plant, api_key
 
@@ -128,12 +129,14 @@ class DeviceCreateUpdateSerializer(serializers.ModelSerializer):
 class GetAlarmSerializer(serializers.ModelSerializer):
     class Meta:
         model = AlarmPlant
-        fields = ['id','threshold_value', 'metric_type', 'last_alarm_triggered']
+        fields = ['id','threshold_value', 'metric_type', 'window_days', 'min_days', 'is_active', 'last_alarm_triggered']
 
 class PlantOverviewSerializer(serializers.Serializer):
     plant = GetPlantSerializer()
     devices = GetDeviceSerializer(many=True)
+    # First alarm of the plant, kept for clients written when a plant had a single alarm
     alarm_settings = GetAlarmSerializer(allow_null=True)
+    alarms = GetAlarmSerializer(many=True)
 
 class AlertLogSerializer(serializers.ModelSerializer):
     plant_name = serializers.CharField(source='plant.plant_name', read_only=True)
@@ -0,0 +1,31 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .api_keys import evict_api_key
+from .models import ApiKeyIngestionSettings, Plant, Device, AlarmPlant, AlertLog
+from .versions import bump_plant_versions
+
+
+@receiver(post_save, sender=ApiKeyIngestionSettings)
+@receiver(post_delete, sender=ApiKeyIngestionSettings)
+def evict_cached_api_key(sender, instance, **kwargs):
+    evict_api_key(instance.id)
+
+
+@receiver(post_save, sender=Plant)
+def bump_plant_config_version(sender, instance, **kwargs):
+    bump_plant_versions([instance.id], 'config')
+
+
+@receiver(post_save, sender=Device)
+@receiver(post_delete, sender=Device)
+@receiver(post_save, sender=AlarmPlant)
+@receiver(post_delete, sender=AlarmPlant)
+def bump_plant_child_config_version(sender, instance, **kwargs):
+    bump_plant_versions([instance.plant_id], 'config')
+
+
+# The data unit bumps alert_version itself when its alert job writes; this covers edits such as marking read
+@receiver(post_save, sender=AlertLog)
+def bump_plant_alert_version(sender, instance, **kwargs):
+    bump_plant_versions([instance.plant_id], 'alert')
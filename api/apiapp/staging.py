@@ -0,0 +1,194 @@
+import csv
+import hashlib
+import json
+import os
+import secrets
+import tempfile
+
+from django.conf import settings
+from django.db import connection
+
+# Same key as STAGED_PAYLOAD_LOCK in the data unit's file_handling. A shared payload is published under
+# the lock on its reference, held until the caller's transaction commits the queue item that needs it,
+# so a drain run never removes the file in between.
+STAGED_PAYLOAD_LOCK = 7315004
+JSON_READ_CHUNK = 64 * 1024
+
+_json_decoder = json.JSONDecoder()
+
+
+class PayloadError(ValueError):
+    pass
+
+
+class _JsonStream:
+    """Decodes consecutive JSON values from a file a chunk at a time, like the data unit's reader."""
+
+    def __init__(self, jsonfile):
+        self.jsonfile = jsonfile
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        chunk = self.jsonfile.read(JSON_READ_CHUNK)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+        return bool(chunk)
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def skip(self):
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _json_decoder.raw_decode(self.buffer, self.pos)
+                # A number cut off at the end of the buffer would decode short
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def _iter_json_items(jsonfile):
+    """Yields the items of a top-level JSON array, or a top-level object as one item."""
+    stream = _JsonStream(jsonfile)
+    if stream.peek() == "{":
+        yield stream.value()
+    elif stream.peek() == "[":
+        stream.skip()
+        if stream.peek() != "]":
+            while True:
+                yield stream.value()
+                separator = stream.peek()
+                stream.skip()
+                if separator == "]":
+                    break
+                if separator != ",":
+                    raise PayloadError("Invalid JSON file: expected ',' or ']' between items")
+        else:
+            stream.skip()
+    else:
+        raise PayloadError("JSON payload must be an object or a list of objects")
+
+    if stream.peek():
+        raise PayloadError("Invalid JSON file: extra data after the payload")
+
+
+def check_payload(path: str, file_type: str):
+    """
+    Reads a staged file through and raises PayloadError unless it holds at least one row and,
+    for JSON, every row is an object, so the data unit is only handed payloads it can load.
+    """
+    rows = 0
+    try:
+        if file_type == 'csv':
+            with open(path, newline='', encoding='utf-8') as csvfile:
+                for _ in csv.DictReader(csvfile):
+                    rows += 1
+        else:
+            with open(path, encoding='utf-8') as jsonfile:
+                for entry in _iter_json_items(jsonfile):
+                    if not isinstance(entry, dict):
+                        raise PayloadError("JSON payload must be an object or a list of objects")
+                    rows += 1
+    except PayloadError:
+        raise
+    except (ValueError, csv.Error) as e:
+        raise PayloadError(f"Invalid {file_type.upper()} file: {e}")
+
+    if rows == 0:
+        raise PayloadError("No data provided")
+
+
+def stage_payload(chunks, file_type: str, shared: bool = True) -> str:
+    """
+    Streams the payload into the content-addressed staging area shared with the data unit
+    and returns its reference (path relative to the staging root). Payloads check_payload
+    rejects are not staged.
+    Shared payloads map identical data to the same reference, so queued resends are stored only
+    once; they must be staged inside a transaction, see STAGED_PAYLOAD_LOCK. Otherwise the
+    reference is unique to this call, and the run loading it may delete it.
+    """
+    root = settings.PAYLOAD_STAGING_DIR
+    os.makedirs(root, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=root, prefix=".incoming-", delete=False) as tmpfile:
+        try:
+            for chunk in chunks:
+                digest.update(chunk)
+                tmpfile.write(chunk)
+                size += len(chunk)
+        except Exception:
+            os.unlink(tmpfile.name)
+            raise
+
+    try:
+        if size == 0:
+            raise PayloadError("No data provided")
+        check_payload(tmpfile.name, file_type)
+    except PayloadError:
+        os.unlink(tmpfile.name)
+        raise
+
+    hexdigest = digest.hexdigest()
+    name = hexdigest if shared else f"{hexdigest}-{secrets.token_hex(8)}"
+    ref = os.path.join(hexdigest[:2], f"{name}.{file_type}")
+    target = os.path.join(root, ref)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if shared:
+        lock_staged_payload(ref)
+    os.replace(tmpfile.name, target)
+    return ref
+
+
+def lock_staged_payload(payload_ref: str):
+    with connection.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", [STAGED_PAYLOAD_LOCK, payload_ref])
+
+
+def stage_request_payload(request) -> tuple:
+    """
+    Stages the data of an ingestion request and returns (payload_ref, file_type). Queued
+    payloads are shared, as the queue counts their references; a directly launched run deletes
+    its payload once loaded, so it gets its own copy.
+    """
+    content_type = request.content_type
+    shared = settings.INGESTION_QUEUE_ENABLED
+
+    if content_type == 'application/json':
+        entry = request.data.get('data')
+        if not entry:
+            raise PayloadError("No data provided")
+        return stage_payload([json.dumps(entry).encode('utf-8')], 'json', shared), 'json'
+
+    if content_type.startswith('multipart/form-data') or content_type.startswith('text/csv'):
+        file = request.FILES.get('file')
+        if not file:
+            raise PayloadError("File not provided")
+
+        if file.name.endswith('.csv'):
+            file_type = 'csv'
+        elif file.name.endswith('.json'):
+            file_type = 'json'
+        else:
+            raise PayloadError("Unsupported file format. Please upload .csv or .json")
+        return stage_payload(file.chunks(), file_type, shared), file_type
+
+    raise PayloadError("Unsupported content type")
@@ -1,3 +1,1006 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+import requests
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Count, Q
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import api_keys, dagster_launcher, views
+from .availability import rebuild_availability
+from .downsampling import lttb_indices
+from .cdc import NUMERIC_COLUMNS, row_content_hash
+from .models import User, Plant, AlarmPlant, AlertLog, Device, PlantData, PvgisEstimate, IngestionQueueItem, ApiKeyIngestionSettings
+from .pvgis import PvgisClient, PvgisUnavailableError, normalize_params, params_key
+from .query_metrics import QueryBudgetExceeded
+from .response_cache import cache_metrics
+from .rollups import rebuild_rollups
+from .versions import bump_plant_versions
+
+SEED_USERS = 40
+SEED_PLANTS_PER_USER = 5
+SEED_DAYS = 730
+# A sequential scan is fine on tables the planner knows to be this small
+SEQ_SCAN_MIN_ROWS = 1000
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryPlanTestCase(TestCase):
+    """
+    Seeds two years of daily data for 200 plants and checks the plans of the hot queries:
+    none may scan a large table sequentially or cost more than its budget.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = date.today()
+        cls.first_day = cls.today - timedelta(days=SEED_DAYS - 1)
+
+        users = User.objects.bulk_create([
+            User(email=f"user{n}@example.com", first_name="Test", last_name="User",
+                 address="Street 1", city="Cluj", country="Romania")
+            for n in range(SEED_USERS)
+        ])
+        Plant.objects.bulk_create([
+            Plant(user=user, ingestion_type="API", plant_name=f"{user.email} plant {n}")
+            for user in users for n in range(SEED_PLANTS_PER_USER)
+        ])
+        cls.user = users[0]
+        cls.plant = cls.user.plant_settings.order_by("id").first()
+
+        with connection.cursor() as cur:
+            cur.execute("SELECT apiapp_create_read_date_partitions('apiapp_plantdata', %s, %s)", (cls.first_day, cls.today))
+            cur.execute("SELECT apiapp_create_read_date_partitions('apiapp_alertlog', %s, %s)", (cls.first_day, cls.today))
+            cur.execute("""
+                INSERT INTO apiapp_alarmplant (plant_id, threshold_value, metric_type, window_days, min_days, is_active)
+                SELECT id, 80, 'yield', 7, 5, TRUE
+                FROM apiapp_plant
+            """)
+            # One valid row per plant and day, plus a superseded copy of every tenth day
+            cur.execute("""
+                INSERT INTO apiapp_plantdata (
+                    plant_id, total_string_capacity_kwp, yield_kwh, total_yield_kwh, specific_energy_kwh_per_kwp,
+                    peak_ac_power_kw, grid_connection_duration_h, read_date, load_date, is_valid, content_hash
+                )
+                SELECT p.id, 100, 400 + (d %% 50), 1000 + d, 4, 80, 10, %(first_day)s + d, %(first_day)s + d + 1,
+                       valid, md5(p.id || '-' || d || '-' || valid)
+                FROM apiapp_plant p
+                CROSS JOIN generate_series(0, %(days)s - 1) AS d
+                CROSS JOIN (VALUES (TRUE), (FALSE)) AS v(valid)
+                WHERE valid OR d %% 10 = 0
+            """, {"first_day": cls.first_day, "days": SEED_DAYS})
+            # One alert per valid row; the last two weeks are still unread
+            cur.execute("""
+                INSERT INTO apiapp_alertlog (
+                    plant_id, plant_data_id, alarm_id, read_date, status, metric_type,
+                    avg_value, threshold_value, actual_value, triggered_at, is_valid, unread
+                )
+                SELECT pd.plant_id, pd.id, ap.id, pd.read_date,
+                       CASE WHEN pd.id %% 7 = 0 THEN 'triggered' ELSE 'ok' END, 'yield',
+                       420, 336, pd.yield_kwh, NULL, TRUE, pd.read_date > %s - 14
+                FROM apiapp_plantdata pd
+                JOIN apiapp_alarmplant ap ON ap.plant_id = pd.plant_id
+                WHERE pd.is_valid = TRUE
+            """, (cls.today,))
+        rebuild_rollups()
+        rebuild_availability()
+        with connection.cursor() as cur:
+            # Checks the seed's deferred foreign keys once, rather than after every test
+            cur.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            cur.execute("SET CONSTRAINTS ALL DEFERRED")
+            cur.execute("ANALYZE apiapp_plant, apiapp_alarmplant, apiapp_plantdata, apiapp_alertlog, "
+                        "apiapp_plantdatarollup, apiapp_plantavailabilityday")
+
+    def setUp(self):
+        caches[settings.RESPONSE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def explain(self, sql, params=None):
+        with connection.cursor() as cur:
+            cur.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cur.fetchone()[0]
+        return plan[0]["Plan"] if isinstance(plan, list) else json.loads(plan)[0]["Plan"]
+
+    def assertPlanWithinBudget(self, label, sql, params=None, max_cost=None, seq_scan_allowed=()):
+        plan = self.explain(sql, params)
+        scanned = [
+            node["Relation Name"] for node in plan_nodes(plan)
+            if node["Node Type"] == "Seq Scan" and not node["Relation Name"].startswith(seq_scan_allowed)
+        ]
+        if scanned:
+            with connection.cursor() as cur:
+                cur.execute("SELECT relname, reltuples FROM pg_class WHERE relname = ANY(%s)", (scanned,))
+                large = sorted(name for name, rows in cur.fetchall() if rows >= SEQ_SCAN_MIN_ROWS)
+            self.assertFalse(large, f"{label} scans {', '.join(large)} sequentially:\n{sql}")
+        if max_cost is not None:
+            self.assertLessEqual(plan["Total Cost"], max_cost, f"{label} exceeds its cost budget:\n{sql}")
+
+    def assertEndpointPlans(self, method, url, max_cost):
+        """Runs the request and checks the plan of every query it sent to PlantData, AlertLog or their rollups."""
+        with CaptureQueriesContext(connection) as captured:
+            response = getattr(self.client, method)(url)
+        self.assertLess(response.status_code, 400, response.content)
+
+        checked = 0
+        for query in captured.captured_queries:
+            sql = query["sql"]
+            if not sql.startswith(("SELECT", "UPDATE")):
+                continue
+            if not any(table in sql for table in ("apiapp_plantdata", "apiapp_alertlog", "apiapp_plantavailabilityday")):
+                continue
+            self.assertPlanWithinBudget(url, sql, max_cost=max_cost)
+            checked += 1
+        self.assertGreater(checked, 0, f"{url} sent no PlantData, AlertLog or rollup queries")
+
+    def test_plant_data_endpoint(self):
+        self.assertEndpointPlans("get", f"/api/plants/{self.plant.id}/get_data/", max_cost=4000)
+
+    def test_aggregated_report_endpoint(self):
+        self.assertEndpointPlans("get", "/api/aggregated-report/", max_cost=1000)
+
+    def test_notifications_endpoint(self):
+        self.assertEndpointPlans("get", "/api/get-notifications-user/", max_cost=1000)
+
+    def test_notifications_next_page(self):
+        cursor = self.client.get("/api/get-notifications-user/?limit=10").json()["next_cursor"]
+        self.assertEndpointPlans("get", f"/api/get-notifications-user/?limit=10&cursor={cursor}", max_cost=1000)
+
+    def test_notifications_pages_cover_every_unread_alert(self):
+        expected = list(
+            AlertLog.objects.filter(plant__user=self.user, is_valid=True, unread=True)
+            .order_by("-read_date", "-id")
+            .values_list("id", flat=True)
+        )
+        seen, cursor = [], None
+        while True:
+            page = self.client.get("/api/get-notifications-user/", {"limit": 6, **({"cursor": cursor} if cursor else {})}).json()
+            seen += [alert["id"] for alert in page["alerts"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+
+    def test_unread_count_endpoint(self):
+        self.assertEndpointPlans("get", "/api/get-notifications-unread-count/", max_cost=500)
+
+    def test_mark_alert_endpoint(self):
+        alert = AlertLog.objects.filter(plant=self.plant, unread=True).first()
+        self.assertEndpointPlans("post", f"/api/mark-alert/{alert.id}/", max_cost=500)
+
+    def test_system_availability_endpoint(self):
+        self.assertEndpointPlans("get", "/api/system-availability/", max_cost=1000)
+        self.assertEndpointPlans("get", "/api/system-availability/?window=30", max_cost=500)
+
+    def test_system_availability_matches_alert_log(self):
+        for window in (None, 30, 365):
+            alerts = AlertLog.objects.filter(plant__user=self.user, is_valid=True)
+            if window:
+                alerts = alerts.filter(read_date__gt=self.today - timedelta(days=window))
+            expected = {
+                row["plant_id"]: (row["ok"], row["triggered"])
+                for row in alerts.values("plant_id").annotate(
+                    ok=Count("id", filter=Q(status="ok")),
+                    triggered=Count("id", filter=Q(status="triggered")),
+                )
+            }
+            response = self.client.get("/api/system-availability/", {"window": window} if window else {}).json()
+            self.assertEqual(response["window_days"], window)
+            self.assertEqual(
+                {plant["plant_id"]: (plant["ok_count"], plant["triggered_count"]) for plant in response["plants"]},
+                expected,
+            )
+
+    def test_system_availability_rejects_invalid_window(self):
+        for window in ("0", "-30", "month"):
+            response = self.client.get("/api/system-availability/", {"window": window})
+            self.assertEqual(response.status_code, 400)
+
+    @override_settings(ALERTLOG_RETENTION_DAYS=365)
+    def test_rebuild_availability_keeps_days_past_retention(self):
+        expired_day = self.today - timedelta(days=400)
+        recent_day = self.today - timedelta(days=10)
+        counters = self.plant.availability_days.filter(day__in=[expired_day, recent_day])
+        before = {row.day: row.ok_count + row.triggered_count for row in counters.all()}
+
+        # As retention would, and an invalidation the counters did not see
+        AlertLog.objects.filter(plant=self.plant, read_date__in=[expired_day, recent_day]).update(is_valid=False)
+        rebuild_availability([self.plant.id])
+
+        after = {row.day: row.ok_count + row.triggered_count for row in counters.all()}
+        self.assertEqual(before, {expired_day: 1, recent_day: 1})
+        self.assertEqual(after, {expired_day: 1})
+
+    def test_loader_supersede_check(self):
+        # csv_db_write.bulk_load_plant_data: changed rows of a batch and the valid rows they replace
+        batch = """(VALUES (%(plant_id)s, %(day)s::date, 'x'), (%(plant_id)s, %(day)s::date - 1, 'y')) AS i(plant_id, read_date, content_hash)"""
+        params = {"plant_id": self.plant.id, "day": self.today}
+        self.assertPlanWithinBudget("loader unchanged check", f"""
+            SELECT i.*
+            FROM {batch}
+            WHERE NOT EXISTS (
+                SELECT 1
+                FROM apiapp_plantdata pd
+                WHERE pd.plant_id = i.plant_id
+                  AND pd.read_date = i.read_date
+                  AND pd.is_valid = TRUE
+                  AND pd.content_hash = i.content_hash
+            )
+        """, params, max_cost=1000)
+        self.assertPlanWithinBudget("loader supersede", f"""
+            UPDATE apiapp_plantdata pd
+            SET is_valid = FALSE
+            FROM {batch}
+            WHERE pd.plant_id = i.plant_id
+              AND pd.read_date = i.read_date
+              AND pd.is_valid = TRUE
+        """, params, max_cost=1000)
+
+    def test_alert_job_queries(self):
+        # insert_alerts._load_targets: the latest valid row of every plant loaded since the watermark
+        with connection.cursor() as cur:
+            cur.execute("SELECT MAX(id) FROM apiapp_plantdata")
+            high = cur.fetchone()[0]
+        self.assertPlanWithinBudget("alert targets", """
+            SELECT DISTINCT ON (pd.plant_id) pd.id, pd.plant_id, pd.read_date, pd.yield_kwh
+            FROM apiapp_plantdata pd
+            WHERE pd.id > %(low)s AND pd.id <= %(high)s
+              AND pd.is_valid = TRUE
+              AND EXISTS (
+                  SELECT 1
+                  FROM apiapp_alarmplant ap
+                  WHERE ap.plant_id = pd.plant_id
+                    AND ap.is_active = TRUE
+              )
+            ORDER BY pd.plant_id, pd.read_date DESC, pd.load_date DESC
+        """, {"low": high - 400, "high": high}, max_cost=1000)
+
+        # alert_rules.fetch_windows: the trailing window of every target plant
+        plant_ids = list(Plant.objects.order_by("id").values_list("id", flat=True)[:10])
+        self.assertPlanWithinBudget("alert windows", """
+            WITH targets AS (
+                SELECT *
+                FROM unnest(%s::bigint[], %s::int[], %s::int[]) AS t(plant_id, day, window_days)
+            )
+            SELECT array_agg(pd.yield_kwh ORDER BY pd.plant_id, pd.read_date)
+            FROM targets t
+            JOIN apiapp_plantdata pd ON pd.plant_id = t.plant_id
+                AND pd.read_date BETWEEN DATE '1970-01-01' + (t.day - t.window_days) AND DATE '1970-01-01' + t.day
+            WHERE pd.is_valid = TRUE
+        """, (plant_ids, [(self.today - date(1970, 1, 1)).days] * 10, [7] * 10), max_cost=8000)
+
+        # alert_rules.write_alert_logs: the valid alerts replaced by a new evaluation
+        self.assertPlanWithinBudget("alert invalidation", """
+            UPDATE apiapp_alertlog al
+            SET is_valid = FALSE
+            FROM unnest(%s::bigint[], %s::bigint[], %s::varchar[], %s::varchar[], %s::float8[])
+                AS r(plant_data_id, alarm_id, metric_type, status, actual_value)
+            WHERE al.plant_data_id = r.plant_data_id
+              AND al.is_valid = TRUE
+              AND (al.alarm_id = r.alarm_id OR (al.alarm_id IS NULL AND al.metric_type = r.metric_type))
+              AND (al.status <> r.status OR al.actual_value <> r.actual_value)
+        """, ([high] * 10, [1] * 10, ["yield"] * 10, ["ok"] * 10, [0.0] * 10), max_cost=2500)
+
+    def test_retention_queries(self):
+        # retention._delete_chunks: the next chunk of superseded readings no alert references.
+        # The anti-join hashes AlertLog once per chunk, which beats probing every partition per row.
+        self.assertPlanWithinBudget("superseded plant data chunk", """
+            SELECT id
+            FROM apiapp_plantdata
+            WHERE load_date < %s
+              AND is_valid = FALSE
+              AND NOT EXISTS (SELECT 1 FROM apiapp_alertlog al WHERE al.plant_data_id = apiapp_plantdata.id)
+            LIMIT 5000
+        """, (self.today - timedelta(days=90),), max_cost=10000, seq_scan_allowed=("apiapp_alertlog",))
+
+    def test_plant_day_partition_lookup(self):
+        # assets.plant_day_data: the valid row of one plant-day partition
+        self.assertPlanWithinBudget("plant day lookup", """
+            SELECT id, content_hash
+            FROM apiapp_plantdata
+            WHERE plant_id = %s AND read_date = %s AND is_valid = TRUE
+            ORDER BY id DESC
+            LIMIT 1
+        """, (self.plant.id, self.today), max_cost=50)
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTestCase(TestCase):
+    """
+    Requests every read endpoint for a user with one plant and for one with six, authenticated
+    by cookie as the client is: each must stay within its view's query_budget whatever the
+    number of plants, and none may repeat a statement.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = date.today()
+        with connection.cursor() as cur:
+            cur.execute("SELECT apiapp_create_read_date_partitions('apiapp_plantdata', %s, %s)", (cls.today - timedelta(days=3), cls.today))
+            cur.execute("SELECT apiapp_create_read_date_partitions('apiapp_alertlog', %s, %s)", (cls.today - timedelta(days=3), cls.today))
+        cls.small = cls.create_user("small@example.com", plants=1)
+        cls.large = cls.create_user("large@example.com", plants=6)
+        rebuild_rollups()
+        rebuild_availability()
+
+    @classmethod
+    def create_user(cls, email, plants):
+        user = User.objects.create(email=email, first_name="Test", last_name="User",
+                                   address="Street 1", city="Cluj", country="Romania")
+        for n in range(plants):
+            plant = Plant.objects.create(user=user, ingestion_type="API", plant_name=f"{email} plant {n}")
+            Device.objects.bulk_create([
+                Device(plant=plant, name=f"Inverter {d}", serial_number=f"{plant.id}-{d}", device_type="inverter")
+                for d in range(2)
+            ])
+            alarms = AlarmPlant.objects.bulk_create([
+                AlarmPlant(plant=plant, threshold_value=80, metric_type=metric, window_days=7, min_days=5)
+                for metric in ("yield", "power")
+            ])
+            for offset in range(3):
+                read_date = cls.today - timedelta(days=offset)
+                plant_data = PlantData.objects.create(
+                    plant=plant, total_string_capacity_kwp=100, yield_kwh=400, total_yield_kwh=1000,
+                    specific_energy_kwh_per_kwp=4, peak_ac_power_kw=80, grid_connection_duration_h=10,
+                    read_date=read_date, load_date=read_date, content_hash=f"{plant.id}-{offset}",
+                )
+                AlertLog.objects.create(
+                    plant=plant, plant_data=plant_data, alarm=alarms[0], read_date=read_date,
+                    status="triggered" if offset else "ok", metric_type="yield", avg_value=420,
+                    threshold_value=336, actual_value=400, unread=True,
+                )
+        return user
+
+    def setUp(self):
+        caches[settings.RESPONSE_CACHE_ALIAS].clear()
+
+    def request(self, user, method, url):
+        client = APIClient()
+        client.cookies["access_token"] = str(AccessToken.for_user(user))
+        response = getattr(client, method)(url)
+        self.assertLess(response.status_code, 400, response.content)
+        return response.wsgi_request
+
+    def assertConstantQueries(self, url, method="get", url_for=None):
+        counts = []
+        for user in (self.small, self.large):
+            request = self.request(user, method, url_for(user) if url_for else url)
+            self.assertIsNotNone(request.query_budget, f"{url} has no query_budget")
+            recorder = request.query_recorder
+            self.assertEqual(recorder.repeated_shapes(settings.QUERY_REPEAT_THRESHOLD), [], f"{url} repeats a query")
+            counts.append(recorder.count)
+        self.assertEqual(counts[0], counts[1], f"{url} sends more queries for more plants")
+
+    def test_plants_overview(self):
+        self.assertConstantQueries("/api/get-plants-overview/")
+
+    def test_system_availability(self):
+        self.assertConstantQueries("/api/system-availability/")
+
+    def test_aggregated_report(self):
+        self.assertConstantQueries("/api/aggregated-report/")
+
+    def test_notifications(self):
+        self.assertConstantQueries("/api/get-notifications-user/")
+
+    def test_unread_count(self):
+        self.assertConstantQueries("/api/get-notifications-unread-count/")
+
+    def test_plant_data(self):
+        self.assertConstantQueries(
+            "/api/plants/<id>/get_data/",
+            url_for=lambda user: f"/api/plants/{user.plant_settings.first().id}/get_data/",
+        )
+
+    def test_mark_alert(self):
+        self.assertConstantQueries(
+            "/api/mark-alert/<id>/", method="post",
+            url_for=lambda user: f"/api/mark-alert/{AlertLog.objects.filter(plant__user=user, unread=True).first().id}/",
+        )
+
+    def test_budget_is_enforced(self):
+        with mock.patch.object(views.PlantOverviewAPIView, "query_budget", 1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.request(self.large, "get", "/api/get-plants-overview/")
+
+    @override_settings(QUERY_REPEAT_THRESHOLD=1)
+    def test_repeated_queries_are_enforced(self):
+        # With a threshold of one, every statement counts as repeated
+        with self.assertRaisesMessage(QueryBudgetExceeded, "PlantOverviewAPIView sent the same query 1 times"):
+            self.request(self.large, "get", "/api/get-plants-overview/")
+
+    def test_cached_responses_only_check_versions(self):
+        plant = self.large.plant_settings.order_by("id").first()
+        for url in ("/api/get-plants-overview/", "/api/system-availability/?window=30",
+                    "/api/aggregated-report/", f"/api/plants/{plant.id}/get_data/"):
+            first = self.request(self.large, "get", url)
+            second = self.request(self.large, "get", url)
+            # The token's user and the versions of the user's plants
+            self.assertEqual(second.query_recorder.count, 2, url)
+            self.assertLess(second.query_recorder.count, first.query_recorder.count, url)
+            view_name = second.query_view_name
+            self.assertGreaterEqual(cache_metrics()[view_name]["hits"], 1)
+
+    def test_users_do_not_share_cached_responses(self):
+        large = APIClient()
+        large.cookies["access_token"] = str(AccessToken.for_user(self.large))
+        small = APIClient()
+        small.cookies["access_token"] = str(AccessToken.for_user(self.small))
+        self.assertEqual(len(large.get("/api/get-plants-overview/").json()), 6)
+        self.assertEqual(len(small.get("/api/get-plants-overview/").json()), 1)
+
+    def test_data_version_bump_refreshes_cached_chart(self):
+        plant = self.small.plant_settings.first()
+        url = f"/api/plants/{plant.id}/get_data/"
+        client = APIClient()
+        client.cookies["access_token"] = str(AccessToken.for_user(self.small))
+        before = client.get(url).json()
+
+        read_date = self.today - timedelta(days=3)
+        PlantData.objects.create(
+            plant=plant, total_string_capacity_kwp=100, yield_kwh=500, total_yield_kwh=1500,
+            specific_energy_kwh_per_kwp=5, peak_ac_power_kw=90, grid_connection_duration_h=11,
+            read_date=read_date, load_date=self.today, content_hash=f"{plant.id}-new",
+        )
+        # Still the cached chart until the loader moves the data version on
+        self.assertEqual(client.get(url).json(), before)
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_plant_versions([plant.id], "data")
+        after = client.get(url).json()
+        self.assertEqual(after["range"]["total_points"], before["range"]["total_points"] + 1)
+
+    def test_device_edit_refreshes_cached_overview(self):
+        plant = self.small.plant_settings.first()
+        client = APIClient()
+        client.cookies["access_token"] = str(AccessToken.for_user(self.small))
+        self.assertEqual(len(client.get("/api/get-plants-overview/").json()[0]["devices"]), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Device.objects.create(plant=plant, name="Meter", serial_number=f"{plant.id}-m", device_type="meter")
+        self.assertEqual(len(client.get("/api/get-plants-overview/").json()[0]["devices"]), 3)
+
+    def test_matching_etag_answers_304_without_building(self):
+        plant = self.large.plant_settings.order_by("id").first()
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_plant_versions([plant.id], "data")
+        client = APIClient()
+        client.cookies["access_token"] = str(AccessToken.for_user(self.large))
+        for url in ("/api/get-plants-overview/", "/api/system-availability/", "/api/aggregated-report/",
+                    f"/api/plants/{plant.id}/get_data/", "/api/get-notifications-user/?limit=2",
+                    "/api/get-notifications-unread-count/"):
+            first = client.get(url)
+            self.assertTrue(first["ETag"].startswith('"'), url)
+            self.assertIn("Last-Modified", first, url)
+            self.assertIn("no-cache", first["Cache-Control"], url)
+
+            second = client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+            self.assertEqual(second.status_code, 304, url)
+            self.assertEqual(second["ETag"], first["ETag"])
+            self.assertEqual(second.content, b"")
+            self.assertEqual(second.wsgi_request.query_recorder.count, 2, url)
+
+            other = client.get(url, HTTP_IF_NONE_MATCH='"stale"')
+            self.assertEqual(other.status_code, 200, url)
+
+    def test_marking_an_alert_read_changes_the_etag(self):
+        client = APIClient()
+        client.cookies["access_token"] = str(AccessToken.for_user(self.small))
+        count = client.get("/api/get-notifications-unread-count/")
+        page = client.get("/api/get-notifications-user/")
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(f"/api/mark-alert/{page.json()['alerts'][0]['id']}/")
+
+        recount = client.get("/api/get-notifications-unread-count/", HTTP_IF_NONE_MATCH=count["ETag"])
+        self.assertEqual(recount.status_code, 200)
+        self.assertEqual(recount.json()["unread_count"], count.json()["unread_count"] - 1)
+        repage = client.get("/api/get-notifications-user/", HTTP_IF_NONE_MATCH=page["ETag"])
+        self.assertEqual(repage.status_code, 200)
+        self.assertEqual(len(repage.json()["alerts"]), len(page.json()["alerts"]) - 1)
+
+
+class PvgisStandIn(ThreadingHTTPServer):
+    """Local PVcalc answering with the parameters it got, after `delay_s`, or with `status` when set."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), PvgisStandInHandler)
+        self.calls = []
+        self.delay_s = 0
+        self.status = 200
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api/v5_3/PVcalc"
+
+
+class PvgisStandInHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        params = {name: values[0] for name, values in parse_qs(urlparse(self.path).query).items()}
+        with self.server.lock:
+            self.server.calls.append(params)
+        time.sleep(self.server.delay_s)
+        body = {"inputs": params, "outputs": {"totals": {"fixed": {"E_y": 1200.0 * float(params["peakpower"])}}}}
+        if self.server.status != 200:
+            body = {"message": "stand-in error"}
+        payload = json.dumps(body).encode()
+        self.send_response(self.server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PvgisEstimationTestCase(TransactionTestCase):
+    """
+    Runs the PVGIS client against a local stand-in. Transactional, as coalescing and background
+    refreshes need other threads to see what each one commits.
+    """
+
+    PARAMS = dict(latitude=46.7712, longitude=23.6236, peak_power=5, losses=14, tilt=30, azimuth=0,
+                  elevation=0, year_min=2005, year_max=2023)
+
+    def setUp(self):
+        self.stand_in = PvgisStandIn()
+        threading.Thread(target=self.stand_in.serve_forever, daemon=True).start()
+        self.addCleanup(self.stand_in.server_close)
+        self.addCleanup(self.stand_in.shutdown)
+
+    def client_for_stand_in(self, **kwargs):
+        options = dict(url=self.stand_in.url, connect_timeout_s=1, read_timeout_s=2, ttl_s=3600, stale_s=3600)
+        options.update(kwargs)
+        return PvgisClient(**options)
+
+    def concurrently(self, calls):
+        results = [None] * len(calls)
+
+        def run(index, call):
+            try:
+                results[index] = call()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(index, call)) for index, call in enumerate(calls)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_nearby_locations_share_one_estimate(self):
+        client = self.client_for_stand_in()
+        first, served = client.estimate(normalize_params(**self.PARAMS))
+        self.assertEqual(served, "miss")
+        nearby = dict(self.PARAMS, latitude=46.7688, longitude=23.6214, tilt=30.2)
+        second, served = client.estimate(normalize_params(**nearby))
+        self.assertEqual(served, "hit")
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.stand_in.calls), 1)
+        self.assertEqual(self.stand_in.calls[0]["lat"], "46.75")
+        self.assertEqual(self.stand_in.calls[0]["lon"], "23.6")
+
+    def test_concurrent_requests_share_one_upstream_call(self):
+        self.stand_in.delay_s = 0.5
+        params = normalize_params(**self.PARAMS)
+        client = self.client_for_stand_in()
+        # A second client stands in for another worker process, coalesced by the advisory lock only
+        other_process = self.client_for_stand_in()
+        results = self.concurrently(
+            [lambda: client.estimate(params)[0]] * 4 + [lambda: other_process.estimate(params)[0]] * 2
+        )
+        self.assertEqual(len(self.stand_in.calls), 1)
+        self.assertTrue(all(result == results[0] for result in results))
+
+    def test_stale_estimate_is_served_while_it_refreshes(self):
+        params = normalize_params(**self.PARAMS)
+        refreshes = []
+        client = self.client_for_stand_in(run_in_background=refreshes.append)
+        client.estimate(params)
+        PvgisEstimate.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        data, served = client.estimate(params)
+        self.assertEqual(served, "stale")
+        self.assertEqual(len(refreshes), 1)
+        self.assertEqual(len(self.stand_in.calls), 1)
+
+        self.concurrently(refreshes)
+        self.assertEqual(len(self.stand_in.calls), 2)
+        self.assertGreater(PvgisEstimate.objects.get().expires_at, timezone.now())
+        self.assertEqual(client.estimate(params)[1], "hit")
+
+    def test_upstream_timeout_falls_back_to_the_stored_estimate(self):
+        params = normalize_params(**self.PARAMS)
+        client = self.client_for_stand_in(read_timeout_s=0.2)
+        self.stand_in.delay_s = 1
+        with self.assertRaises(PvgisUnavailableError):
+            client.estimate(params)
+
+        self.stand_in.delay_s = 0
+        stored, _ = client.estimate(params)
+        # Expired past the stale window too, so it is only served because PVGIS fails
+        PvgisEstimate.objects.update(expires_at=timezone.now() - timedelta(days=1))
+        self.stand_in.delay_s = 1
+        data, served = client.estimate(params)
+        self.assertEqual(served, "stale-on-error")
+        self.assertEqual(data, stored)
+
+    @mock.patch.object(views, "fetch_day_ahead_market_price", return_value={"month_year": "May 2025", "price_lei_per_MWh": 412.5})
+    def test_estimation_endpoint(self, fetch_price):
+        with override_settings(PVGIS_URL=self.stand_in.url):
+            payload = {"latitude": 46.7712, "longitude": 23.6236, "peak_power": 5}
+            first = APIClient().post("/api/get-pv-estimation/", payload, format="json")
+            second = APIClient().post("/api/get-pv-estimation/", payload, format="json")
+            self.assertEqual(first.status_code, 200, first.content)
+            self.assertEqual(first["X-PVGIS-Cache"], "miss")
+            self.assertEqual(second["X-PVGIS-Cache"], "hit")
+            self.assertEqual(first.json()["pvgis_data"], second.json()["pvgis_data"])
+            self.assertEqual(first.json()["market_price"], fetch_price.return_value)
+
+            self.stand_in.status = 400
+            rejected = APIClient().post("/api/get-pv-estimation/", dict(payload, latitude=89.9), format="json")
+            self.assertEqual(rejected.status_code, 400)
+            self.assertEqual(rejected.json()["error"], "stand-in error")
+            self.assertFalse(PvgisEstimate.objects.filter(key=params_key(normalize_params(**dict(self.PARAMS, latitude=89.9)))).exists())
+
+            missing = APIClient().post("/api/get-pv-estimation/", {"longitude": 23.6}, format="json")
+            self.assertEqual(missing.status_code, 400)
+
+
+@override_settings(INGESTION_QUEUE_ENABLED=True)
+class PayloadIngestionTestCase(TestCase):
+    """Posts payloads to the ingestion endpoint of a plant, staging them in a temporary directory."""
+
+    READING = {
+        "total_string_capacity_kwp": 10.0, "yield_kwh": 41.5, "total_yield_kwh": 1200.0,
+        "specific_energy_kwh_per_kwp": 4.15, "peak_ac_power_kw": 9.2, "grid_connection_duration_h": 11.0,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email="owner@example.com", first_name="Test", last_name="User",
+                                       address="Street 1", city="Cluj", country="Romania")
+        cls.plant = Plant.objects.create(user=cls.user, ingestion_type="API", plant_name="Plant")
+        cls.url = f"/api/plants/{cls.plant.id}/ingest/"
+        cls.day = date(2025, 5, 1)
+        with connection.cursor() as cur:
+            cur.execute("SELECT apiapp_create_read_date_partitions('apiapp_plantdata', %s, %s)", (cls.day, cls.day))
+
+    def setUp(self):
+        staging_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(staging_dir.cleanup)
+        self.staging_dir = staging_dir.name
+        staging = override_settings(PAYLOAD_STAGING_DIR=self.staging_dir)
+        staging.enable()
+        self.addCleanup(staging.disable)
+        self.client = APIClient()
+        self.client.cookies["access_token"] = str(AccessToken.for_user(self.user))
+
+    def post_file(self, name, body):
+        return self.client.post(self.url, {"file": SimpleUploadedFile(name, body)}, format="multipart")
+
+    def staged_files(self):
+        return [name for _, _, names in os.walk(self.staging_dir) for name in names]
+
+    def post_reading(self, **changes):
+        return self.client.post(self.url, {"data": dict(self.READING, read_date=self.day.isoformat(), **changes)},
+                                format="json")
+
+    def store_reading(self):
+        values = [self.READING[column] for column in NUMERIC_COLUMNS]
+        PlantData.objects.create(plant=self.plant, read_date=self.day, load_date=self.day,
+                                 content_hash=row_content_hash(self.plant.id, values, self.day), **self.READING)
+
+    def test_unloadable_payloads_are_rejected(self):
+        payloads = [
+            ("data.json", b"not json"),
+            ("data.json", b"[5]"),
+            ("data.json", b'"abc"'),
+            ("data.json", b"[]"),
+            ("data.json", json.dumps([self.READING]).encode() + b" trailing"),
+            ("data.csv", b"read_date,yield_kwh\n"),
+            ("data.csv", b"read_date,yield_kwh\n\xff\xfe\n"),
+        ]
+        for name, body in payloads:
+            with self.subTest(body=body):
+                response = self.post_file(name, body)
+                self.assertEqual(response.status_code, 400, response.content)
+
+        response = self.client.post(self.url, {"data": [1, 2]}, format="json")
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(self.staged_files(), [])
+        self.assertFalse(IngestionQueueItem.objects.exists())
+
+    def test_objects_and_lists_of_objects_are_queued(self):
+        single = self.client.post(self.url, {"data": dict(self.READING, read_date="2025-05-01")}, format="json")
+        listed = self.post_file("data.json", json.dumps([dict(self.READING, read_date="2025-05-02")]).encode())
+        for response in (single, listed):
+            self.assertEqual(response.status_code, 202, response.content)
+        self.assertEqual(IngestionQueueItem.objects.filter(plant=self.plant, status="pending").count(), 2)
+        self.assertEqual(len(self.staged_files()), 2)
+
+    def test_stored_reading_sent_again_is_skipped(self):
+        self.store_reading()
+        self.assertEqual(self.post_reading().status_code, 200)
+        changed = self.post_reading(yield_kwh=40.0)
+        self.assertEqual(changed.status_code, 202, changed.content)
+        self.assertEqual(IngestionQueueItem.objects.count(), 1)
+
+    def test_queued_payload_sent_again_is_skipped_until_another_follows(self):
+        first = self.post_reading()
+        self.assertEqual(first.status_code, 202, first.content)
+        self.assertEqual(self.post_reading().status_code, 200)
+
+        self.assertEqual(self.post_reading(yield_kwh=40.0).status_code, 202)
+        # Skipping this one would leave the plant on the payload queued before it
+        self.assertEqual(self.post_reading().status_code, 202)
+        self.assertEqual(IngestionQueueItem.objects.count(), 3)
+
+    def test_plant_id_defaults_like_the_loader(self):
+        self.store_reading()
+        # An empty CSV cell falls back to the plant of the request, a JSON plant_id that is present does not
+        header = ",".join(["plant_id", "read_date", *self.READING])
+        row = ",".join(["", self.day.isoformat(), *(str(value) for value in self.READING.values())])
+        self.assertEqual(self.post_file("data.csv", f"{header}\n{row}\n".encode()).status_code, 200)
+        self.assertEqual(self.post_reading(plant_id=0).status_code, 202)
+
+
+class ApiKeyTestCase(TestCase):
+    """Resolves ingestion API keys: prefixed keys by their HMAC digest, legacy keys by their PBKDF2 hash."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email="keys@example.com", first_name="Test", last_name="User",
+                                       address="Street 1", city="Cluj", country="Romania")
+        cls.plant = Plant.objects.create(user=cls.user, ingestion_type="API", plant_name="Prefixed")
+        cls.raw_key, key_prefix, key_digest = api_keys.generate_api_key()
+        cls.setting = ApiKeyIngestionSettings.objects.create(plant=cls.plant, key_prefix=key_prefix, key_digest=key_digest)
+
+        cls.legacy_plant = Plant.objects.create(user=cls.user, ingestion_type="API", plant_name="Legacy")
+        cls.legacy_key = "legacy-key-without-prefix"
+        ApiKeyIngestionSettings.objects.create(plant=cls.legacy_plant, api_key=make_password(cls.legacy_key))
+
+    def setUp(self):
+        for cache in (api_keys._verified_keys, api_keys._missed_keys, api_keys._legacy_scans):
+            cache.clear()
+        self.clock = 1000.0
+        clock = mock.patch.object(api_keys.time, "monotonic", side_effect=lambda: self.clock)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def test_prefixed_key_is_verified_by_digest(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(api_keys.resolve_api_key(self.raw_key), self.plant.id)
+        key_prefix = self.raw_key.split(".", 1)[0]
+        self.assertIsNone(api_keys.resolve_api_key(f"{key_prefix}.not-the-secret"))
+        self.assertIsNone(api_keys.resolve_api_key("unknown.secret"))
+
+    def test_verified_keys_are_cached_for_the_ttl(self):
+        api_keys.resolve_api_key(self.raw_key)
+        # Bypasses the signal that evicts the key from this process, as another worker's change would
+        ApiKeyIngestionSettings.objects.filter(id=self.setting.id).update(is_active=False)
+        with self.assertNumQueries(0):
+            self.assertEqual(api_keys.resolve_api_key(self.raw_key), self.plant.id)
+
+        self.clock += api_keys.CACHE_TTL_SECONDS
+        self.assertIsNone(api_keys.resolve_api_key(self.raw_key))
+
+    def test_saving_the_setting_evicts_the_key(self):
+        api_keys.resolve_api_key(self.raw_key)
+        self.setting.is_active = False
+        self.setting.save()
+        self.assertIsNone(api_keys.resolve_api_key(self.raw_key))
+
+    def test_legacy_key_records_its_digest_on_first_use(self):
+        with mock.patch.object(api_keys, "check_password", wraps=api_keys.check_password) as check_password:
+            self.assertEqual(api_keys.resolve_api_key(self.legacy_key), self.legacy_plant.id)
+            self.assertEqual(check_password.call_count, 1)
+            api_keys._verified_keys.clear()
+            self.assertEqual(api_keys.resolve_api_key(self.legacy_key), self.legacy_plant.id)
+            self.assertEqual(check_password.call_count, 1)
+        self.assertEqual(ApiKeyIngestionSettings.objects.get(plant=self.legacy_plant).key_digest,
+                         api_keys._digest(self.legacy_key))
+
+    def test_missed_keys_are_not_hashed_again(self):
+        with mock.patch.object(api_keys, "check_password", wraps=api_keys.check_password) as check_password:
+            self.assertIsNone(api_keys.resolve_api_key("junk"))
+            self.assertEqual(check_password.call_count, 1)
+            with self.assertNumQueries(0):
+                self.assertIsNone(api_keys.resolve_api_key("junk"))
+            self.assertEqual(check_password.call_count, 1)
+
+            self.clock += api_keys.CACHE_TTL_SECONDS
+            self.assertIsNone(api_keys.resolve_api_key("junk"))
+            self.assertEqual(check_password.call_count, 2)
+
+    @mock.patch.object(api_keys, "LEGACY_SCANS_PER_MINUTE", 2)
+    def test_legacy_scans_are_capped_per_minute(self):
+        with mock.patch.object(api_keys, "check_password", wraps=api_keys.check_password) as check_password:
+            for n in range(3):
+                self.assertIsNone(api_keys.resolve_api_key(f"junk-{n}"))
+            self.assertEqual(check_password.call_count, 2)
+            self.assertIsNone(api_keys.resolve_api_key(self.legacy_key))
+            # Turned away unchecked, so the key is not remembered as a miss
+            self.clock += 60
+            self.assertEqual(api_keys.resolve_api_key(self.legacy_key), self.legacy_plant.id)
+
+
+def launch_response(status_code=200, typename="LaunchRunSuccess"):
+    response = mock.Mock(status_code=status_code)
+    response.raise_for_status.side_effect = (
+        requests.exceptions.HTTPError(f"{status_code} Server Error") if status_code >= 400 else None
+    )
+    response.json.return_value = {"data": {"launchPipelineExecution": {"__typename": typename, "run": {"runId": "run-1"}}}}
+    return response
+
+
+class DagsterLauncherTestCase(SimpleTestCase):
+    """Launches runs through a mocked session; the clock and the backoff sleeps are mocked too."""
+
+    def setUp(self):
+        self.launcher = dagster_launcher.DagsterLauncher(
+            graphql_url="http://data-unit/graphql", connect_timeout_s=3, read_timeout_s=10,
+            max_retries=2, backoff_s=0.5, failure_threshold=2, reset_after_s=30,
+        )
+        self.post = mock.patch.object(self.launcher.session, "post").start()
+        self.sleep = mock.patch.object(dagster_launcher.time, "sleep").start()
+        self.clock = 1000.0
+        mock.patch.object(dagster_launcher.time, "monotonic", side_effect=lambda: self.clock).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def launch(self):
+        return self.launcher.launch_job("file_ingestion_pipeline", {"ops": {}})
+
+    def test_launch_posts_with_both_timeouts(self):
+        self.post.return_value = launch_response()
+        self.assertEqual(self.launch()["run"]["runId"], "run-1")
+        self.assertEqual(self.post.call_args.kwargs["timeout"], (3, 10))
+        self.assertEqual(json.loads(self.post.call_args.kwargs["data"])["variables"]["executionParams"]["selector"]["jobName"],
+                         "file_ingestion_pipeline")
+        self.assertEqual(self.launcher.metrics.snapshot()["retries"], 0)
+
+    def test_gateway_errors_are_retried_with_backoff(self):
+        for status_code in (502, 503, 504):
+            with self.subTest(status_code=status_code):
+                self.post.reset_mock()
+                self.sleep.reset_mock()
+                self.post.side_effect = [launch_response(status_code), launch_response()]
+                self.assertEqual(self.launch()["__typename"], "LaunchRunSuccess")
+                self.assertEqual(self.post.call_count, 2)
+                self.sleep.assert_called_once_with(0.5)
+        self.assertEqual(self.launcher.metrics.snapshot()["retries"], 3)
+
+    def test_retries_stop_after_max_retries(self):
+        self.post.return_value = launch_response(503)
+        with self.assertRaises(dagster_launcher.DagsterUnavailableError):
+            self.launch()
+        self.assertEqual(self.post.call_count, 3)
+        self.assertEqual([c.args[0] for c in self.sleep.call_args_list], [0.5, 1.0])
+        self.assertEqual(self.launcher.metrics.snapshot()["failures"], 1)
+
+    def test_other_errors_are_not_retried(self):
+        self.post.return_value = launch_response(500)
+        with self.assertRaises(dagster_launcher.DagsterUnavailableError):
+            self.launch()
+        self.assertEqual(self.post.call_count, 1)
+
+    def test_connection_errors_are_retried(self):
+        self.post.side_effect = [requests.exceptions.ConnectionError("refused"), launch_response()]
+        self.assertEqual(self.launch()["__typename"], "LaunchRunSuccess")
+        self.assertEqual(self.post.call_count, 2)
+
+        self.post.reset_mock()
+        self.post.side_effect = requests.exceptions.ConnectionError("refused")
+        with self.assertRaises(dagster_launcher.DagsterUnavailableError):
+            self.launch()
+        self.assertEqual(self.post.call_count, 3)
+        self.assertEqual(self.launcher.metrics.snapshot()["retries"], 3)
+
+    def test_read_timeouts_are_not_retried(self):
+        # The webserver may already have launched the run
+        self.post.side_effect = requests.exceptions.ReadTimeout("read timed out")
+        with self.assertRaises(dagster_launcher.DagsterUnavailableError):
+            self.launch()
+        self.assertEqual(self.post.call_count, 1)
+        self.sleep.assert_not_called()
+
+    def test_breaker_opens_and_lets_one_trial_through(self):
+        self.post.side_effect = requests.exceptions.ReadTimeout("read timed out")
+        for _ in range(2):
+            with self.assertRaises(dagster_launcher.DagsterUnavailableError):
+                self.launch()
+        self.assertEqual(self.launcher.breaker.state, "open")
+
+        # Open: turned away without a request
+        self.post.reset_mock()
+        with self.assertRaisesMessage(dagster_launcher.DagsterUnavailableError, "Data unit is unavailable"):
+            self.launch()
+        self.post.assert_not_called()
+        self.assertEqual(self.launcher.metrics.snapshot()["rejected_by_circuit_breaker"], 1)
+
+        # Half-open: a failed trial re-opens the breaker for another reset period
+        self.clock += 30
+        with self.assertRaises(dagster_launcher.DagsterUnavailableError):
+            self.launch()
+        self.assertEqual(self.post.call_count, 1)
+        self.clock += 29
+        with self.assertRaisesMessage(dagster_launcher.DagsterUnavailableError, "Data unit is unavailable"):
+            self.launch()
+        self.assertEqual(self.post.call_count, 1)
+
+        # A successful trial closes it
+        self.clock += 1
+        self.post.side_effect = None
+        self.post.return_value = launch_response()
+        self.launch()
+        self.assertEqual(self.launcher.breaker.state, "closed")
+        self.assertEqual(self.launcher.breaker.failures, 0)
+
+    def test_rejected_launch_keeps_the_breaker_closed(self):
+        self.post.return_value = launch_response(typename="RunConfigValidationInvalid")
+        for _ in range(3):
+            with self.assertRaises(dagster_launcher.DagsterLaunchError) as raised:
+                self.launch()
+            self.assertNotIsInstance(raised.exception, dagster_launcher.DagsterUnavailableError)
+        self.assertEqual(self.launcher.breaker.state, "closed")
+
+
+class DownsamplingTestCase(SimpleTestCase):
+    def series(self, n):
+        x = list(range(n))
+        return x, [(i * 37) % 11 for i in x]
+
+    def test_short_series_and_small_thresholds_keep_every_point(self):
+        x, y = self.series(10)
+        self.assertEqual(lttb_indices(x, y, 2), list(range(10)))
+        self.assertEqual(lttb_indices(x, y, 0), list(range(10)))
+        self.assertEqual(lttb_indices(x, y, 10), list(range(10)))
+        self.assertEqual(lttb_indices(x, y, 50), list(range(10)))
+        self.assertEqual(lttb_indices([], [], 5), [])
+
+    def test_threshold_points_are_kept_in_order(self):
+        for n, threshold in ((11, 3), (100, 7), (1000, 500), (731, 499)):
+            with self.subTest(n=n, threshold=threshold):
+                x, y = self.series(n)
+                indices = lttb_indices(x, y, threshold)
+                self.assertEqual(len(indices), threshold)
+                self.assertEqual(indices[0], 0)
+                self.assertEqual(indices[-1], n - 1)
+                self.assertEqual(indices, sorted(set(indices)))
+
+    def test_one_point_is_kept_per_bucket(self):
+        x, y = self.series(102)
+        indices = lttb_indices(x, y, 12)
+        # 100 inner points over 10 buckets
+        for bucket, index in enumerate(indices[1:-1]):
+            self.assertIn(index, range(bucket * 10 + 1, bucket * 10 + 11))
+
+    def test_spikes_survive(self):
+        x = list(range(200))
+        y = [0.0] * 200
+        y[57] = 100.0
+        y[143] = -100.0
+        indices = lttb_indices(x, y, 20)
+        self.assertIn(57, indices)
+        self.assertIn(143, indices)
@@ -27,10 +27,14 @@ urlpatterns = [
     path('delete-device/<int:device_id>/', views.DeleteDeviceByPlantAPIView.as_view()),
     path('plants/<int:plant_id>/ingest/', views.PlantDataIngestionView.as_view(), name='plant-data-ingestion'),
     path('plants/custom_ingest/', views.PlantCustomDataIngestionView.as_view(), name='plant-custom-data-ingestion'),
+    path('dagster-launch-metrics/', views.DagsterLaunchMetricsView.as_view(), name='dagster-launch-metrics'),
+    path('query-metrics/', views.QueryMetricsView.as_view(), name='query-metrics'),
+    path('response-cache-metrics/', views.ResponseCacheMetricsView.as_view(), name='response-cache-metrics'),
     path('plants/<int:plant_id>/get_data/', views.PlantGetData.as_view(), name='plant-get-data'),
     path('get-pv-estimation/', views.PlantPvEstimation.as_view(), name='plant-pv-estimation'),
     path('aggregated-report/', views.AggregatedPlantDataView.as_view(), name='aggregated-report'),
     path('get-notifications-user/', views.GetNotificationsPerUser.as_view(), name='get-notifications-user'),
+    path('get-notifications-unread-count/', views.GetUnreadNotificationsCount.as_view(), name='get-notifications-unread-count'),
     path('mark-alert/<int:alert_id>/', views.MarkAlertAsViewed.as_view(), name='mark-alert-as-viewed'),
     path('update_alarm/<int:plant_id>/', views.UpdateAlarmSettings.as_view(), name='update-alarm-settings'),
     path('forgot-password/', views.ForgotPasswordView.as_view(), name='forgot-password'),
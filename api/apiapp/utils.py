@@ -2,7 +2,9 @@ import requests
 import re
 
 from bs4 import BeautifulSoup
+from django.conf import settings
 from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
 
@@ -21,14 +23,25 @@ def generate_reset_token(user):
 
     return reset_url
 
+OPCOM_PRICE_CACHE_KEY = "opcom-day-ahead-price"
+
 def fetch_day_ahead_market_price():
+    # The price is announced monthly; only found prices are cached, so failures are retried
+    price = cache.get(OPCOM_PRICE_CACHE_KEY)
+    if price is None:
+        price = _scrape_day_ahead_market_price()
+        if "error" not in price:
+            cache.set(OPCOM_PRICE_CACHE_KEY, price, settings.OPCOM_CACHE_TTL_S)
+    return price
+
+def _scrape_day_ahead_market_price():
     url = "https://www.opcom.ro/anunturi-stiri-pp/en/1"
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/122.0.0.0 Safari/537.36"
     }
 
     try:
-        response = requests.get(url, headers=headers)
+        response = requests.get(url, headers=headers, timeout=settings.OPCOM_TIMEOUT_S)
         response.raise_for_status()
 
         soup = BeautifulSoup(response.text, "html.parser")
@@ -0,0 +1,48 @@
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+
+VERSION_KINDS = ('data', 'alert', 'config')
+
+PlantVersions = namedtuple('PlantVersions', ['plant_id', 'data', 'alert', 'config', 'modified_at'])
+
+
+def plant_versions(plants) -> list:
+    """The versions of every plant in the given Plant queryset, in one query, ordered by plant id."""
+    return [
+        PlantVersions(*row)
+        for row in plants.order_by('id').values_list(
+            'id',
+            Coalesce('version__data_version', Value(0)),
+            Coalesce('version__alert_version', Value(0)),
+            Coalesce('version__config_version', Value(0)),
+            'version__modified_at',
+        )
+    ]
+
+
+def bump_plant_versions(plant_ids, kind: str):
+    """
+    Moves the given version of the plants on once the current transaction commits, so readers never
+    cache the old data under the new version. Plants deleted by then are skipped.
+    """
+    if kind not in VERSION_KINDS:
+        raise ValueError(f"Unknown version kind {kind}")
+    plant_ids = sorted(set(plant_ids))
+
+    def bump():
+        with connection.cursor() as cur:
+            cur.execute(f"""
+                INSERT INTO apiapp_plantversion (plant_id, {kind}_version, modified_at)
+                SELECT id, 1, NOW()
+                FROM apiapp_plant
+                WHERE id = ANY(%s)
+                ORDER BY id
+                ON CONFLICT (plant_id) DO UPDATE
+                SET {kind}_version = apiapp_plantversion.{kind}_version + 1,
+                    modified_at = EXCLUDED.modified_at
+            """, [plant_ids])
+
+    transaction.on_commit(bump)
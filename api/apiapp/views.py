@@ -1,31 +1,37 @@
-import io
 import logging
-import csv
 import hashlib
-import requests
-import json
+from django.conf import settings
 from django.shortcuts import render
 from django.http import JsonResponse
 from rest_framework import generics
 from rest_framework.views import APIView
 from rest_framework_simplejwt.exceptions import InvalidToken
-from .models import User, Plant, AlarmPlant, ApiKeyIngestionSettings, Device, PlantData, AlertLog
+from .models import User, Plant, AlarmPlant, Device, PlantData, PlantDataRollup, PlantAvailabilityDay, AlertLog, IngestionQueueItem
 from .serializers import UserRegisterSerializer, CustomTokenObtainPairSerializer, UserUpdateSerializer, PlantSerializer, PlantOverviewSerializer,GetPlantSerializer, GetDeviceSerializer, DeviceCreateUpdateSerializer, AlertLogSerializer
 from django.core.mail import send_mail
 from .utils import generate_confirmation_link, generate_reset_token, fetch_day_ahead_market_price
-from django.utils.http import urlsafe_base64_decode
+from .staging import stage_request_payload
+from .api_keys import resolve_api_key
+from .cdc import payload_is_unchanged, discard_unreferenced_payload, replay_idempotent_response, remember_idempotent_response
+from .downsampling import lttb_indices
+from .query_metrics import query_metrics
+from .response_cache import cached_response, cache_metrics
+from .versions import plant_versions
+from .pvgis import get_pvgis_client, normalize_params as normalize_pvgis_params, PvgisRequestError, PvgisUnavailableError
+from .dagster_launcher import launch_ingestion_run, launch_metrics, DagsterLaunchError, DagsterUnavailableError
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.encoding import force_bytes
+from django.utils.dateparse import parse_date
 from django.contrib.auth.tokens import default_token_generator
-from django.contrib.auth.hashers import check_password
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework import status
 from django.utils.timezone import now
-from datetime import timedelta
-import yaml
+from datetime import date, timedelta
+from django.db import transaction
 from django.db.models import Q
-from django.db.models import Avg, Sum, Max, Count
-from django.db.models.functions import TruncWeek, TruncMonth, TruncYear
+from django.db.models import Sum, Count, F, Prefetch
 from rest_framework.permissions import AllowAny
 from django.contrib.auth.hashers import make_password
 
@@ -209,14 +215,26 @@ class CreatePlantView(APIView):
     
 class PlantOverviewAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = 5
+
     def get(self, request):
         user_plants = Plant.objects.filter(user=request.user)
+        versions = plant_versions(user_plants)
+        return cached_response(request, versions, ('alert', 'config'), lambda: self.build_overview(user_plants))
+
+    def build_overview(self, user_plants):
+        user_plants = user_plants.prefetch_related(
+            'devices',
+            Prefetch('alarms', queryset=AlarmPlant.objects.order_by('id')),
+        )
         overview_list = []
         for plant in user_plants:
+            alarms = list(plant.alarms.all())
             serializer = PlantOverviewSerializer({
                 "plant": plant,
                 "devices": plant.devices.all(),
-                "alarm_settings": getattr(plant, 'alarm_settings', None)
+                "alarm_settings": alarms[0] if alarms else None,
+                "alarms": alarms,
             })
             overview_list.append(serializer.data)
 
@@ -297,300 +315,155 @@ class DeleteDeviceByPlantAPIView(APIView):
         device.delete()
         return Response({"message": "Device deleted"}, status=status.HTTP_204_NO_CONTENT)
     
-class PlantDataIngestionView(APIView):
-    permission_classes = [IsAuthenticated]
-
-    def post(self, request, plant_id):        
-        content_type = request.content_type
-        file_type = None
-        try:
-            if content_type == 'application/json':
-                entry = request.data.get('data')
-                file_type = 'json'
-            elif content_type.startswith('multipart/form-data') or content_type.startswith('text/csv'):
-                file = request.FILES.get('file')
-                if not file:
-                    return Response({"error": "File not provided"}, status=status.HTTP_400_BAD_REQUEST)
-
-                if file.name.endswith('.csv'):
-                    decoded_file = file.read().decode('utf-8')
-                    csv_reader = csv.DictReader(io.StringIO(decoded_file))
-                    entry = next(csv_reader, None)
-                    file_type = 'csv'
-                elif file.name.endswith('.json'):
-                    try:
-                        entry = json.load(file)
-                        file_type = 'json'
-                    except json.JSONDecodeError as e:
-                        return Response({"error": f"Invalid JSON file: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
-                else:
-                    return Response({"error": "Unsupported file format. Please upload .csv or .json"}, status=status.HTTP_400_BAD_REQUEST)
-            else:
-                return Response({"error": "Unsupported content type"}, status=status.HTTP_400_BAD_REQUEST)
-
-            if not entry:
-                return Response({"error": "No data provided"}, status=status.HTTP_400_BAD_REQUEST)
-            
-            if 'plant_id' not in entry:
-                entry['plant_id'] = plant_id
-
-            # Build variables dict for mutation
-            execution_params = {
-                "selector": {
-                    "jobName": "file_ingestion_pipeline",
-                    "repositoryName": "__repository__",
-                    "repositoryLocationName": "dagster_app",
-                    "assetSelection": [],
-                    "assetCheckSelection": []
-                },
-                "runConfigData": yaml.safe_dump({
-                    "ops": {
-                        "ingest_file_asset": {
-                           "config": {
-                                "file_data": json.dumps(entry),
-                                "file_type": file_type
-                            }
-                        }
-                    }
-                }),
-                "mode": "default",
-                "executionMetadata": {
-                    "tags": []
-                }
-            }
-
-            mutation = """
-            mutation LaunchPipelineExecution($executionParams: ExecutionParams!) {
-              launchPipelineExecution(executionParams: $executionParams) {
-                __typename
-                ... on LaunchRunSuccess {
-                  run {
-                    runId
-                    pipelineName
-                    __typename
-                  }
-                  __typename
-                }
-                ... on RunConfigValidationInvalid {
-                  errors {
-                    message
-                    __typename
-                  }
-                  __typename
-                }
-                ... on PythonError {
-                  message
-                  stack
-                  __typename
-                }
-              }
-            }
-            """
-
-            dagster_graphql_url = "http://data-unit:3001/graphql"
-            headers = {'Content-Type': 'application/json'}
+def ingest_plant_payload(request, plant_id, launched_message):
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key:
+        replayed = replay_idempotent_response(plant_id, idempotency_key)
+        if replayed:
+            response_status, response_body = replayed
+            return Response(response_body, status=response_status, headers={'Idempotent-Replayed': 'true'})
+
+    try:
+        # The transaction holds the lock on a shared payload until its queue item is committed
+        with transaction.atomic():
+            # PayloadError surfaces through the generic 400 handler below
+            payload_ref, file_type = stage_request_payload(request)
+
+            unchanged = payload_is_unchanged(payload_ref, file_type, plant_id)
+            if unchanged:
+                discard_unreferenced_payload(payload_ref)
+            elif settings.INGESTION_QUEUE_ENABLED:
+                queued = IngestionQueueItem.objects.create(
+                    plant_id=plant_id,
+                    payload_ref=payload_ref,
+                    file_type=file_type
+                )
 
-            payload = {
-                "query": mutation,
-                "variables": {
-                    "executionParams": execution_params
-                }
-            }
+        if unchanged:
+            response = Response({
+                "message": "Data unchanged, nothing to process"
+            }, status=status.HTTP_200_OK)
 
-            response = requests.post(
-                dagster_graphql_url,
-                headers=headers,
-                data=json.dumps(payload)
-            )
+        elif settings.INGESTION_QUEUE_ENABLED:
+            response = Response({
+                "message": "Data queued for processing",
+                "queue_id": queued.id
+            }, status=status.HTTP_202_ACCEPTED)
 
-            dagster_response = response.json()
+        else:
+            launch_resp = launch_ingestion_run(payload_ref, file_type, plant_id)
+            response = Response({
+                "message": launched_message,
+                "dagster_response": launch_resp
+            }, status=status.HTTP_201_CREATED)
 
-            data_resp = dagster_response.get('data', {})
-            launch_resp = data_resp.get('launchPipelineExecution', {})
+    except DagsterUnavailableError as e:
+        return Response({"error": str(e), "details": e.details}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    except DagsterLaunchError as e:
+        return Response({"error": str(e), "details": e.details}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            if 'errors' in dagster_response:
-                return Response({"error": "Failed to trigger processing job", "details": dagster_response['errors']}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            if launch_resp.get('__typename') != 'LaunchRunSuccess':
-                return Response({"error": "Processing job failed", "details": launch_resp}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    if idempotency_key:
+        remember_idempotent_response(plant_id, idempotency_key, response.status_code, response.data)
+    return response
 
-            return Response({
-                "message": "Successfully triggered processing job",
-                "dagster_response": launch_resp
-            }, status=status.HTTP_201_CREATED)
+class PlantDataIngestionView(APIView):
+    permission_classes = [IsAuthenticated]
 
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    def post(self, request, plant_id):
+        if not Plant.objects.filter(id=plant_id, user=request.user).exists():
+            return Response({'error': 'Plant not found or unauthorized'}, status=status.HTTP_404_NOT_FOUND)
+        return ingest_plant_payload(request, plant_id, "Successfully triggered processing job")
         
 class PlantCustomDataIngestionView(APIView):
     def post(self, request):
         api_key = request.headers.get('X-API-KEY')
         if not api_key:
             return Response({"error": "Missing API key"}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            today = now()
-            valid_keys = ApiKeyIngestionSettings.objects.filter(
-                is_active=True
-            ).filter(
-                Q(expiration_date__isnull=True) | Q(expiration_date__gte=today)
-            )
+        plant_id = resolve_api_key(api_key)
+        if plant_id is None:
+            return Response({"error": "Invalid or expired API key"}, status=status.HTTP_403_FORBIDDEN)
+        return ingest_plant_payload(request, plant_id, "Successfully triggered Dagster job")
 
-            matched_setting = None
-            for setting in valid_keys.only('id', 'api_key'):
-                if check_password(api_key, setting.api_key):
-                    matched_setting = setting
-                    break
-
-            if not matched_setting:
-                return Response({"error": "Invalid or expired API key"}, status=status.HTTP_403_FORBIDDEN)
-
-            matched_setting = ApiKeyIngestionSettings.objects.select_related('plant').get(id=matched_setting.id)
-            plant = matched_setting.plant
-            plant_id = plant.id
-        except ApiKeyIngestionSettings.DoesNotExist:
-            return Response({"error": "Invalid or inactive API key"}, status=status.HTTP_403_FORBIDDEN)  
-        content_type = request.content_type
-        file_type = None
-        try:
-            if content_type == 'application/json':
-                entry = request.data.get('data')
-                file_type = 'json'
-            elif content_type.startswith('multipart/form-data') or content_type.startswith('text/csv'):
-                file = request.FILES.get('file')
-                if not file:
-                    return Response({"error": "File not provided"}, status=status.HTTP_400_BAD_REQUEST)
-
-                if file.name.endswith('.csv'):
-                    decoded_file = file.read().decode('utf-8')
-                    csv_reader = csv.DictReader(io.StringIO(decoded_file))
-                    entry = next(csv_reader, None)
-                    file_type = 'csv'
-                elif file.name.endswith('.json'):
-                    try:
-                        entry = json.load(file)
-                        file_type = 'json'
-                    except json.JSONDecodeError as e:
-                        return Response({"error": f"Invalid JSON file: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
-                else:
-                    return Response({"error": "Unsupported file format. Please upload .csv or .json"}, status=status.HTTP_400_BAD_REQUEST)
-            else:
-                return Response({"error": "Unsupported content type"}, status=status.HTTP_400_BAD_REQUEST)
-
-            if not entry:
-                return Response({"error": "No data provided"}, status=status.HTTP_400_BAD_REQUEST)
-            
-            if 'plant_id' not in entry:
-                entry['plant_id'] = plant_id
-
-            execution_params = {
-                "selector": {
-                    "jobName": "file_ingestion_pipeline",
-                    "repositoryName": "__repository__",
-                    "repositoryLocationName": "dagster_app",
-                    "assetSelection": [],
-                    "assetCheckSelection": []
-                },
-                "runConfigData": yaml.safe_dump({
-                    "ops": {
-                        "ingest_file_asset": {
-                           "config": {
-                                "file_data": json.dumps(entry),
-                                "file_type": file_type
-                            }
-                        }
-                    }
-                }),
-                "mode": "default",
-                "executionMetadata": {
-                    "tags": []
-                }
-            }
+class DagsterLaunchMetricsView(APIView):
+    permission_classes = [IsAdminUser]
 
-            mutation = """
-            mutation LaunchPipelineExecution($executionParams: ExecutionParams!) {
-              launchPipelineExecution(executionParams: $executionParams) {
-                __typename
-                ... on LaunchRunSuccess {
-                  run {
-                    runId
-                    pipelineName
-                    __typename
-                  }
-                  __typename
-                }
-                ... on RunConfigValidationInvalid {
-                  errors {
-                    message
-                    __typename
-                  }
-                  __typename
-                }
-                ... on PythonError {
-                  message
-                  stack
-                  __typename
-                }
-              }
-            }
-            """
-
-            dagster_graphql_url = "http://data-unit:3001/graphql"
-            headers = {'Content-Type': 'application/json'}
-
-            payload = {
-                "query": mutation,
-                "variables": {
-                    "executionParams": execution_params
-                }
-            }
-
-            response = requests.post(
-                dagster_graphql_url,
-                headers=headers,
-                data=json.dumps(payload)
-            )
+    def get(self, request):
+        return Response(launch_metrics())
 
-            dagster_response = response.json()
+class QueryMetricsView(APIView):
+    permission_classes = [IsAdminUser]
 
-            data_resp = dagster_response.get('data', {})
-            launch_resp = data_resp.get('launchPipelineExecution', {})
+    def get(self, request):
+        return Response(query_metrics())
 
-            if 'errors' in dagster_response:
-                return Response({"error": "Failed to trigger Dagster job", "details": dagster_response['errors']}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            if launch_resp.get('__typename') != 'LaunchRunSuccess':
-                return Response({"error": "Dagster job failed", "details": launch_resp}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+class ResponseCacheMetricsView(APIView):
+    permission_classes = [IsAdminUser]
 
-            return Response({
-                "message": "Successfully triggered Dagster job",
-                "dagster_response": launch_resp
-            }, status=status.HTTP_201_CREATED)
+    def get(self, request):
+        return Response(cache_metrics())
 
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        
 class PlantGetData(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = 5
 
     def get(self, request, plant_id):
+        raw_from = request.query_params.get('from')
+        raw_to = request.query_params.get('to')
+        try:
+            date_from = parse_date(raw_from) if raw_from else None
+            date_to = parse_date(raw_to) if raw_to else None
+            points = int(request.query_params.get('points', settings.PLANT_CHART_MAX_POINTS))
+        except ValueError:
+            date_from = date_to = points = None
+        if (raw_from and date_from is None) or (raw_to and date_to is None) or points is None or points < 3:
+            return Response(
+                {"error": "from and to must be YYYY-MM-DD dates and points an integer of at least 3."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        versions = plant_versions(Plant.objects.filter(id=plant_id))
+        return cached_response(
+            request, versions, ('data', 'config'),
+            lambda: self.build_chart(plant_id, date_from, date_to, points),
+        )
+
+    def build_chart(self, plant_id, date_from, date_to, points):
         try:
             plant = Plant.objects.get(id=plant_id)
             plant_name = plant.plant_name
         except Plant.DoesNotExist:
             plant_name = "Unknown Plant"
-        data_qs = PlantData.objects.filter(plant_id=plant_id, is_valid=True).order_by('read_date')
+
+        data_qs = PlantData.objects.filter(plant_id=plant_id, is_valid=True)
+        if date_from:
+            data_qs = data_qs.filter(read_date__gte=date_from)
+        if date_to:
+            data_qs = data_qs.filter(read_date__lte=date_to)
+
+        # One pass over just the charted columns, transposed into one list per series
+        rows = list(data_qs.order_by('read_date').values_list(
+            'read_date', 'yield_kwh', 'specific_energy_kwh_per_kwp', 'peak_ac_power_kw', 'grid_connection_duration_h',
+        ))
+        dates, yields, specific_energy, peak_power, grid_duration = (list(column) for column in zip(*rows)) if rows else ([], [], [], [], [])
+
+        # The summary covers every row in range; the chart keeps the points LTTB picks on the yield series
+        stats_summary = {
+            "total_yield_kwh": sum(yields) if rows else None,
+            "avg_specific_energy": sum(specific_energy) / len(rows) if rows else None,
+            "max_peak_power": max(peak_power) if rows else None,
+            "total_grid_duration": sum(grid_duration) if rows else None,
+        }
+        kept = lttb_indices([day.toordinal() for day in dates], yields, points)
 
         histogram_data = {
-            "dates": [entry.read_date.strftime("%Y-%m-%d") for entry in data_qs],
-            "yield_kwh": [entry.yield_kwh for entry in data_qs],
-            "specific_energy": [entry.specific_energy_kwh_per_kwp for entry in data_qs],
-            "peak_ac_power_kw": [entry.peak_ac_power_kw for entry in data_qs],
-            "grid_connection_duration_h": [entry.grid_connection_duration_h for entry in data_qs],
+            "dates": [dates[i].strftime("%Y-%m-%d") for i in kept],
+            "yield_kwh": [yields[i] for i in kept],
+            "specific_energy": [specific_energy[i] for i in kept],
+            "peak_ac_power_kw": [peak_power[i] for i in kept],
+            "grid_connection_duration_h": [grid_duration[i] for i in kept],
         }
-        stats_summary = data_qs.aggregate(
-            total_yield_kwh=Sum("yield_kwh"), 
-            avg_specific_energy=Avg("specific_energy_kwh_per_kwp"),
-            max_peak_power=Max("peak_ac_power_kw"),
-            total_grid_duration=Sum("grid_connection_duration_h"),
-        )
 
         device_counts = (
             Device.objects.filter(plant_id=plant_id, is_active=True)
@@ -608,121 +481,209 @@ class PlantGetData(APIView):
             "histogram_data": histogram_data,
             "summary": stats_summary,
             "device_summary": device_summary,
+            "range": {
+                "from": dates[0] if dates else date_from,
+                "to": dates[-1] if dates else date_to,
+                "total_points": len(rows),
+                "returned_points": len(kept),
+            },
         })
     
 class PlantPvEstimation(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
-        try:
-            lat = request.data.get("latitude")
-            lon = request.data.get("longitude")
-            num_panels = request.data.get("number_of_panels")
-            panel_power_kw = request.data.get("panel_power_kw")
+        lat = request.data.get("latitude")
+        lon = request.data.get("longitude")
+        num_panels = request.data.get("number_of_panels")
+        panel_power_kw = request.data.get("panel_power_kw")
 
+        try:
             if num_panels and panel_power_kw:
                 peak_power = float(num_panels) * float(panel_power_kw)
             else:
                 peak_power = float(request.data.get("peak_power", 5.0))
-            tilt = float(request.data.get("tilt", 30))               
-            azimuth = float(request.data.get("azimuth", 0))          
-            losses = float(request.data.get("losses", 14))
-            elevation = request.data.get("elevation", 0)
-            year_min = request.data.get("year_min", 2005)
-            year_max = request.data.get("year_max", 2023)           
-
-            pvgis_url = "https://re.jrc.ec.europa.eu/api/v5_3/PVcalc"
-            params = {
-                "lat": lat,
-                "lon": lon,
-                "peakpower": peak_power,
-                "loss": losses,
-                "angle": tilt,
-                "aspect": azimuth,
-                "outputformat": "json",
-                "elevation" : elevation,
-                "start_year" : year_min,
-                "end_year" : year_max
-            }
-            response = requests.get(pvgis_url, params=params)
-            response.raise_for_status()
+            params = normalize_pvgis_params(
+                latitude=lat,
+                longitude=lon,
+                peak_power=peak_power,
+                losses=request.data.get("losses", 14),
+                tilt=request.data.get("tilt", 30),
+                azimuth=request.data.get("azimuth", 0),
+                elevation=request.data.get("elevation", 0),
+                year_min=request.data.get("year_min", 2005),
+                year_max=request.data.get("year_max", 2023),
+            )
+        except (TypeError, ValueError):
+            return Response({"error": "latitude and longitude are required and every parameter must be a number."},
+                            status=status.HTTP_400_BAD_REQUEST)
 
-            opcom_price = fetch_day_ahead_market_price()
+        try:
+            data, served = get_pvgis_client().estimate(params)
+        except PvgisRequestError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except PvgisUnavailableError as e:
+            logger.warning("PVGIS estimation failed: %s", e)
+            return Response({"error": "PVGIS is unavailable, try again later"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
-            data = response.json()
+        opcom_price = fetch_day_ahead_market_price()
 
-            return Response({
-                "pvgis_data": data,
-                "market_price": opcom_price,
-            })
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        response = Response({
+            "pvgis_data": data,
+            "market_price": opcom_price,
+        })
+        response["X-PVGIS-Cache"] = served
+        return response
         
 class AggregatedPlantDataView(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = 6
 
     def get(self, request):
-        user = request.user
+        versions = plant_versions(Plant.objects.filter(user=request.user))
+        return cached_response(
+            request, versions, ('data',),
+            lambda: self.build_report([plant.plant_id for plant in versions]),
+        )
 
-        plant_data = PlantData.objects.filter(plant__user=user, is_valid=True)
+    def build_report(self, plant_ids):
+        # Served from the rollups the loader maintains, instead of aggregating every PlantData row
+        rollups = PlantDataRollup.objects.filter(plant_id__in=plant_ids, days__gt=0)
 
-        def aggregate_by(time_trunc):
-            truncated = time_trunc('read_date')
+        def totals():
+            return {
+                "total_yield_kwh": Sum('yield_kwh'),
+                "avg_specific_energy": Sum('specific_energy_kwh_per_kwp') / Sum('days'),
+                "max_peak_ac_power": Sum('peak_ac_power_kw'),
+                "total_grid_connection": Sum('grid_connection_duration_h'),
+            }
+
+        def aggregate_by(granularity):
             return (
-                plant_data
-                .annotate(period=truncated)
-                .values('period')
+                rollups
+                .filter(granularity=granularity)
+                .values(period=F('period_start'))
                 .order_by('period')
-                .annotate(
-                    total_yield_kwh=Sum('yield_kwh'),
-                    avg_specific_energy=Avg('specific_energy_kwh_per_kwp'),
-                    max_peak_ac_power=Sum('peak_ac_power_kw'),
-                    total_grid_connection=Sum('grid_connection_duration_h'),
-                )
+                .annotate(**totals())
             )
 
         def aggregate_all_time():
-            return plant_data.aggregate(
-                total_yield_kwh=Sum('yield_kwh'),
-                avg_specific_energy=Avg('specific_energy_kwh_per_kwp'),
-                max_peak_ac_power=Sum('peak_ac_power_kw'),
-                total_grid_connection=Sum('grid_connection_duration_h'),
-            )
+            # Every valid row is in exactly one yearly rollup
+            return rollups.filter(granularity='year').aggregate(**totals())
 
         response_data = {
-            "weekly": list(aggregate_by(TruncWeek)),
-            "monthly": list(aggregate_by(TruncMonth)),
-            "yearly": list(aggregate_by(TruncYear)),
+            "weekly": list(aggregate_by('week')),
+            "monthly": list(aggregate_by('month')),
+            "yearly": list(aggregate_by('year')),
             "all_time": aggregate_all_time()
         }
 
         return Response(response_data)
     
+def encode_alert_cursor(alert) -> str:
+    return urlsafe_base64_encode(force_bytes(f"{alert.read_date.isoformat()}|{alert.id}"))
+
+
+def decode_alert_cursor(cursor: str) -> tuple:
+    """(read_date, id) of the last alert of the previous page; raises ValueError if the cursor is malformed."""
+    read_date, alert_id = urlsafe_base64_decode(cursor).decode().split("|")
+    return date.fromisoformat(read_date), int(alert_id)
+
+
+def split_param(request, name) -> list:
+    # Accepts both ?name=a&name=b and ?name=a,b
+    return [value for raw in request.query_params.getlist(name) for value in raw.split(',') if value]
+
+
 class GetNotificationsPerUser(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = 3
 
     def get(self, request):
         user = request.user
 
+        try:
+            limit = min(int(request.query_params.get('limit', settings.NOTIFICATIONS_PAGE_SIZE)), settings.NOTIFICATIONS_MAX_PAGE_SIZE)
+            requested_plants = {int(value) for value in split_param(request, 'plant')}
+            cursor = request.query_params.get('cursor')
+            after = decode_alert_cursor(cursor) if cursor else None
+            date_from = request.query_params.get('from')
+            date_to = request.query_params.get('to')
+            date_from = date.fromisoformat(date_from) if date_from else None
+            date_to = date.fromisoformat(date_to) if date_to else None
+        except ValueError:
+            return Response(
+                {"error": "limit and plant must be integers, from and to YYYY-MM-DD dates and cursor a value from next_cursor."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        statuses = split_param(request, 'status')
+        if limit < 1 or not set(statuses) <= {choice for choice, _ in AlertLog.STATUS_CHOICES}:
+            return Response({"error": "limit must be positive and status one of triggered, ok, n/a."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        versions = plant_versions(Plant.objects.filter(user=user))
+        if requested_plants:
+            versions = [plant for plant in versions if plant.plant_id in requested_plants]
+        return cached_response(
+            request, versions, ('alert', 'config'),
+            lambda: self.build_page([plant.plant_id for plant in versions], limit, after, statuses, date_from, date_to),
+        )
+
+    def build_page(self, plant_ids, limit, after, statuses, date_from, date_to):
         alerts = AlertLog.objects.filter(
-            plant__user=user,
+            plant_id__in=plant_ids,
             is_valid=True,
             unread=True
-        ).order_by('-read_date', '-id')
-
-        if not alerts.exists():
+        )
+        if statuses:
+            alerts = alerts.filter(status__in=statuses)
+        if date_from:
+            alerts = alerts.filter(read_date__gte=date_from)
+        if date_to:
+            alerts = alerts.filter(read_date__lte=date_to)
+        if after:
+            # Keyset pagination: everything strictly after the previous page's last (read_date, id)
+            alerts = alerts.filter(Q(read_date__lt=after[0]) | Q(read_date=after[0], id__lt=after[1]))
+
+        # One extra row tells whether another page follows; plant names come from the same query
+        page = list(alerts.select_related('plant').order_by('-read_date', '-id')[:limit + 1])
+        next_cursor = encode_alert_cursor(page[limit - 1]) if len(page) > limit else None
+        page = page[:limit]
+
+        if not page and not after:
             return Response({
                 "alerts": [],
+                "next_cursor": None,
                 "message": "No unread alerts at the moment."
             })
 
-        serializer = AlertLogSerializer(alerts, many=True)
+        serializer = AlertLogSerializer(page, many=True)
         return Response({
-            "alerts": serializer.data
+            "alerts": serializer.data,
+            "next_cursor": next_cursor,
         })
+
+
+class GetUnreadNotificationsCount(APIView):
+    permission_classes = [IsAuthenticated]
+    query_budget = 3
+
+    def get(self, request):
+        versions = plant_versions(Plant.objects.filter(user=request.user))
+        return cached_response(
+            request, versions, ('alert',),
+            lambda: self.count_unread([plant.plant_id for plant in versions]),
+        )
+
+    def count_unread(self, plant_ids):
+        # Counted on the partial unread index, without reading any alert rows
+        unread = AlertLog.objects.filter(plant_id__in=plant_ids, is_valid=True, unread=True).count()
+        return Response({"unread_count": unread})
     
 class MarkAlertAsViewed(APIView):
     permission_classes = [IsAuthenticated]
+    # The last one moves the plant's alert version on once the update commits
+    query_budget = 4
 
     def post(self, request, alert_id):
         try:
@@ -735,33 +696,79 @@ class MarkAlertAsViewed(APIView):
         
 class UpdateAlarmSettings(APIView):
     permission_classes = [IsAuthenticated]
-    def patch(self, request, plant_id):
-        alarm = AlarmPlant.objects.filter(plant_id=plant_id).first()
-        if not alarm:
-            return Response({"error": "Alarm settings not found for this plant"}, status=status.HTTP_404_NOT_FOUND)
 
-        metric_type = request.data.get("metric_type")
-        threshold_value = request.data.get("threshold_value")
+    def _apply(self, alarm, data):
+        metric_type = data.get("metric_type")
+        threshold_value = data.get("threshold_value")
 
         if metric_type:
             if metric_type not in ["yield", "power", "specific_energy"]:
-                return Response({"error": "Invalid metric_type"}, status=status.HTTP_400_BAD_REQUEST)
+                return "Invalid metric_type"
             alarm.metric_type = metric_type
 
         if threshold_value is not None:
             try:
                 alarm.threshold_value = float(threshold_value)
             except (TypeError, ValueError):
-                return Response({"error": "Invalid threshold_value"}, status=status.HTTP_400_BAD_REQUEST)
-
-        alarm.save()
-
+                return "Invalid threshold_value"
+
+        for field in ("window_days", "min_days"):
+            if data.get(field) is not None:
+                try:
+                    value = int(data.get(field))
+                except (TypeError, ValueError):
+                    return f"Invalid {field}"
+                if value < 1:
+                    return f"Invalid {field}"
+                setattr(alarm, field, value)
+
+        if data.get("is_active") is not None:
+            alarm.is_active = str(data.get("is_active")).lower() in ("true", "1")
+
+        if alarm.min_days > alarm.window_days + 1:
+            return "min_days cannot exceed the days in the window"
+        return None
+
+    def _response(self, alarm, message, response_status):
         return Response({
-            "message": "Alarm settings updated",
+            "message": message,
+            "alarm_id": alarm.id,
             "plant_id": alarm.plant_id,
             "metric_type": alarm.metric_type,
-            "threshold_value": alarm.threshold_value
-        }, status=status.HTTP_200_OK)
+            "threshold_value": alarm.threshold_value,
+            "window_days": alarm.window_days,
+            "min_days": alarm.min_days,
+            "is_active": alarm.is_active
+        }, status=response_status)
+
+    def patch(self, request, plant_id):
+        # Without an alarm_id the plant's first alarm is updated, as before plants had several
+        alarms = AlarmPlant.objects.filter(plant_id=plant_id).order_by('id')
+        alarm_id = request.data.get("alarm_id")
+        alarm = alarms.filter(id=alarm_id).first() if alarm_id else alarms.first()
+        if not alarm:
+            return Response({"error": "Alarm settings not found for this plant"}, status=status.HTTP_404_NOT_FOUND)
+
+        error = self._apply(alarm, request.data)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+        alarm.save()
+
+        return self._response(alarm, "Alarm settings updated", status.HTTP_200_OK)
+
+    def post(self, request, plant_id):
+        if not Plant.objects.filter(id=plant_id, user=request.user).exists():
+            return Response({"error": "Plant not found"}, status=status.HTTP_404_NOT_FOUND)
+        if not request.data.get("metric_type") or request.data.get("threshold_value") is None:
+            return Response({"error": "metric_type and threshold_value are required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        alarm = AlarmPlant(plant_id=plant_id)
+        error = self._apply(alarm, request.data)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+        alarm.save()
+
+        return self._response(alarm, "Alarm created", status.HTTP_201_CREATED)
     
 class ForgotPasswordView(APIView):
     def post(self, request):
@@ -811,32 +818,56 @@ class ResetPasswordView(APIView):
     
 class SystemAvailabilityView(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = 4
 
     def get(self, request):
         user = request.user
-        plants = Plant.objects.filter(user=user)
+        # Optional window in days ending today, e.g. 30, 90 or 365; all history without it
+        raw_window = request.query_params.get('window')
+        try:
+            window = int(raw_window) if raw_window else None
+        except ValueError:
+            window = 0
+        if window is not None and window <= 0:
+            return Response({"error": "window must be a positive number of days."}, status=status.HTTP_400_BAD_REQUEST)
+
+        user_plants = Plant.objects.filter(user=user)
+        versions = plant_versions(user_plants)
+        return cached_response(
+            request, versions, ('alert', 'config'),
+            lambda: self.build_availability(user_plants, window),
+        )
+
+    def build_availability(self, user_plants, window):
+        plants = list(user_plants.values('id', 'plant_name'))
+
+        # Summed from the daily counters the alert job maintains; 'n/a' alerts are not counted
+        days = PlantAvailabilityDay.objects.filter(plant_id__in=[plant['id'] for plant in plants])
+        if window:
+            days = days.filter(day__gt=date.today() - timedelta(days=window))
+        counts = {
+            row['plant_id']: row
+            for row in days
+            .values('plant_id')
+            .order_by()
+            .annotate(ok=Sum('ok_count'), triggered=Sum('triggered_count'))
+        }
 
         availability_data = []
         total_ok = 0
         total_valid = 0
 
         for plant in plants:
-            alerts = AlertLog.objects.filter(plant=plant)
-
-            # Only count alerts with 'ok' or 'triggered' (exclude 'n/a')
-            valid_alerts = alerts.exclude(status='n/a')
-            ok_alerts = valid_alerts.filter(status='ok')
-            triggered_alerts = valid_alerts.filter(status='triggered')
-
-            total = valid_alerts.count()
-            ok = ok_alerts.count()
-            triggered = triggered_alerts.count()
+            row = counts.get(plant['id'], {})
+            ok = row.get('ok', 0)
+            triggered = row.get('triggered', 0)
+            total = ok + triggered
 
             availability_pct = (ok / total) * 100 if total > 0 else None
 
             availability_data.append({
-                'plant_id': plant.id,
-                'plant_name': plant.plant_name,
+                'plant_id': plant['id'],
+                'plant_name': plant['plant_name'],
                 'ok_count': ok,
                 'triggered_count': triggered,
                 'total_days': total,
@@ -850,5 +881,6 @@ class SystemAvailabilityView(APIView):
 
         return Response({
             'plants': availability_data,
+            'window_days': window,
             'system_availability_percent': round(system_availability_pct, 2) if system_availability_pct is not None else 'No data'
         })
\ No newline at end of file
@@ -21,6 +21,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.getenv('DJANGO_SECRET_KEY')
 
+# Keyed digest secret for plant ingestion API keys
+API_KEY_HMAC_SECRET = os.getenv('API_KEY_HMAC_SECRET', SECRET_KEY)
+
 # DEBUG = os.getenv('DEBUG', 'False') == 'True'
 DEBUG = True
 
@@ -40,6 +43,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'apiapp.query_metrics.QueryMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -122,6 +126,76 @@ EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER)
 
+# Uploaded ingestion payloads are staged here and read by the data unit from the same volume
+PAYLOAD_STAGING_DIR = os.getenv("PAYLOAD_STAGING_DIR", "/staging")
+
+# Age in days at which the data unit's retention removes AlertLog rows (0 keeps them). The daily
+# availability counters are not decremented by it, and their rebuild keeps the days before the cutoff.
+ALERTLOG_RETENTION_DAYS = int(os.getenv("ALERTLOG_RETENTION_DAYS", 365))
+
+# When enabled, ingestion requests are queued and loaded in batches by the data unit's
+# queue sensor instead of launching one Dagster run per request
+INGESTION_QUEUE_ENABLED = os.getenv("INGESTION_QUEUE_ENABLED", "True") == "True"
+
+DAGSTER_GRAPHQL_URL = os.getenv("DAGSTER_GRAPHQL_URL", "http://data-unit:3001/graphql")
+DAGSTER_CONNECT_TIMEOUT_S = float(os.getenv("DAGSTER_CONNECT_TIMEOUT_S", 3))
+DAGSTER_READ_TIMEOUT_S = float(os.getenv("DAGSTER_READ_TIMEOUT_S", 10))
+DAGSTER_LAUNCH_RETRIES = int(os.getenv("DAGSTER_LAUNCH_RETRIES", 2))
+DAGSTER_LAUNCH_BACKOFF_S = float(os.getenv("DAGSTER_LAUNCH_BACKOFF_S", 0.5))
+# Consecutive failures that open the circuit breaker, and how long it stays open
+DAGSTER_BREAKER_FAILURES = int(os.getenv("DAGSTER_BREAKER_FAILURES", 5))
+DAGSTER_BREAKER_RESET_S = float(os.getenv("DAGSTER_BREAKER_RESET_S", 30))
+
+# PlantGetData downsamples longer series to this many points unless the request asks for another count
+PLANT_CHART_MAX_POINTS = int(os.getenv("PLANT_CHART_MAX_POINTS", 500))
+
+# Notifications are paged by (read_date, id); clients may ask for pages up to the maximum
+NOTIFICATIONS_PAGE_SIZE = int(os.getenv("NOTIFICATIONS_PAGE_SIZE", 50))
+NOTIFICATIONS_MAX_PAGE_SIZE = int(os.getenv("NOTIFICATIONS_MAX_PAGE_SIZE", 200))
+
+# A request sending one statement this many times is logged as a likely N+1. Views over their
+# query_budget are logged, or fail the request when strict, as the tests run it.
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", 5))
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "False") == "True"
+# Adds a Server-Timing header with the database time and query count of each response
+QUERY_METRICS_SERVER_TIMING = os.getenv("QUERY_METRICS_SERVER_TIMING", "False") == "True"
+
+# Dashboard responses are cached under the data versions of their plants, so entries go stale when the
+# data unit or an edit bumps a version. The default is a per-process LRU; point RESPONSE_CACHE_BACKEND at
+# django.core.cache.backends.redis.RedisCache and RESPONSE_CACHE_LOCATION at a redis:// URL to share one.
+# The TTL only reclaims entries no version points at any more.
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "True") == "True"
+RESPONSE_CACHE_ALIAS = "responses"
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    RESPONSE_CACHE_ALIAS: {
+        "BACKEND": RESPONSE_CACHE_BACKEND,
+        "LOCATION": os.getenv("RESPONSE_CACHE_LOCATION", "responses"),
+        "TIMEOUT": int(os.getenv("RESPONSE_CACHE_TTL_S", 86400)),
+        "KEY_PREFIX": "pvm",
+        **({"OPTIONS": {"MAX_ENTRIES": int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 5000))}}
+           if RESPONSE_CACHE_BACKEND.endswith("LocMemCache") else {}),
+    },
+}
+
+
+# PVGIS PVcalc estimations are stored in the database by normalized parameters, with coordinates snapped
+# to the grid of its radiation database. An estimate is served for the TTL, then while stale for
+# PVGIS_STALE_S more as it refreshes in the background, and whenever PVGIS fails or times out.
+PVGIS_URL = os.getenv("PVGIS_URL", "https://re.jrc.ec.europa.eu/api/v5_3/PVcalc")
+PVGIS_GRID_DEG = float(os.getenv("PVGIS_GRID_DEG", 0.05))
+PVGIS_CACHE_TTL_S = int(os.getenv("PVGIS_CACHE_TTL_S", 30 * 86400))
+PVGIS_STALE_S = int(os.getenv("PVGIS_STALE_S", 7 * 86400))
+PVGIS_CONNECT_TIMEOUT_S = float(os.getenv("PVGIS_CONNECT_TIMEOUT_S", 3))
+PVGIS_READ_TIMEOUT_S = float(os.getenv("PVGIS_READ_TIMEOUT_S", 20))
+
+# The OPCOM day-ahead market price returned with estimations is scraped at most once per TTL per process
+OPCOM_TIMEOUT_S = float(os.getenv("OPCOM_TIMEOUT_S", 5))
+OPCOM_CACHE_TTL_S = int(os.getenv("OPCOM_CACHE_TTL_S", 6 * 3600))
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
@@ -3,18 +3,19 @@ import { useEffect } from 'react';
 import { useDispatch, useSelector } from 'react-redux';
 import { logout } from '../redux/slices/authSlice';
 import { Settings, Bell } from 'lucide-react';
-import { fetchNotifications } from '../redux/slices/notificationsSlice';
+import { fetchUnreadCount } from '../redux/slices/notificationsSlice';
 
 const Navbar = () => {
   const { user } = useSelector((state) => state.auth);
-  const { alerts } = useSelector((state) => state.notifications);
+  const { unreadCount } = useSelector((state) => state.notifications);
   const dispatch = useDispatch();
   const navigate = useNavigate();
 
   useEffect(() => {
     if (user) {
-      dispatch(fetchNotifications());
-      const intervalId = setInterval(() => dispatch(fetchNotifications()), 15000);
+      // Polls only the unread count; the notifications page loads the alerts themselves
+      dispatch(fetchUnreadCount());
+      const intervalId = setInterval(() => dispatch(fetchUnreadCount()), 15000);
       return () => clearInterval(intervalId);
     }
   }, [user, dispatch]);
@@ -24,8 +25,6 @@ const Navbar = () => {
     navigate('/login');
   };
 
-  const unreadCount = alerts.filter((a) => a.unread).length;
-
   return (
     <nav className="bg-gradient-to-r from-green-600 via-green-500 to-green-600 shadow-md border-b-2 border-green-500">
       <div className="max-w-full mx-auto px-4 sm:px-8 lg:px-12">
@@ -1,17 +1,31 @@
-import { useEffect } from 'react';
+import { useEffect, useRef } from 'react';
 import { useDispatch, useSelector } from 'react-redux';
-import { fetchNotifications, markNotificationRead } from '../redux/slices/notificationsSlice';
+import {
+  fetchNotifications,
+  fetchMoreNotifications,
+  fetchUnreadCount,
+  markNotificationRead,
+} from '../redux/slices/notificationsSlice';
 
 const Notifications = () => {
   const dispatch = useDispatch();
-  const { alerts, loading, error } = useSelector((state) => state.notifications);
+  const { alerts, nextCursor, unreadCount, loading, loadingMore, error } = useSelector((state) => state.notifications);
+  const previousUnreadCount = useRef(unreadCount);
 
   useEffect(() => {
     dispatch(fetchNotifications());
-    const interval = setInterval(() => dispatch(fetchNotifications()), 15000);
+    const interval = setInterval(() => dispatch(fetchUnreadCount()), 15000);
     return () => clearInterval(interval);
   }, [dispatch]);
 
+  // Reload the first page only when new alerts arrived, not on every poll
+  useEffect(() => {
+    if (unreadCount > previousUnreadCount.current) {
+      dispatch(fetchNotifications());
+    }
+    previousUnreadCount.current = unreadCount;
+  }, [unreadCount, dispatch]);
+
   const markAsRead = (id) => {
     dispatch(markNotificationRead(id));
   };
@@ -87,6 +101,15 @@ const Notifications = () => {
           </li>
         ))}
       </ul>
+      {nextCursor && (
+        <button
+          onClick={() => dispatch(fetchMoreNotifications())}
+          disabled={loadingMore}
+          className="mt-6 text-sm font-medium text-blue-600 hover:underline disabled:text-gray-400"
+        >
+          {loadingMore ? 'Încărcare...' : 'Încarcă mai multe'}
+        </button>
+      )}
     </div>
   );
 };
@@ -7,11 +7,13 @@ const SystemAvailability = () => {
   const [availability, setAvailability] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [windowDays, setWindowDays] = useState('');
 
   useEffect(() => {
     const loadAvailability = async () => {
+      setLoading(true);
       try {
-        const data = await fetchSystemAvailability();
+        const data = await fetchSystemAvailability(windowDays);
         setAvailability(data);
       } catch (err) {
         setError('Eroare încărcare date de sistem.');
@@ -21,7 +23,7 @@ const SystemAvailability = () => {
     };
 
     loadAvailability();
-  }, []);
+  }, [windowDays]);
 
   const exportToPDF = () => {
     if (!availability) return;
@@ -52,6 +54,16 @@ const SystemAvailability = () => {
     <div className="max-w-6xl mx-auto p-6 bg-white rounded-xl shadow mt-10">
       <div className="flex items-center justify-between mb-6">
         <h1 className="text-2xl font-bold">Disponibilitate sistem</h1>
+        <select
+          value={windowDays}
+          onChange={(e) => setWindowDays(e.target.value)}
+          className="px-4 py-2 border rounded"
+        >
+          <option value="30">Ultimele 30 de zile</option>
+          <option value="90">Ultimele 90 de zile</option>
+          <option value="365">Ultimul an</option>
+          <option value="">Tot istoricul</option>
+        </select>
         <button
           onClick={exportToPDF}
           className="px-4 py-2 bg-blue-600 text-white rounded hover:bg-blue-700"
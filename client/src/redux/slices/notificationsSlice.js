@@ -1,14 +1,27 @@
 import { createSlice, createAsyncThunk } from '@reduxjs/toolkit';
-import { getUserNotifications, markAlertAsViewed } from '../../services/api';
+import { getUserNotifications, getUnreadNotificationsCount, markAlertAsViewed } from '../../services/api';
 
 export const fetchNotifications = createAsyncThunk(
   'notifications/fetchNotifications',
   async () => {
     const response = await getUserNotifications();
-    return response.alerts || [];
+    return { alerts: response.alerts || [], nextCursor: response.next_cursor || null };
   }
 );
 
+export const fetchMoreNotifications = createAsyncThunk(
+  'notifications/fetchMoreNotifications',
+  async (_, { getState }) => {
+    const response = await getUserNotifications({ cursor: getState().notifications.nextCursor });
+    return { alerts: response.alerts || [], nextCursor: response.next_cursor || null };
+  }
+);
+
+export const fetchUnreadCount = createAsyncThunk(
+  'notifications/fetchUnreadCount',
+  async () => getUnreadNotificationsCount()
+);
+
 export const markNotificationRead = createAsyncThunk(
   'notifications/markNotificationRead',
   async (id) => {
@@ -21,7 +34,10 @@ const notificationsSlice = createSlice({
   name: 'notifications',
   initialState: {
     alerts: [],
+    nextCursor: null,
+    unreadCount: 0,
     loading: false,
+    loadingMore: false,
     error: null,
   },
   reducers: {},
@@ -32,17 +48,34 @@ const notificationsSlice = createSlice({
         state.error = null;
       })
       .addCase(fetchNotifications.fulfilled, (state, action) => {
-        state.alerts = action.payload;
+        state.alerts = action.payload.alerts;
+        state.nextCursor = action.payload.nextCursor;
         state.loading = false;
       })
       .addCase(fetchNotifications.rejected, (state, action) => {
         state.loading = false;
         state.error = 'Failed to fetch notifications';
       })
+      .addCase(fetchMoreNotifications.pending, (state) => {
+        state.loadingMore = true;
+      })
+      .addCase(fetchMoreNotifications.fulfilled, (state, action) => {
+        state.alerts = [...state.alerts, ...action.payload.alerts];
+        state.nextCursor = action.payload.nextCursor;
+        state.loadingMore = false;
+      })
+      .addCase(fetchMoreNotifications.rejected, (state) => {
+        state.loadingMore = false;
+        state.error = 'Failed to fetch notifications';
+      })
+      .addCase(fetchUnreadCount.fulfilled, (state, action) => {
+        state.unreadCount = action.payload;
+      })
       .addCase(markNotificationRead.fulfilled, (state, action) => {
         state.alerts = state.alerts.map(alert =>
           alert.id === action.payload ? { ...alert, unread: false, read_date: new Date().toISOString() } : alert
         );
+        state.unreadCount = Math.max(state.unreadCount - 1, 0);
       });
   },
 });
@@ -139,9 +139,10 @@ export const uploadPlantData = async (plantId, file) => {
   return response.data;
 };
 
-export const getPlantDashboardData = async (plantId) => {
+// params: optional { from, to, points }; long ranges come back downsampled to `points`
+export const getPlantDashboardData = async (plantId, params = {}) => {
   try {
-    const response = await API.get(`/api/plants/${plantId}/get_data/`);
+    const response = await API.get(`/api/plants/${plantId}/get_data/`, { params });
     return response.data;
   } catch (error) {
     console.error('Error fetching plant dashboard data:', error);
@@ -182,9 +183,10 @@ export const getPlantAggregates = async () => {
   }
 };
 
-export const getUserNotifications = async () => {
+// params: optional { cursor, limit, plant, status, from, to }; pass next_cursor back as cursor for the next page
+export const getUserNotifications = async (params = {}) => {
   try {
-    const response = await API.get('/api/get-notifications-user/');
+    const response = await API.get('/api/get-notifications-user/', { params });
     return response.data;
   } catch (error) {
     console.error('Error fetching notifications:', error);
@@ -192,6 +194,16 @@ export const getUserNotifications = async () => {
   }
 };
 
+export const getUnreadNotificationsCount = async () => {
+  try {
+    const response = await API.get('/api/get-notifications-unread-count/');
+    return response.data.unread_count;
+  } catch (error) {
+    console.error('Error fetching unread notifications count:', error);
+    throw error;
+  }
+};
+
 export const markAlertAsViewed = async (id) => {
   const res = await fetch(`/api/mark-alert/${id}/`, {
     method: 'POST',
@@ -263,9 +275,9 @@ export const resetPassword = async (uidb64, token, newPassword) => {
   return response.data;
 };
 
-export const fetchSystemAvailability = async () => {
+export const fetchSystemAvailability = async (window) => {
   try {
-    const response = await API.get('/api/system-availability/');
+    const response = await API.get('/api/system-availability/', { params: window ? { window } : {} });
     return response.data;
   } catch (error) {
     console.error('Error fetching system availability:', error);
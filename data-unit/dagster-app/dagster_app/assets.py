@@ -1,57 +1,147 @@
-from dagster import asset
-from dagster_app.custom_jobs.scrape_inverter import run_fusionsolar_scraper
-from dagster_app.custom_jobs.convert_xlxs_to_csv import convert_xlxs_to_csv
-from dagster_app.custom_jobs.csv_db_write import csv_db_write
-from dagster_app.custom_jobs.file_handling import save_csv_string_to_file, convert_json_to_csv_file
-from dagster_app.custom_jobs.delete_old_alerts import delete_old_alert_logs
+from itertools import chain
+
+from dagster import asset, Output, Field, DataVersion
+from dagster_app.custom_jobs.scrape_inverter import run_fusionsolar_scraper, discard_export
+from dagster_app.custom_jobs.convert_xlxs_to_csv import convert_xlxs_to_csv, find_report_path
+from dagster_app.custom_jobs.xlsx_reader import iter_xlsx_rows
+from dagster_app.custom_jobs.csv_db_write import bulk_load_plant_data
+from dagster_app.custom_jobs.fusionsolar_mapping import load_device_plants, rollup_inverter_rows
+from dagster_app.custom_jobs.file_handling import resolve_payload_ref, iter_staged_rows, discard_staged_payload
+from dagster_app.custom_jobs.retention import apply_retention
+from dagster_app.custom_jobs.partition_maintenance import create_future_partitions
 from dagster_app.custom_jobs.insert_alerts import insert_new_alert_logs
+from dagster_app.custom_jobs.s3_ingestion import poll_s3_plants
+from dagster_app.custom_jobs.ingestion_queue import drain_ingestion_queue_batch, QUEUE_BATCH_SIZE
+from dagster_app.resources import PostgresResource
+from dagster_app.partitions import plant_day_partitions, plant_day, PLANT_PARTITION_POOL
 
 @asset
-def download_fusionsolar_report():
-    save_path = run_fusionsolar_scraper()
-    return save_path
+def download_fusionsolar_report() -> list:
+    # One report per configured FusionSolar account
+    report_paths = run_fusionsolar_scraper()
+    return report_paths
 
 @asset
-def convert_report_to_csv(download_fusionsolar_report):
-    csv_path = convert_xlxs_to_csv(download_fusionsolar_report)
-    return csv_path
+def convert_report_to_csv(download_fusionsolar_report: list) -> list:
+    # Optional CSV artifact of the reports, outside fusionsolar_pipeline; the DB load streams the
+    # workbooks directly and removes them afterwards
+    csv_paths = [convert_xlxs_to_csv(report_path) for report_path in download_fusionsolar_report]
+    return csv_paths
 
 @asset
-def write_report_to_db(convert_report_to_csv):
-    csv_db_write(convert_report_to_csv)
-    return True
+def write_report_to_db(download_fusionsolar_report: list, postgres: PostgresResource) -> Output[dict]:
+    report_paths = [find_report_path(report_path) for report_path in download_fusionsolar_report]
+    rows = chain.from_iterable(iter_xlsx_rows(report_path) for report_path in report_paths)
+    with postgres.get_connection() as conn:
+        # Inverters are matched to plants by serial number and summed per plant and day,
+        # then the whole fleet is loaded in a single transaction
+        plant_rows, stats = rollup_inverter_rows(rows, load_device_plants(conn))
+        result = {**stats, **bulk_load_plant_data(plant_rows, conn)}
+    # Loaded, so the exports are not needed any more; each run downloads fresh ones
+    for report_path in report_paths:
+        discard_export(report_path)
+    return Output(result, metadata=result)
 
-@asset(config_schema={"file_data": str, "file_type": str})  # file_type: 'csv' or 'json'
-def ingest_file_asset(context) -> str:
-    file_data = context.op_config["file_data"]
+@asset(config_schema={
+    "payload_ref": str,  # path relative to the staging area shared with the API
+    "file_type": str,  # 'csv' or 'json'
+    "plant_id": Field(int, is_required=False),
+})
+def ingest_file_asset(context) -> dict:
     file_type = context.op_config["file_type"].lower()
-
-    if file_type == "csv":
-        csv_path = save_csv_string_to_file(file_data)
-        context.log.info(f"CSV data saved to {csv_path}")
-    elif file_type == "json":
-        csv_path = convert_json_to_csv_file(file_data)
-        context.log.info(f"JSON converted to CSV and saved to {csv_path}")
-    else:
+    if file_type not in ("csv", "json"):
         raise ValueError(f"Unsupported file_type: {file_type}")
 
-    return csv_path
+    payload_path = resolve_payload_ref(context.op_config["payload_ref"])
+    context.log.info(f"Staged {file_type} payload found at {payload_path}")
+
+    return {
+        "payload_path": payload_path,
+        "file_type": file_type,
+        "plant_id": context.op_config.get("plant_id"),
+    }
 
 @asset
-def write_to_db_asset(ingest_file_asset: str) -> bool:
-    csv_db_write(ingest_file_asset)
-    return True
+def write_to_db_asset(ingest_file_asset: dict, postgres: PostgresResource) -> Output[dict]:
+    rows = iter_staged_rows(**ingest_file_asset)
+    with postgres.get_connection() as conn:
+        result = bulk_load_plant_data(rows, conn)
+    # The API stages each directly launched payload under its own reference, so no other run needs it
+    discard_staged_payload(ingest_file_asset["payload_path"])
+    return Output(result, metadata=result)
+
+@asset(config_schema={"batch_size": Field(int, default_value=QUEUE_BATCH_SIZE)})
+def drain_ingestion_queue(context, postgres: PostgresResource) -> Output[dict]:
+    with postgres.get_connection() as conn:
+        result = drain_ingestion_queue_batch(conn, context.run_id, context.op_config["batch_size"])
+    return Output(result, metadata=result)
+
+@asset(config_schema={"plant_ids": [int]})
+def poll_aws_ingestion(context, postgres: PostgresResource) -> Output[dict]:
+    with postgres.get_connection() as conn:
+        result = poll_s3_plants(conn, context.op_config["plant_ids"])
+    return Output(result, metadata=result)
 
 
 @asset
-def delete_old_alerts() -> bool:
-    delete_old_alert_logs()
-    return True
+def insert_alerts(postgres: PostgresResource) -> Output[dict]:
+    with postgres.get_connection() as conn:
+        result = insert_new_alert_logs(conn)
+    return Output(result, metadata=result)
+
 
 @asset
-def insert_alerts(delete_old_alerts: bool) -> bool:
-    if delete_old_alerts:
-        insert_new_alert_logs()
-        return True
-    return False
+def future_partitions(postgres: PostgresResource) -> Output[dict]:
+    with postgres.get_connection() as conn:
+        result = create_future_partitions(conn)
+    return Output(result, metadata=result)
 
+
+@asset
+def retention_cleanup(postgres: PostgresResource) -> Output[dict]:
+    with postgres.get_connection() as conn:
+        result = apply_retention(conn)
+    return Output(result, metadata=result)
+
+
+@asset(partitions_def=plant_day_partitions, pool=PLANT_PARTITION_POOL, output_required=False)
+def plant_day_data(context, postgres: PostgresResource):
+    """The valid PlantData row of one plant and day, versioned by its content hash."""
+    plant_id, read_date = plant_day(context.partition_key)
+    with postgres.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT id, content_hash
+                FROM apiapp_plantdata
+                WHERE plant_id = %s AND read_date = %s AND is_valid = TRUE
+                ORDER BY id DESC
+                LIMIT 1
+            """, (plant_id, read_date))
+            row = cur.fetchone()
+
+    if row is None:
+        context.log.info(f"No valid data for plant {plant_id} on {read_date}, skipping")
+        return
+    plant_data_id, content_hash = row
+
+    previous = context.instance.get_latest_data_version_record(
+        context.asset_key, is_source=False, partition_key=context.partition_key
+    )
+    if previous is not None:
+        previous_metadata = previous.asset_materialization.metadata
+        if "content_hash" in previous_metadata and previous_metadata["content_hash"].value == content_hash:
+            # Not materialized again, so the downstream partition is skipped as well
+            context.log.info(f"Plant {plant_id} on {read_date} is unchanged, skipping")
+            return
+
+    yield Output(
+        {"plant_id": plant_id, "read_date": read_date, "plant_data_id": plant_data_id},
+        data_version=DataVersion(content_hash),
+        metadata={"content_hash": content_hash, "plant_data_id": plant_data_id},
+    )
+
+@asset(partitions_def=plant_day_partitions, pool=PLANT_PARTITION_POOL)
+def plant_day_alerts(plant_day_data: dict, postgres: PostgresResource) -> bool:
+    with postgres.get_connection() as conn:
+        insert_new_alert_logs(conn, plant_day_data["plant_id"], plant_day_data["read_date"])
+    return True
@@ -0,0 +1,203 @@
+import numpy as np
+from psycopg2.extras import execute_values
+
+# Row order of the metric matrices; an alarm's metric_type picks its row
+METRICS = ["yield", "power", "specific_energy"]
+METRIC_COLUMNS = ["yield_kwh", "peak_ac_power_kw", "specific_energy_kwh_per_kwp"]
+# Spacing between plants in the (plant_id, day) search key; larger than any day number
+DAY_SPAN = 1 << 20
+# Alert writes hold this advisory lock in shared mode until they commit; rebuilding the
+# availability counters in the API takes it exclusively
+ALERTLOG_WRITE_LOCK = 7315002
+# Statuses counted in apiapp_plantavailabilityday, with their counter column
+AVAILABILITY_COLUMNS = {"ok": "ok_count", "triggered": "triggered_count"}
+
+
+def load_rules(cur, plant_ids: list) -> dict:
+    """Active alarms of the given plants, one array entry per alarm."""
+    cur.execute("""
+        SELECT id, plant_id, metric_type, threshold_value, window_days, min_days
+        FROM apiapp_alarmplant
+        WHERE is_active = TRUE
+          AND plant_id = ANY(%s)
+          AND metric_type = ANY(%s)
+        ORDER BY plant_id, id
+    """, (plant_ids, METRICS))
+    rows = cur.fetchall()
+    return {
+        "alarm_id": np.array([row[0] for row in rows], dtype=np.int64),
+        "plant_id": np.array([row[1] for row in rows], dtype=np.int64),
+        "metric": np.array([METRICS.index(row[2]) for row in rows], dtype=np.int64),
+        "threshold_pct": np.array([row[3] for row in rows], dtype=np.float64),
+        "window_days": np.array([row[4] for row in rows], dtype=np.int64),
+        "min_days": np.array([row[5] for row in rows], dtype=np.int64),
+    }
+
+
+def fetch_windows(cur, targets: dict, window_days: dict) -> dict:
+    """
+    Every valid PlantData row inside the widest alarm window of each target plant, fetched
+    as one row of arrays and sorted by (plant_id, day).
+    """
+    plant_ids = targets["plant_id"].tolist()
+    cur.execute(f"""
+        WITH targets AS (
+            SELECT *
+            FROM unnest(%s::bigint[], %s::int[], %s::int[]) AS t(plant_id, day, window_days)
+        )
+        SELECT
+            array_agg(pd.plant_id ORDER BY pd.plant_id, pd.read_date),
+            array_agg(pd.read_date - DATE '1970-01-01' ORDER BY pd.plant_id, pd.read_date),
+            {", ".join(f"array_agg(pd.{column} ORDER BY pd.plant_id, pd.read_date)" for column in METRIC_COLUMNS)}
+        FROM targets t
+        JOIN apiapp_plantdata pd ON pd.plant_id = t.plant_id
+            AND pd.read_date BETWEEN DATE '1970-01-01' + (t.day - t.window_days) AND DATE '1970-01-01' + t.day
+        WHERE pd.is_valid = TRUE
+    """, (plant_ids, targets["day"].tolist(), [window_days[plant_id] for plant_id in plant_ids]))
+    plant_id, day, *metrics = cur.fetchone()
+    return {
+        "plant_id": np.array(plant_id or [], dtype=np.int64),
+        "day": np.array(day or [], dtype=np.int64),
+        "values": np.array([metric or [] for metric in metrics], dtype=np.float64).reshape(len(METRICS), -1),
+    }
+
+
+def evaluate_rules(rules: dict, targets: dict, window: dict) -> dict:
+    """
+    Compares each alarm's metric on its plant's target day with the average of the same metric
+    over the trailing window [day - window_days, day]. Alarms with fewer than min_days of data
+    in the window get 'n/a'. `targets` must be sorted by plant_id, `window` by (plant_id, day).
+    """
+    target = np.searchsorted(targets["plant_id"], rules["plant_id"])
+    day = targets["day"][target]
+    actual = targets["values"][rules["metric"], target]
+
+    # Each window is a contiguous slice of the sorted rows, so its sum is a difference of prefix sums
+    key = window["plant_id"] * DAY_SPAN + window["day"]
+    lo = np.searchsorted(key, rules["plant_id"] * DAY_SPAN + day - rules["window_days"], side="left")
+    hi = np.searchsorted(key, rules["plant_id"] * DAY_SPAN + day, side="right")
+    prefix = np.concatenate([np.zeros((len(METRICS), 1)), np.cumsum(window["values"], axis=1)], axis=1)
+
+    days = hi - lo
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg = (prefix[rules["metric"], hi] - prefix[rules["metric"], lo]) / days
+    enough = days >= np.maximum(rules["min_days"], 1)
+    threshold = avg * (rules["threshold_pct"] / 100.0)
+    triggered = enough & (actual < threshold)
+
+    return {
+        "plant_data_id": targets["plant_data_id"][target],
+        "read_date": targets["read_date"][target],
+        "actual_value": actual,
+        "avg_value": np.where(enough, avg, -1.0),
+        "threshold_value": np.where(enough, threshold, -1.0),
+        "status": np.where(enough, np.where(triggered, "triggered", "ok"), "n/a"),
+        "triggered": triggered,
+    }
+
+
+def _update_availability(cur, invalidated: list, inserted: list):
+    """Subtracts the invalidated and adds the inserted (plant_id, read_date, status) alerts to the daily counters."""
+    deltas = {}
+    for rows, sign in ((invalidated, -1), (inserted, 1)):
+        for plant_id, read_date, status in rows:
+            if status in AVAILABILITY_COLUMNS:
+                counts = deltas.setdefault((plant_id, read_date), {column: 0 for column in AVAILABILITY_COLUMNS.values()})
+                counts[AVAILABILITY_COLUMNS[status]] += sign
+
+    # Sorted, so concurrent runs lock the counter rows in the same order
+    rows = [
+        (plant_id, read_date, counts["ok_count"], counts["triggered_count"])
+        for (plant_id, read_date), counts in sorted(deltas.items())
+        if any(counts.values())
+    ]
+    execute_values(cur, """
+        INSERT INTO apiapp_plantavailabilityday (plant_id, day, ok_count, triggered_count)
+        VALUES %s
+        ON CONFLICT (plant_id, day) DO UPDATE
+        SET ok_count = apiapp_plantavailabilityday.ok_count + EXCLUDED.ok_count,
+            triggered_count = apiapp_plantavailabilityday.triggered_count + EXCLUDED.triggered_count
+    """, rows, template="(%s, %s::date, %s, %s)", page_size=1000)
+
+
+def bump_alert_versions(cur, plant_ids: list):
+    """Moves the alert version of the plants on, so the API's cached responses that show alerts go stale."""
+    cur.execute("""
+        INSERT INTO apiapp_plantversion (plant_id, alert_version, modified_at)
+        SELECT id, 1, NOW()
+        FROM unnest(%s::bigint[]) AS id
+        ORDER BY id
+        ON CONFLICT (plant_id) DO UPDATE
+        SET alert_version = apiapp_plantversion.alert_version + 1,
+            modified_at = EXCLUDED.modified_at
+    """, (plant_ids,))
+
+
+def write_alert_logs(cur, rules: dict, results: dict) -> tuple:
+    """
+    Replaces the valid alert of every evaluated (plant data, alarm) pair whose status or actual
+    value changed and updates the daily availability counters to match; returns (invalidated,
+    inserted). Unchanged alerts are kept as they are, read state included.
+    """
+    alarm_ids = rules["alarm_id"].tolist()
+    plant_data_ids = results["plant_data_id"].tolist()
+    metric_types = [METRICS[metric] for metric in rules["metric"]]
+    statuses = results["status"].tolist()
+    actual_values = results["actual_value"].tolist()
+    cur.execute("SELECT pg_advisory_xact_lock_shared(%s)", (ALERTLOG_WRITE_LOCK,))
+
+    # Alerts written before alarms had ids are matched on their metric instead
+    cur.execute("""
+        UPDATE apiapp_alertlog al
+        SET is_valid = FALSE
+        FROM unnest(%s::bigint[], %s::bigint[], %s::varchar[], %s::varchar[], %s::float8[])
+            AS r(plant_data_id, alarm_id, metric_type, status, actual_value)
+        WHERE al.plant_data_id = r.plant_data_id
+          AND al.is_valid = TRUE
+          AND (al.alarm_id = r.alarm_id OR (al.alarm_id IS NULL AND al.metric_type = r.metric_type))
+          AND (al.status <> r.status OR al.actual_value <> r.actual_value)
+        RETURNING al.plant_id, al.read_date, al.status
+    """, (plant_data_ids, alarm_ids, metric_types, statuses, actual_values))
+    invalidated = cur.fetchall()
+
+    rows = list(zip(
+        rules["plant_id"].tolist(), plant_data_ids, alarm_ids, results["read_date"].tolist(),
+        statuses, metric_types, results["threshold_value"].tolist(),
+        actual_values, results["avg_value"].tolist(), results["triggered"].tolist(),
+    ))
+    # The pairs still holding a valid alert after the update are the unchanged ones
+    inserted = execute_values(cur, """
+        INSERT INTO apiapp_alertlog (
+            plant_id, plant_data_id, alarm_id, read_date, status, metric_type,
+            threshold_value, actual_value, avg_value, triggered_at, is_valid, unread
+        )
+        SELECT
+            v.plant_id, v.plant_data_id, v.alarm_id, v.read_date::date, v.status, v.metric_type,
+            v.threshold_value, v.actual_value, v.avg_value,
+            CASE WHEN v.triggered THEN NOW() END, TRUE, TRUE
+        FROM (VALUES %s) AS v(
+            plant_id, plant_data_id, alarm_id, read_date, status, metric_type,
+            threshold_value, actual_value, avg_value, triggered
+        )
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM apiapp_alertlog al
+            WHERE al.plant_data_id = v.plant_data_id
+              AND al.is_valid = TRUE
+              AND (al.alarm_id = v.alarm_id OR (al.alarm_id IS NULL AND al.metric_type = v.metric_type))
+        )
+        RETURNING plant_id, read_date, status, alarm_id
+    """, rows, page_size=1000, fetch=True)
+    if not invalidated and not inserted:
+        return 0, 0
+
+    _update_availability(cur, invalidated, [row[:3] for row in inserted])
+    bump_alert_versions(cur, sorted({row[0] for row in invalidated + inserted}))
+
+    cur.execute("""
+        UPDATE apiapp_alarmplant
+        SET last_alarm_triggered = NOW()
+        WHERE id = ANY(%s)
+    """, (sorted({row[3] for row in inserted if row[2] == "triggered"}),))
+
+    return len(invalidated), len(inserted)
@@ -1,25 +1,40 @@
-import pandas as pd
+import csv
+import glob
 import os
 
-def convert_xlxs_to_csv(load_path: str) -> str:
+from dagster_app.custom_jobs.xlsx_reader import iter_xlsx_rows
+
+
+def find_report_path(load_path: str) -> str:
     # Default to env var or fallback to absolute path
     if not load_path:
         load_path = os.getenv("DAGSTER_DOWNLOAD_DIR", "/dagster-home/downloads")
 
-        xlsx_files = [f for f in os.listdir(load_path) if f.endswith(".xlsx")]
+        # Each export is saved in its own subdirectory of the download dir
+        xlsx_files = glob.glob(os.path.join(load_path, "**", "*.xlsx"), recursive=True)
     
         if not xlsx_files:
             raise FileNotFoundError(f"No .xlsx files found in: {load_path}")
         
-        xlsx_file = max(xlsx_files, key=lambda f: os.path.getctime(os.path.join(load_path, f)))
-        load_path= os.path.join(load_path, xlsx_file)
+        load_path = max(xlsx_files, key=os.path.getctime)
     if not os.path.exists(load_path):
         raise FileNotFoundError(f"File not found: {load_path}")
+    return load_path
+
+
+def convert_xlxs_to_csv(load_path: str) -> str:
+    load_path = find_report_path(load_path)
     csv_save_path = load_path.replace("Inverter ","")
     csv_save_path = csv_save_path.replace(".xlsx", ".csv")
 
-    df = pd.read_excel(load_path, header=1)
-    df.to_csv(csv_save_path, index=False)
+    rows = iter_xlsx_rows(load_path)
+    first_row = next(rows, None)
+    with open(csv_save_path, "w", newline='') as csvfile:
+        if first_row is not None:
+            writer = csv.DictWriter(csvfile, fieldnames=list(first_row.keys()))
+            writer.writeheader()
+            writer.writerow(first_row)
+            writer.writerows(rows)
 
     print(f"Excel to CSV conversion done: {csv_save_path}")
     return csv_save_path
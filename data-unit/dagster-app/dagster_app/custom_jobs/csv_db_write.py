@@ -1,67 +1,208 @@
 import os
-import json
-import psycopg2
+import io
 import csv
-from datetime import date
+import hashlib
+from datetime import date, datetime
 
-def csv_db_write(csv_path:str):
+BATCH_SIZE = int(os.getenv("BULK_LOAD_BATCH_SIZE", 5000))
 
-    conn = psycopg2.connect(
-        dbname=os.getenv("POSTGRES_DB"),
-        user=os.getenv("POSTGRES_USER"),
-        password=os.getenv("POSTGRES_PASSWORD"),
-        host=os.getenv("HOST_DB"),
-        port=os.getenv("PORT_DB"),
+NUMERIC_COLUMNS = [
+    "total_string_capacity_kwp",
+    "yield_kwh",
+    "total_yield_kwh",
+    "specific_energy_kwh_per_kwp",
+    "peak_ac_power_kw",
+    "grid_connection_duration_h",
+]
+STAGING_COLUMNS = ["plant_id", *NUMERIC_COLUMNS, "read_date", "content_hash"]
+# Summed per plant and period into apiapp_plantdatarollup for the aggregated report
+ROLLUP_COLUMNS = ["yield_kwh", "specific_energy_kwh_per_kwp", "peak_ac_power_kw", "grid_connection_duration_h"]
+ROLLUP_GRANULARITIES = ["week", "month", "year"]
+
+# Loads hold this advisory lock in shared mode until they commit. Readers of a PlantData id
+# watermark take it exclusively to wait out loads whose lower ids are not visible yet.
+PLANTDATA_WRITE_LOCK = 7315001
+
+
+def row_content_hash(plant_id: int, values: list, read_date: date) -> str:
+    # Must stay identical to apiapp.cdc.row_content_hash, which skips unchanged resends in the API
+    canonical = "|".join([str(plant_id), *(repr(value) for value in values), read_date.isoformat()])
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _clean_row(entry: dict, today: date):
+    """Coerce one input row to the staging column order, or return None if it is unusable."""
+    try:
+        plant_id = int(entry.get("plant_id"))
+        values = [float(entry.get(column)) for column in NUMERIC_COLUMNS]
+
+        read_date = entry.get("read_date") or today
+        if isinstance(read_date, datetime):
+            read_date = read_date.date()
+        elif not isinstance(read_date, date):
+            read_date = date.fromisoformat(str(read_date).strip()[:10])
+    except (TypeError, ValueError, AttributeError):
+        # AttributeError: the row is not a dict
+        return None
+
+    return (plant_id, *values, read_date.isoformat(), row_content_hash(plant_id, values, read_date))
+
+
+def _load_batch(cur, batch: list, today: date) -> dict:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(batch)
+    buffer.seek(0)
+
+    cur.execute("TRUNCATE plantdata_staging")
+    cur.copy_expert(
+        f"COPY plantdata_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        buffer,
     )
-    cur = conn.cursor()
-
-    insert_query = """
-    INSERT INTO apiapp_plantdata (
-        plant_id,
-        total_string_capacity_kwp,
-        yield_kwh,
-        total_yield_kwh,
-        specific_energy_kwh_per_kwp,
-        peak_ac_power_kw,
-        grid_connection_duration_h,
-        read_date,
-        load_date,
-        is_valid
-    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """
 
+    # Rows for unknown plants are dropped, duplicates inside the payload keep the last
+    # occurrence and rows identical to the stored valid row are skipped. Every valid row
+    # already stored for a changed (plant_id, read_date) is invalidated in the same
+    # statement that inserts its replacement. The rollups of the affected periods gain
+    # the inserted rows and lose the superseded ones, again in the same statement, and the
+    # data version of every plant with inserted rows moves on so the API's cached responses go stale.
+    cur.execute(f"""
+        WITH known AS (
+            SELECT s.*
+            FROM plantdata_staging s
+            JOIN apiapp_plant p ON p.id = s.plant_id
+        ),
+        incoming AS (
+            SELECT DISTINCT ON (plant_id, read_date) *
+            FROM known
+            ORDER BY plant_id, read_date, seq DESC
+        ),
+        changed AS (
+            SELECT i.*
+            FROM incoming i
+            WHERE NOT EXISTS (
+                SELECT 1
+                FROM apiapp_plantdata pd
+                WHERE pd.plant_id = i.plant_id
+                  AND pd.read_date = i.read_date
+                  AND pd.is_valid = TRUE
+                  AND pd.content_hash = i.content_hash
+            )
+        ),
+        superseded AS (
+            UPDATE apiapp_plantdata pd
+            SET is_valid = FALSE
+            FROM changed i
+            WHERE pd.plant_id = i.plant_id
+              AND pd.read_date = i.read_date
+              AND pd.is_valid = TRUE
+            RETURNING pd.plant_id, pd.read_date, {', '.join(f"pd.{column}" for column in ROLLUP_COLUMNS)}
+        ),
+        inserted AS (
+            INSERT INTO apiapp_plantdata (
+                {', '.join(STAGING_COLUMNS)},
+                load_date,
+                is_valid
+            )
+            SELECT {', '.join(STAGING_COLUMNS)}, %s, TRUE
+            FROM changed
+            RETURNING plant_id, read_date, {', '.join(ROLLUP_COLUMNS)}
+        ),
+        deltas AS (
+            SELECT plant_id, read_date, 1 AS days, {', '.join(ROLLUP_COLUMNS)}
+            FROM inserted
+            UNION ALL
+            SELECT plant_id, read_date, -1, {', '.join(f"-{column}" for column in ROLLUP_COLUMNS)}
+            FROM superseded
+        ),
+        rolled_up AS (
+            INSERT INTO apiapp_plantdatarollup (plant_id, granularity, period_start, days, {', '.join(ROLLUP_COLUMNS)})
+            SELECT
+                d.plant_id,
+                g.granularity,
+                date_trunc(g.granularity, d.read_date::timestamp)::date,
+                SUM(d.days),
+                {', '.join(f"SUM(d.{column})" for column in ROLLUP_COLUMNS)}
+            FROM deltas d
+            CROSS JOIN unnest(%s::varchar[]) AS g(granularity)
+            GROUP BY 1, 2, 3
+            ORDER BY 1, 2, 3
+            ON CONFLICT (plant_id, granularity, period_start) DO UPDATE SET
+                days = apiapp_plantdatarollup.days + EXCLUDED.days,
+                {", ".join(f"{column} = apiapp_plantdatarollup.{column} + EXCLUDED.{column}" for column in ROLLUP_COLUMNS)}
+        ),
+        versioned AS (
+            INSERT INTO apiapp_plantversion (plant_id, data_version, modified_at)
+            SELECT DISTINCT plant_id, 1, NOW()
+            FROM inserted
+            ORDER BY plant_id
+            ON CONFLICT (plant_id) DO UPDATE
+            SET data_version = apiapp_plantversion.data_version + 1,
+                modified_at = EXCLUDED.modified_at
+        )
+        SELECT
+            (SELECT COUNT(*) FROM known),
+            (SELECT COUNT(*) FROM incoming),
+            (SELECT COUNT(*) FROM inserted),
+            (SELECT COUNT(*) FROM superseded)
+    """, (today, ROLLUP_GRANULARITIES))
+    known, distinct, inserted, superseded = cur.fetchone()
+
+    return {
+        "rows_loaded": inserted,
+        "rows_unchanged": distinct - inserted,
+        "rows_superseded": superseded + (known - distinct),
+        "rows_rejected": len(batch) - known,
+    }
+
+
+def bulk_load_plant_data(rows, conn) -> dict:
+    """Load an iterable of PlantData rows (dicts keyed by column name) in a single transaction."""
     today = date.today()
+    result = {"rows_loaded": 0, "rows_unchanged": 0, "rows_superseded": 0, "rows_rejected": 0}
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock_shared(%s)", (PLANTDATA_WRITE_LOCK,))
+            cur.execute("""
+                CREATE TEMP TABLE plantdata_staging (
+                    seq BIGSERIAL,
+                    plant_id BIGINT NOT NULL,
+                    total_string_capacity_kwp DOUBLE PRECISION NOT NULL,
+                    yield_kwh DOUBLE PRECISION NOT NULL,
+                    total_yield_kwh DOUBLE PRECISION NOT NULL,
+                    specific_energy_kwh_per_kwp DOUBLE PRECISION NOT NULL,
+                    peak_ac_power_kw DOUBLE PRECISION NOT NULL,
+                    grid_connection_duration_h DOUBLE PRECISION NOT NULL,
+                    read_date DATE NOT NULL,
+                    content_hash VARCHAR(64) NOT NULL
+                ) ON COMMIT DROP
+            """)
+
+            batch = []
+            for entry in rows:
+                cleaned = _clean_row(entry, today)
+                if cleaned is None:
+                    result["rows_rejected"] += 1
+                    continue
+                batch.append(cleaned)
+                if len(batch) >= BATCH_SIZE:
+                    for key, value in _load_batch(cur, batch, today).items():
+                        result[key] += value
+                    batch = []
+            if batch:
+                for key, value in _load_batch(cur, batch, today).items():
+                    result[key] += value
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    print(f"csv_db_write loaded {result['rows_loaded']} rows, skipped {result['rows_unchanged']} unchanged, "
+          f"superseded {result['rows_superseded']}, rejected {result['rows_rejected']}")
+    return result
+
 
-    
-    
+def csv_db_write(csv_path: str, conn) -> dict:
     with open(csv_path, newline='') as csvfile:
-        reader = csv.DictReader(csvfile)
-        data = list(reader)
-    print(f"csv_db_write got data: {repr(data)}")
-    entry = data[0]
-    read_date = entry.get("read_date") if entry.get("read_date") is not None else today
-
-    cur.execute("""
-        UPDATE apiapp_plantdata
-        SET is_valid = FALSE
-        WHERE plant_id = %s AND read_date = %s
-    """, (entry.get("plant_id"), entry.get("read_date")))
-
-    cur.execute(insert_query, (
-        entry.get("plant_id"),
-        entry.get("total_string_capacity_kwp"),
-        entry.get("yield_kwh"),
-        entry.get("total_yield_kwh"),
-        entry.get("specific_energy_kwh_per_kwp"),
-        entry.get("peak_ac_power_kw"),
-        entry.get("grid_connection_duration_h"),
-        read_date,
-        today,  # load_date
-        True
-    ))
-
-    conn.commit()
-    cur.close()
-    conn.close()
-
-    print(f"Wrote 1 record to DB for plant_id={entry.get('plant_id')}")
+        return bulk_load_plant_data(csv.DictReader(csvfile), conn)
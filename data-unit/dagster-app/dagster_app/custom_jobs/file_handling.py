@@ -1,34 +1,123 @@
-import tempfile
+import os
 import csv
-import io
 import json
 
-def save_csv_string_to_file(csv_string: str) -> str:
-    data = json.loads(csv_string)
+STAGING_DIR = os.getenv("PAYLOAD_STAGING_DIR", "/staging")
+JSON_READ_CHUNK = 64 * 1024
+# Namespace of the advisory locks on staged payload references. The API holds one while it publishes a
+# shared payload and queues it; it is taken before a shared payload is removed, once no queued item needs it.
+STAGED_PAYLOAD_LOCK = 7315004
 
-    if isinstance(data, dict):
-        data = [data]
+_json_decoder = json.JSONDecoder()
 
-    if not data or not isinstance(data, list):
-        raise ValueError("Fișierul CSV este gol sau are o structură greșită.")
 
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".csv", delete=False, newline='') as tmpfile:
-        writer = csv.DictWriter(tmpfile, fieldnames=data[0].keys())
-        writer.writeheader()
-        writer.writerows(data)
-        return tmpfile.name
+def resolve_payload_ref(payload_ref: str) -> str:
+    root = os.path.realpath(STAGING_DIR)
+    path = os.path.realpath(os.path.join(root, payload_ref))
 
-def convert_json_to_csv_file(json_string: str) -> str:
-    data = json.loads(json_string)
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"Payload reference outside the staging area: {payload_ref}")
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Staged payload not found: {payload_ref}")
+    return path
 
-    if isinstance(data, dict):
-        data = [data]
 
-    if not data:
-        raise ValueError("Fisier gol")
+class _JsonStream:
+    """Decodes consecutive JSON values from a file, reading it a chunk at a time."""
 
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".csv", delete=False, newline='') as tmpfile:
-        writer = csv.DictWriter(tmpfile, fieldnames=data[0].keys())
-        writer.writeheader()
-        writer.writerows(data)
-        return tmpfile.name
+    def __init__(self, jsonfile):
+        self.jsonfile = jsonfile
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        chunk = self.jsonfile.read(JSON_READ_CHUNK)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+        return bool(chunk)
+
+    def peek(self) -> str:
+        """The next character that is not whitespace, or '' at the end of the file."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def skip(self):
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _json_decoder.raw_decode(self.buffer, self.pos)
+                # A number cut off at the end of the buffer would decode short
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def _iter_json_rows(jsonfile):
+    """Yields the items of a top-level JSON array one at a time, or a top-level object as one row."""
+    stream = _JsonStream(jsonfile)
+    if stream.peek() == "{":
+        yield stream.value()
+    elif stream.peek() == "[":
+        stream.skip()
+        if stream.peek() == "]":
+            raise ValueError("Fisier gol sau cu structura gresita")
+        while True:
+            yield stream.value()
+            separator = stream.peek()
+            stream.skip()
+            if separator == "]":
+                break
+            if separator != ",":
+                raise ValueError("Fisier gol sau cu structura gresita")
+    else:
+        raise ValueError("Fisier gol sau cu structura gresita")
+
+    if stream.peek():
+        raise ValueError("Fisier gol sau cu structura gresita")
+
+
+def iter_staged_rows(payload_path: str, file_type: str, plant_id: int = None):
+    """Lazily yields the rows of a staged payload, defaulting plant_id where the row omits it."""
+    if file_type == "csv":
+        with open(payload_path, newline='') as csvfile:
+            for row in csv.DictReader(csvfile):
+                if plant_id is not None and not row.get("plant_id"):
+                    row["plant_id"] = plant_id
+                yield row
+    elif file_type == "json":
+        with open(payload_path) as jsonfile:
+            for row in _iter_json_rows(jsonfile):
+                if not isinstance(row, dict):
+                    raise ValueError("Fisier gol sau cu structura gresita")
+                if plant_id is not None and "plant_id" not in row:
+                    row["plant_id"] = plant_id
+                yield row
+    else:
+        raise ValueError(f"Unsupported file_type: {file_type}")
+
+
+def check_staged_payload(payload_path: str, file_type: str):
+    """Reads the whole payload, raising ValueError or csv.Error if it cannot be loaded."""
+    for _ in iter_staged_rows(payload_path, file_type):
+        pass
+
+
+def discard_staged_payload(payload_path: str):
+    try:
+        os.remove(payload_path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,114 @@
+from datetime import date, datetime
+
+# Column names of the FusionSolar inverter report, per PlantData field. Some portal
+# versions and languages label the same column slightly differently.
+REPORT_COLUMNS = {
+    "serial_number": ["SN", "Inverter SN", "Device SN"],
+    "read_date": ["Statistical Period", "Statistical period", "Time"],
+    "total_string_capacity_kwp": ["Total String Capacity (kWp)", "Total string capacity (kWp)"],
+    "yield_kwh": ["Yield (kWh)", "Inverter Yield (kWh)", "Energy (kWh)"],
+    "total_yield_kwh": ["Total Yield (kWh)", "Total yield (kWh)"],
+    "peak_ac_power_kw": ["Peak AC Power (kW)", "Peak AC power (kW)"],
+    "grid_connection_duration_h": ["Grid Connection Duration (h)", "Grid connection duration (h)"],
+}
+# Summed over the inverters of a plant; peak power and connection time take the plant maximum
+SUMMED_COLUMNS = ["total_string_capacity_kwp", "yield_kwh", "total_yield_kwh"]
+MAX_COLUMNS = ["peak_ac_power_kw", "grid_connection_duration_h"]
+
+DATE_FORMATS = ["%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y/%m/%d", "%d.%m.%Y", "%d/%m/%Y"]
+
+
+def load_device_plants(conn) -> dict:
+    """Maps the serial number of every active inverter to its plant id."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT UPPER(TRIM(serial_number)), plant_id
+            FROM apiapp_device
+            WHERE device_type = 'inverter'
+              AND is_active = TRUE
+              AND serial_number <> ''
+        """)
+        return dict(cur.fetchall())
+
+
+def _pick(row: dict, field: str):
+    for column in REPORT_COLUMNS[field]:
+        if row.get(column) is not None:
+            return row[column]
+    return None
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _missing_columns(row: dict) -> list:
+    return [field for field in REPORT_COLUMNS if not any(column in row for column in REPORT_COLUMNS[field])]
+
+
+def rollup_inverter_rows(rows, device_plants: dict) -> tuple:
+    """
+    Rolls per-inverter report rows up to one PlantData row per (plant_id, read_date).
+    Returns (plant_rows, stats); rows of unknown inverters or with an empty or unusable value
+    are skipped. Raises ValueError if the report lacks one of the REPORT_COLUMNS, rather than
+    load zeros for it.
+    """
+    inverter_days = {}
+    stats = {"inverter_rows": 0, "unknown_devices": 0, "unusable_rows": 0}
+
+    for row in rows:
+        stats["inverter_rows"] += 1
+        missing = _missing_columns(row)
+        if missing:
+            raise ValueError(f"Inverter report has no column for {', '.join(missing)}")
+        serial_number = _pick(row, "serial_number")
+        read_date = _pick(row, "read_date")
+        read_date = _parse_date(read_date) if read_date is not None else None
+        if serial_number is None or read_date is None:
+            stats["unusable_rows"] += 1
+            continue
+
+        plant_id = device_plants.get(str(serial_number).strip().upper())
+        if plant_id is None:
+            stats["unknown_devices"] += 1
+            continue
+
+        try:
+            # float(None) raises as well, so an empty cell skips the row instead of counting as zero
+            values = {field: float(_pick(row, field)) for field in SUMMED_COLUMNS + MAX_COLUMNS}
+        except (TypeError, ValueError):
+            stats["unusable_rows"] += 1
+            continue
+        # A device listed twice for the same day keeps its last row
+        inverter_days[(plant_id, read_date, serial_number)] = values
+
+    plant_days = {}
+    for (plant_id, read_date, _), values in inverter_days.items():
+        totals = plant_days.setdefault((plant_id, read_date), {field: 0.0 for field in values})
+        for field in SUMMED_COLUMNS:
+            totals[field] += values[field]
+        for field in MAX_COLUMNS:
+            totals[field] = max(totals[field], values[field])
+
+    plant_rows = []
+    for (plant_id, read_date), totals in plant_days.items():
+        capacity = totals["total_string_capacity_kwp"]
+        plant_rows.append({
+            "plant_id": plant_id,
+            "read_date": read_date,
+            **totals,
+            "specific_energy_kwh_per_kwp": totals["yield_kwh"] / capacity if capacity else 0.0,
+        })
+
+    stats["plant_days"] = len(plant_rows)
+    return plant_rows, stats
@@ -0,0 +1,172 @@
+import os
+import csv
+from itertools import chain
+
+from dagster_app.custom_jobs.csv_db_write import bulk_load_plant_data
+from dagster_app.custom_jobs.file_handling import (
+    STAGED_PAYLOAD_LOCK, resolve_payload_ref, iter_staged_rows, check_staged_payload, discard_staged_payload,
+)
+
+QUEUE_BATCH_SIZE = int(os.getenv("INGESTION_QUEUE_BATCH_SIZE", 500))
+QUEUE_WINDOW_SECONDS = int(os.getenv("INGESTION_QUEUE_WINDOW_SECONDS", 60))
+# Claims older than this belong to a run that died and are handed out again
+CLAIM_TIMEOUT_MINUTES = int(os.getenv("INGESTION_QUEUE_CLAIM_TIMEOUT_MINUTES", 30))
+MAX_ATTEMPTS = int(os.getenv("INGESTION_QUEUE_MAX_ATTEMPTS", 3))
+
+_CLAIMABLE = """
+    (status = 'pending'
+     OR (status = 'claimed' AND claimed_at < NOW() - make_interval(mins => %(claim_timeout)s)))
+"""
+
+
+def queue_stats(conn) -> tuple:
+    """
+    Returns (claimable items, age in seconds of the oldest one, a key identifying the claimable set).
+    The key is the lowest claimable id and its attempts: claims take the lowest ids first and count
+    an attempt, so every claim changes it, while ticks before the next claim see the same key.
+    """
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT
+            COUNT(*),
+            COALESCE(EXTRACT(EPOCH FROM NOW() - MIN(enqueued_at)), 0),
+            COALESCE(MIN(id), 0),
+            COALESCE((ARRAY_AGG(attempts ORDER BY id))[1], 0)
+        FROM apiapp_ingestionqueueitem
+        WHERE {_CLAIMABLE}
+    """, {"claim_timeout": CLAIM_TIMEOUT_MINUTES})
+    count, oldest_age, min_id, min_id_attempts = cur.fetchone()
+    conn.commit()
+    cur.close()
+    return count, float(oldest_age), f"{min_id}-{min_id_attempts}"
+
+
+def claim_queue_batch(conn, batch_id: str, limit: int) -> list:
+    cur = conn.cursor()
+    cur.execute(f"""
+        UPDATE apiapp_ingestionqueueitem
+        SET status = 'claimed',
+            claimed_at = NOW(),
+            batch_id = %(batch_id)s,
+            attempts = attempts + 1
+        WHERE id IN (
+            SELECT id
+            FROM apiapp_ingestionqueueitem
+            WHERE {_CLAIMABLE}
+            ORDER BY id
+            LIMIT %(limit)s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, plant_id, payload_ref, file_type
+    """, {"batch_id": batch_id, "limit": limit, "claim_timeout": CLAIM_TIMEOUT_MINUTES})
+    items = [
+        {"id": row[0], "plant_id": row[1], "payload_ref": row[2], "file_type": row[3]}
+        for row in cur.fetchall()
+    ]
+    conn.commit()
+    cur.close()
+    # RETURNING has no order; the loader keeps the last row per plant-day, so the latest enqueued payload must come last
+    items.sort(key=lambda item: item["id"])
+    return items
+
+
+def _set_status(cur, ids: list, status: str):
+    cur.execute("""
+        UPDATE apiapp_ingestionqueueitem
+        SET status = %s
+        WHERE id = ANY(%s)
+    """, (status, ids))
+
+
+def _discard_unqueued_payloads(conn, items: list):
+    """
+    Removes the staged files of the items unless another queued item shares them. Each reference is
+    checked and removed under its STAGED_PAYLOAD_LOCK, which the API holds from publishing a shared
+    payload until its queue item is committed, so a file is never removed under a new item.
+    """
+    paths = {item["payload_ref"]: item["payload_path"] for item in items}
+    cur = conn.cursor()
+    for payload_ref, payload_path in paths.items():
+        cur.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", (STAGED_PAYLOAD_LOCK, payload_ref))
+        cur.execute("""
+            SELECT EXISTS (
+                SELECT 1
+                FROM apiapp_ingestionqueueitem
+                WHERE payload_ref = %s
+                  AND status IN ('pending', 'claimed')
+            )
+        """, (payload_ref,))
+        if not cur.fetchone()[0]:
+            discard_staged_payload(payload_path)
+        conn.commit()
+    cur.close()
+
+
+def drain_ingestion_queue_batch(conn, batch_id: str, limit: int = QUEUE_BATCH_SIZE) -> dict:
+    """
+    Claims up to `limit` queued payloads and loads all of them in one bulk-load transaction.
+    Payloads that are missing or cannot be parsed are marked failed on their own first, so they
+    never hold back the rest of the batch.
+    """
+    items = claim_queue_batch(conn, batch_id, limit)
+    result = {"payloads_claimed": len(items), "payloads_missing": 0, "payloads_invalid": 0}
+    if not items:
+        return result
+
+    loadable = []
+    missing_ids = []
+    invalid = []
+    for item in items:
+        try:
+            item["payload_path"] = resolve_payload_ref(item["payload_ref"])
+        except (FileNotFoundError, ValueError):
+            missing_ids.append(item["id"])
+            continue
+        try:
+            check_staged_payload(item["payload_path"], item["file_type"])
+        except (ValueError, csv.Error) as e:
+            print(f"Queued payload {item['id']} cannot be loaded: {e}")
+            invalid.append(item)
+            continue
+        loadable.append(item)
+
+    if missing_ids or invalid:
+        cur = conn.cursor()
+        _set_status(cur, missing_ids + [item["id"] for item in invalid], 'failed')
+        conn.commit()
+        cur.close()
+        result["payloads_missing"] = len(missing_ids)
+        result["payloads_invalid"] = len(invalid)
+        print(f"Marked {len(missing_ids)} queued payloads without staged data "
+              f"and {len(invalid)} unreadable ones as failed")
+
+    if loadable:
+        loaded_ids = [item["id"] for item in loadable]
+        rows = chain.from_iterable(
+            iter_staged_rows(item["payload_path"], item["file_type"], item["plant_id"])
+            for item in loadable
+        )
+
+        try:
+            cur = conn.cursor()
+            # Left uncommitted on purpose: it is committed together with the loaded rows.
+            _set_status(cur, loaded_ids, 'done')
+            cur.close()
+            result.update(bulk_load_plant_data(rows, conn))
+        except Exception:
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE apiapp_ingestionqueueitem
+                SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+                    batch_id = ''
+                WHERE id = ANY(%s)
+            """, (MAX_ATTEMPTS, loaded_ids))
+            conn.commit()
+            cur.close()
+            raise
+
+    # Identical payloads share one staged file; keep it while another item still needs it
+    _discard_unqueued_payloads(conn, loadable + invalid)
+
+    print(f"Drained {len(loadable)} queued payloads in batch {batch_id}")
+    return result
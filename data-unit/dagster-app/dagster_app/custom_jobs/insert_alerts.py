@@ -1,135 +1,99 @@
-import psycopg2
-import os
+from datetime import date
 
-def insert_new_alert_logs():
-    conn = psycopg2.connect(
-        dbname=os.getenv("POSTGRES_DB"),
-        user=os.getenv("POSTGRES_USER"),
-        password=os.getenv("POSTGRES_PASSWORD"),
-        host=os.getenv("HOST_DB"),
-        port=os.getenv("PORT_DB"),
-    )
+import numpy as np
+
+from dagster_app.custom_jobs.alert_rules import METRIC_COLUMNS, load_rules, fetch_windows, evaluate_rules, write_alert_logs
+from dagster_app.custom_jobs.watermarks import lock_watermark, set_watermark, plantdata_high_water_mark
+
+ALERTS_WATERMARK = "alerts_plantdata_id"
+EPOCH = date(1970, 1, 1)
+
+
+def _load_targets(cur, scope: str, params: dict) -> dict:
+    """The latest valid row in scope of every plant with an active alarm, sorted by plant_id."""
+    cur.execute(f"""
+        SELECT DISTINCT ON (pd.plant_id)
+            pd.id,
+            pd.plant_id,
+            pd.read_date,
+            {", ".join(f"pd.{column}" for column in METRIC_COLUMNS)}
+        FROM apiapp_plantdata pd
+        WHERE {scope}
+          AND pd.is_valid = TRUE
+          AND EXISTS (
+              SELECT 1
+              FROM apiapp_alarmplant ap
+              WHERE ap.plant_id = pd.plant_id
+                AND ap.is_active = TRUE
+          )
+        ORDER BY pd.plant_id, pd.read_date DESC, pd.load_date DESC
+    """, params)
+    rows = cur.fetchall()
+    return {
+        "plant_data_id": np.array([row[0] for row in rows], dtype=np.int64),
+        "plant_id": np.array([row[1] for row in rows], dtype=np.int64),
+        "read_date": np.array([row[2] for row in rows], dtype=object),
+        "day": np.array([(row[2] - EPOCH).days for row in rows], dtype=np.int64),
+        "values": np.array([row[3:] for row in rows], dtype=np.float64).reshape(-1, len(METRIC_COLUMNS)).T,
+    }
+
+
+def insert_new_alert_logs(conn, plant_id: int = None, read_date: str = None) -> dict:
+    """
+    Evaluates every active alarm of the plants with valid PlantData rows loaded since the
+    previous run, or only the given plant-day when a partition is passed. Only the
+    incremental run moves the watermark.
+    """
+    if plant_id is None:
+        high = plantdata_high_water_mark(conn)
     cur = conn.cursor()
 
-    # Step 1: Invalidate old alert logs
-    cur.execute("""
-        WITH latest_data AS (
-            SELECT DISTINCT ON (pd.plant_id)
-                pd.id AS plant_data_id,
-                pd.plant_id,
-                pd.read_date
-            FROM apiapp_plantdata pd
-            WHERE pd.load_date::date = CURRENT_DATE
-              AND pd.is_valid = TRUE
-            ORDER BY pd.plant_id, pd.read_date DESC, pd.load_date DESC
-        )
-        UPDATE apiapp_alertlog al
-        SET is_valid = FALSE
-        FROM latest_data ld
-        JOIN apiapp_alarmplant ap ON ap.plant_id = ld.plant_id
-        WHERE al.plant_data_id = ld.plant_data_id
-          AND al.metric_type = ap.metric_type
-          AND al.is_valid = TRUE;
-    """)
-    print(f"Invalidated {cur.rowcount} rows")
-    conn.commit()
+    if plant_id is None:
+        low = lock_watermark(cur, ALERTS_WATERMARK)
+        scope = "pd.id > %(low)s AND pd.id <= %(high)s"
+        alarm_scope = "TRUE"
+        params = {"low": low, "high": high}
+    else:
+        scope = "pd.plant_id = %(plant_id)s AND pd.read_date = %(read_date)s"
+        alarm_scope = "plant_id = %(plant_id)s"
+        params = {"plant_id": plant_id, "read_date": read_date}
+
+    cur.execute(f"""
+        SELECT COUNT(DISTINCT plant_id)
+        FROM apiapp_alarmplant
+        WHERE is_active = TRUE AND {alarm_scope}
+    """, params)
+    alarm_plants = cur.fetchone()[0]
+
+    targets = _load_targets(cur, scope, params)
+    result = {
+        "plants_evaluated": len(targets["plant_id"]),
+        "plants_skipped": alarm_plants - len(targets["plant_id"]),
+        "alarms_evaluated": 0,
+        "alerts_invalidated": 0,
+        "alerts_inserted": 0,
+    }
 
-    # Step 2: Insert new alert logs
-    cur.execute("""
-        WITH latest_data AS (
-            SELECT DISTINCT ON (pd.plant_id)
-                pd.id AS plant_data_id,
-                pd.plant_id,
-                pd.read_date,
-                pd.yield_kwh,
-                pd.peak_ac_power_kw,
-                pd.specific_energy_kwh_per_kwp
-            FROM apiapp_plantdata pd
-            WHERE pd.load_date::date = CURRENT_DATE
-              AND pd.is_valid = TRUE
-            ORDER BY pd.plant_id, pd.read_date DESC, pd.load_date DESC
-        ),
-        recent_avg AS (
-            SELECT
-                pd.plant_id,
-                ap.threshold_value,
-                AVG(pd.yield_kwh) AS avg_value
-            FROM apiapp_plantdata pd
-            JOIN apiapp_alarmplant ap ON ap.plant_id = pd.plant_id
-            JOIN latest_data ld ON ld.plant_id = pd.plant_id
-                AND pd.read_date >= ld.read_date - INTERVAL '7 days'
-                AND pd.read_date <= ld.read_date
-            WHERE pd.is_valid = TRUE
-            GROUP BY pd.plant_id, ap.threshold_value
-            HAVING COUNT(DISTINCT pd.read_date) >= 5
-        )
-        INSERT INTO apiapp_alertlog (
-            plant_id,
-            plant_data_id,
-            read_date,
-            status,
-            metric_type,
-            threshold_value,
-            actual_value,
-            triggered_at,
-            avg_value,
-            is_valid,
-            unread
-        )
-        SELECT
-            ld.plant_id,
-            ld.plant_data_id,
-            ld.read_date,
-            CASE 
-                WHEN ra.avg_value IS NULL THEN 'n/a'
-                WHEN ap.metric_type = 'yield' AND ld.yield_kwh < ra.avg_value * (ap.threshold_value / 100.0) THEN 'triggered'
-                WHEN ap.metric_type = 'power' AND ld.peak_ac_power_kw < ra.avg_value * (ap.threshold_value / 100.0) THEN 'triggered'
-                WHEN ap.metric_type = 'specific_energy' AND ld.specific_energy_kwh_per_kwp < ra.avg_value * (ap.threshold_value / 100.0) THEN 'triggered'
-                ELSE 'ok'
-            END,
-            ap.metric_type,
-            COALESCE(ra.avg_value * (ap.threshold_value / 100.0), -1),
-            CASE 
-                WHEN ap.metric_type = 'yield' THEN ld.yield_kwh
-                WHEN ap.metric_type = 'power' THEN ld.peak_ac_power_kw
-                WHEN ap.metric_type = 'specific_energy' THEN ld.specific_energy_kwh_per_kwp
-            END,
-            CASE 
-                WHEN ra.avg_value IS NOT NULL AND (
-                    (ap.metric_type = 'yield' AND ld.yield_kwh < ra.avg_value * (ap.threshold_value / 100.0)) OR
-                    (ap.metric_type = 'power' AND ld.peak_ac_power_kw < ra.avg_value * (ap.threshold_value / 100.0)) OR
-                    (ap.metric_type = 'specific_energy' AND ld.specific_energy_kwh_per_kwp < ra.avg_value * (ap.threshold_value / 100.0))
-                ) THEN NOW()
-                ELSE NULL
-            END,
-            COALESCE(ra.avg_value, -1),
-            TRUE,
-            TRUE
-        FROM latest_data ld
-        JOIN apiapp_alarmplant ap ON ap.plant_id = ld.plant_id
-        LEFT JOIN recent_avg ra ON ra.plant_id = ld.plant_id
-        WHERE NOT EXISTS (
-            SELECT 1
-            FROM apiapp_alertlog al
-            WHERE al.plant_data_id = ld.plant_data_id
-              AND al.metric_type = ap.metric_type
-              AND al.is_valid = TRUE
-              AND al.actual_value = CASE 
-                    WHEN ap.metric_type = 'yield' THEN ld.yield_kwh
-                    WHEN ap.metric_type = 'power' THEN ld.peak_ac_power_kw
-                    WHEN ap.metric_type = 'specific_energy' THEN ld.specific_energy_kwh_per_kwp
-              END
-              AND al.status = CASE 
-                    WHEN ra.avg_value IS NULL THEN 'n/a'
-                    WHEN ap.metric_type = 'yield' AND ld.yield_kwh < ra.avg_value * (ap.threshold_value / 100.0) THEN 'triggered'
-                    WHEN ap.metric_type = 'power' AND ld.peak_ac_power_kw < ra.avg_value * (ap.threshold_value / 100.0) THEN 'triggered'
-                    WHEN ap.metric_type = 'specific_energy' AND ld.specific_energy_kwh_per_kwp < ra.avg_value * (ap.threshold_value / 100.0) THEN 'triggered'
-                    ELSE 'ok'
-              END
-        )
-    """)
+    if len(targets["plant_id"]):
+        rules = load_rules(cur, targets["plant_id"].tolist())
+        # One fetch covers the widest window any alarm of the plant needs
+        widest = {}
+        for rule_plant, window_days in zip(rules["plant_id"].tolist(), rules["window_days"].tolist()):
+            widest[rule_plant] = max(widest.get(rule_plant, 0), window_days)
+        targets_with_rules = np.isin(targets["plant_id"], rules["plant_id"])
+        targets = {key: values[..., targets_with_rules] for key, values in targets.items()}
 
-    print(f"Inserted {cur.rowcount} rows")
+        window = fetch_windows(cur, targets, widest)
+        results = evaluate_rules(rules, targets, window)
+        result["alerts_invalidated"], result["alerts_inserted"] = write_alert_logs(cur, rules, results)
+        result["alarms_evaluated"] = len(rules["alarm_id"])
+
+    if plant_id is None:
+        set_watermark(cur, ALERTS_WATERMARK, high)
     conn.commit()
     cur.close()
-    conn.close()
+
+    print(f"Alerts evaluated {result['alarms_evaluated']} alarms of {result['plants_evaluated']} plants, "
+          f"skipped {result['plants_skipped']} plants without new data, "
+          f"invalidated {result['alerts_invalidated']}, inserted {result['alerts_inserted']}")
+    return result
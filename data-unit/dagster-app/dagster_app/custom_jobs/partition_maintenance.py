@@ -0,0 +1,27 @@
+import os
+
+# Tables range-partitioned by month on read_date (apiapp migration 0009_partition_by_read_date)
+PARTITIONED_TABLES = ["apiapp_plantdata", "apiapp_alertlog"]
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", 3))
+
+
+def create_future_partitions(conn, months_ahead: int = PARTITION_MONTHS_AHEAD) -> dict:
+    """
+    Creates the monthly partitions from the current month to months_ahead ahead, so loads never
+    fall into the default partition. Returns the number of partitions created per table.
+    """
+    result = {}
+    for table in PARTITIONED_TABLES:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT apiapp_create_read_date_partitions(
+                    %s,
+                    CURRENT_DATE,
+                    (CURRENT_DATE + make_interval(months => %s))::date
+                )
+            """, (table, months_ahead))
+            created = cur.fetchone()[0]
+        conn.commit()
+        result[f"{table}_partitions_created"] = created
+        print(f"Created {created} partitions of {table}")
+    return result
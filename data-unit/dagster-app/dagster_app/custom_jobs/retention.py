@@ -0,0 +1,150 @@
+import os
+import re
+import time
+from datetime import date, timedelta
+
+RETENTION_CHUNK_SIZE = int(os.getenv("RETENTION_CHUNK_SIZE", 5000))
+# Pause between chunks, so replication and concurrent writers catch up
+RETENTION_PAUSE_S = float(os.getenv("RETENTION_PAUSE_S", 0.5))
+# A run stops after this long; whatever is left is deleted by the next one
+RETENTION_MAX_SECONDS = int(os.getenv("RETENTION_MAX_SECONDS", 600))
+
+# A policy with days <= 0 is disabled. Policies without a condition may drop whole partitions
+# once the table is range-partitioned on their date column. A policy naming a version moves that
+# version of every plant on when it removed rows, as the API may have cached responses showing them.
+RETENTION_POLICIES = [
+    {
+        # The daily availability counters keep counting expired alerts; the API's rebuild leaves those days alone
+        "table": "apiapp_alertlog",
+        "date_column": "read_date",
+        "days": int(os.getenv("ALERTLOG_RETENTION_DAYS", 365)),
+        "condition": None,
+        "version": "alert_version",
+    },
+    {
+        # Superseded readings still referenced by an alert go once the alert itself expires
+        "table": "apiapp_plantdata",
+        "date_column": "load_date",
+        "days": int(os.getenv("SUPERSEDED_PLANTDATA_RETENTION_DAYS", 90)),
+        "condition": """
+            is_valid = FALSE
+            AND NOT EXISTS (SELECT 1 FROM apiapp_alertlog al WHERE al.plant_data_id = apiapp_plantdata.id)
+        """,
+    },
+    {
+        "table": "apiapp_ingestionqueueitem",
+        "date_column": "enqueued_at",
+        "days": int(os.getenv("INGESTION_QUEUE_RETENTION_DAYS", 7)),
+        "condition": "status IN ('done', 'failed')",
+    },
+    {
+        "table": "apiapp_ingestionidempotencykey",
+        "date_column": "created_at",
+        "days": int(os.getenv("IDEMPOTENCY_KEY_RETENTION_DAYS", 2)),
+        "condition": None,
+    },
+]
+
+_RANGE_UPPER_BOUND = re.compile(r"TO \('([0-9-]+)")
+
+
+def _expired_partitions(cur, table: str, date_column: str, cutoff: date) -> list:
+    """Partitions of a table range-partitioned on date_column that hold only rows older than cutoff."""
+    cur.execute("""
+        SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+        FROM pg_partitioned_table pt
+        JOIN pg_class parent ON parent.oid = pt.partrelid
+        JOIN pg_inherits i ON i.inhparent = parent.oid
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE parent.relname = %s
+          AND pg_get_partkeydef(parent.oid) = %s
+    """, (table, f"RANGE ({date_column})"))
+
+    expired = []
+    for name, bound in cur.fetchall():
+        match = _RANGE_UPPER_BOUND.search(bound or "")
+        # The upper bound is exclusive, so the partition holds nothing on or after it
+        if match and date.fromisoformat(match.group(1)[:10]) <= cutoff:
+            expired.append(name)
+    return sorted(expired)
+
+
+def _drop_partitions(conn, table: str, partitions: list) -> int:
+    dropped = 0
+    for partition in partitions:
+        with conn.cursor() as cur:
+            # Detaching takes a brief lock on the parent; the drop then only touches the detached table
+            cur.execute(f'ALTER TABLE {table} DETACH PARTITION "{partition}"')
+            cur.execute(f'DROP TABLE "{partition}"')
+        conn.commit()
+        dropped += 1
+        print(f"Retention dropped partition {partition} of {table}")
+    return dropped
+
+
+def _delete_chunks(conn, policy: dict, cutoff: date, deadline: float, chunk_size: int, pause_s: float) -> int:
+    condition = f"AND ({policy['condition']})" if policy["condition"] else ""
+    deleted = 0
+    while time.monotonic() < deadline:
+        with conn.cursor() as cur:
+            # Each chunk is its own short transaction; rows locked by other writers are left for later
+            cur.execute(f"""
+                DELETE FROM {policy['table']}
+                WHERE id IN (
+                    SELECT id
+                    FROM {policy['table']}
+                    WHERE {policy['date_column']} < %s
+                      {condition}
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+            """, (cutoff, chunk_size))
+            count = cur.rowcount
+        conn.commit()
+        deleted += count
+        if count < chunk_size:
+            break
+        time.sleep(pause_s)
+    return deleted
+
+
+def _bump_versions(conn, column: str):
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            INSERT INTO apiapp_plantversion (plant_id, {column}, modified_at)
+            SELECT id, 1, NOW()
+            FROM apiapp_plant
+            ORDER BY id
+            ON CONFLICT (plant_id) DO UPDATE
+            SET {column} = apiapp_plantversion.{column} + 1,
+                modified_at = EXCLUDED.modified_at
+        """)
+    conn.commit()
+
+
+def apply_retention(conn, policies: list = None, chunk_size: int = RETENTION_CHUNK_SIZE,
+                    pause_s: float = RETENTION_PAUSE_S, max_seconds: int = RETENTION_MAX_SECONDS) -> dict:
+    """Applies every retention policy within the time budget; returns rows deleted and partitions dropped per table."""
+    deadline = time.monotonic() + max_seconds
+    result = {}
+
+    for policy in policies or RETENTION_POLICIES:
+        if policy["days"] <= 0:
+            continue
+        cutoff = date.today() - timedelta(days=policy["days"])
+
+        dropped = 0
+        if policy["condition"] is None:
+            with conn.cursor() as cur:
+                partitions = _expired_partitions(cur, policy["table"], policy["date_column"], cutoff)
+            conn.commit()
+            dropped = _drop_partitions(conn, policy["table"], partitions)
+
+        deleted = _delete_chunks(conn, policy, cutoff, deadline, chunk_size, pause_s)
+        if policy.get("version") and (deleted or dropped):
+            _bump_versions(conn, policy["version"])
+        result[f"{policy['table']}_deleted"] = deleted
+        result[f"{policy['table']}_partitions_dropped"] = dropped
+        print(f"Retention removed {deleted} rows from {policy['table']} older than {cutoff}")
+
+    return result
@@ -0,0 +1,189 @@
+import os
+import csv
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+from dagster_app.custom_jobs.csv_db_write import bulk_load_plant_data
+from dagster_app.custom_jobs.file_handling import STAGING_DIR, iter_staged_rows, check_staged_payload, discard_staged_payload
+
+# Points the poller at an S3-compatible stand-in (MinIO, moto server) instead of AWS
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+S3_DOWNLOAD_WORKERS = int(os.getenv("S3_DOWNLOAD_WORKERS", 8))
+# Each poll is pushed back by up to this fraction of the plant's interval, so plants
+# configured together do not all hit S3 on the same tick
+S3_POLL_JITTER = float(os.getenv("S3_POLL_JITTER", 0.1))
+
+FILE_TYPES = {".csv": "csv", ".json": "json"}
+
+
+def claim_due_plants(conn) -> list:
+    """Returns the plants whose poll is due and schedules their next poll."""
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE apiapp_awsingestionsettings
+        SET last_polled_at = NOW(),
+            next_poll_at = NOW() + make_interval(mins => polling_interval_minutes) * (1 + %s * random())
+        WHERE next_poll_at IS NULL OR next_poll_at <= NOW()
+        RETURNING plant_id
+    """, (S3_POLL_JITTER,))
+    plant_ids = sorted(row[0] for row in cur.fetchall())
+    conn.commit()
+    cur.close()
+    return plant_ids
+
+
+def _plant_settings(cur, plant_ids: list) -> list:
+    cur.execute("""
+        SELECT plant_id, bucket_name, region, access_key_id, secret_access_key, file_prefix
+        FROM apiapp_awsingestionsettings
+        WHERE plant_id = ANY(%s)
+    """, (plant_ids,))
+    columns = ["plant_id", "bucket_name", "region", "access_key_id", "secret_access_key", "file_prefix"]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+def _checkpoint(cur, plant_id: int) -> dict:
+    cur.execute("SELECT object_key, etag FROM apiapp_awsingestedobject WHERE plant_id = %s", (plant_id,))
+    return dict(cur.fetchall())
+
+
+def _s3_client(settings: dict):
+    # Clients are thread-safe, so one per plant is shared by its download threads
+    return boto3.client(
+        "s3",
+        region_name=settings["region"],
+        aws_access_key_id=settings["access_key_id"],
+        aws_secret_access_key=settings["secret_access_key"],
+        endpoint_url=S3_ENDPOINT_URL,
+        config=Config(max_pool_connections=S3_DOWNLOAD_WORKERS, retries={"max_attempts": 3}),
+    )
+
+
+def list_new_objects(client, bucket: str, prefix: str, checkpoint: dict) -> list:
+    """Objects under the prefix that were never ingested or whose ETag changed since, oldest first."""
+    new_objects = []
+    paginator = client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix or ""):
+        for obj in page.get("Contents", []):
+            file_type = FILE_TYPES.get(os.path.splitext(obj["Key"])[1].lower())
+            if file_type is None or checkpoint.get(obj["Key"]) == obj["ETag"]:
+                continue
+            new_objects.append({
+                "key": obj["Key"],
+                "etag": obj["ETag"],
+                "file_type": file_type,
+                "last_modified": obj["LastModified"],
+            })
+    # Later objects win when several carry the same plant-day
+    new_objects.sort(key=lambda obj: obj["last_modified"])
+    return new_objects
+
+
+def _download(client, bucket: str, obj: dict) -> str:
+    fd, path = tempfile.mkstemp(dir=STAGING_DIR, prefix="s3-", suffix=f".{obj['file_type']}")
+    os.close(fd)
+    try:
+        client.download_file(bucket, obj["key"], path)
+    except Exception:
+        discard_staged_payload(path)
+        raise
+    return path
+
+
+def _download_all(executor, client, bucket: str, objects: list) -> list:
+    if objects:
+        # The staging volume may be mounted empty
+        os.makedirs(STAGING_DIR, exist_ok=True)
+    futures = [executor.submit(_download, client, bucket, obj) for obj in objects]
+    paths, error = [], None
+    for future in futures:
+        try:
+            paths.append(future.result())
+        except Exception as e:
+            error = error or e
+    if error:
+        for path in paths:
+            discard_staged_payload(path)
+        raise error
+    return paths
+
+
+def _readable_objects(downloads: list, result: dict) -> list:
+    """(plant_id, object, path) of every downloaded object that can be read through."""
+    readable = []
+    for plant_id, new_objects, paths in downloads:
+        for obj, path in zip(new_objects, paths):
+            try:
+                check_staged_payload(path, obj["file_type"])
+            except (ValueError, csv.Error) as e:
+                # Still checkpointed, so a broken object is only read again once it is replaced
+                print(f"Skipping unreadable S3 object {obj['key']} for plant {plant_id}: {e}")
+                result["objects_unreadable"] += 1
+                continue
+            readable.append((plant_id, obj, path))
+    return readable
+
+
+def _record_checkpoint(cur, plant_id: int, objects: list):
+    cur.executemany("""
+        INSERT INTO apiapp_awsingestedobject (plant_id, object_key, etag, ingested_at)
+        VALUES (%s, %s, %s, NOW())
+        ON CONFLICT (plant_id, object_key)
+        DO UPDATE SET etag = EXCLUDED.etag, ingested_at = EXCLUDED.ingested_at
+    """, [(plant_id, obj["key"], obj["etag"]) for obj in objects])
+
+
+def poll_s3_plants(conn, plant_ids: list) -> dict:
+    """
+    Downloads the new objects of every plant through a bounded thread pool and loads all of
+    them in one bulk-load transaction, together with the checkpoint of the loaded objects.
+    """
+    result = {"plants_polled": 0, "plants_failed": 0, "objects_downloaded": 0, "objects_unreadable": 0}
+    if not plant_ids:
+        return result
+
+    cur = conn.cursor()
+    downloads = []
+
+    with ThreadPoolExecutor(max_workers=S3_DOWNLOAD_WORKERS) as executor:
+        for settings in _plant_settings(cur, plant_ids):
+            plant_id = settings["plant_id"]
+            try:
+                client = _s3_client(settings)
+                new_objects = list_new_objects(
+                    client, settings["bucket_name"], settings["file_prefix"], _checkpoint(cur, plant_id)
+                )
+                paths = _download_all(executor, client, settings["bucket_name"], new_objects)
+            except (BotoCoreError, ClientError, OSError) as e:
+                # One plant's bucket, credentials or downloads must not hold back the others; it is retried next poll
+                print(f"S3 poll failed for plant {plant_id}: {e}")
+                result["plants_failed"] += 1
+                continue
+
+            result["plants_polled"] += 1
+            if new_objects:
+                downloads.append((plant_id, new_objects, paths))
+
+    try:
+        for plant_id, new_objects, _ in downloads:
+            _record_checkpoint(cur, plant_id, new_objects)
+        result["objects_downloaded"] = sum(len(objects) for _, objects, _ in downloads)
+
+        rows = chain.from_iterable(
+            iter_staged_rows(path, obj["file_type"], plant_id)
+            for plant_id, obj, path in _readable_objects(downloads, result)
+        )
+        # Commits the checkpoint together with the loaded rows, or rolls both back
+        result.update(bulk_load_plant_data(rows, conn))
+    finally:
+        cur.close()
+        for _, _, paths in downloads:
+            for path in paths:
+                discard_staged_payload(path)
+
+    return result
@@ -5,25 +5,63 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
-from webdriver_manager.chrome import ChromeDriverManager
 from selenium.common.exceptions import TimeoutException
-import time, os
+from concurrent.futures import ThreadPoolExecutor
 import glob
+import hashlib
+import json
+import os
+import shutil
+import time
 from dotenv import load_dotenv
 
+WAIT_TIMEOUT_S = int(os.getenv("FUSION_WAIT_TIMEOUT_S", 30))
+DOWNLOAD_TIMEOUT_S = int(os.getenv("FUSION_DOWNLOAD_TIMEOUT_S", 120))
+MAX_BROWSERS = int(os.getenv("FUSION_MAX_BROWSERS", 2))
 
-def run_fusionsolar_scraper() -> str:
+# Portal elements the scraper waits for. A local static copy of the portal pages only
+# needs to provide these to exercise the whole flow.
+LOGIN_USERNAME = (By.CSS_SELECTOR, "#usernameInput #username")
+LOGIN_PASSWORD = (By.CSS_SELECTOR, "#passwordInput #value")
+APPROVE_BUTTON = (By.XPATH, '//button[contains(@class, "dpdesign-btn-primary") and contains(text(), "Approve")]')
+MODAL_CLOSE = (By.XPATH, '//button[@class="dpdesign-modal-close" and @aria-label="Close"]')
+REPORT_MENU = (By.ID, "pvmsReport")
+INVERTER_REPORT_LINK = (By.XPATH, '//a[span[@id="pvmsInverterReport"]]')
+TREE_TOGGLE = (By.CLASS_NAME, "tree-toggle-show")
+EXPORT_BUTTON = (By.XPATH, "//button[contains(@class, 'ant-btn') and contains(text(), 'Export')]")
+DOWNLOAD_LINK = (By.XPATH, "//a[@title='Download']")
+
+
+def _download_base_dir() -> str:
+    return os.getenv("DAGSTER_DOWNLOAD_DIR", "/dagster-home/downloads")
+
+
+def load_fusion_accounts() -> list:
+    """FUSION_ACCOUNTS holds a JSON list of {"url", "user", "password"}; defaults to the single FUSION_* account."""
     load_dotenv()
+    accounts = os.getenv("FUSION_ACCOUNTS")
+    if accounts:
+        return json.loads(accounts)
+    return [{
+        "url": os.getenv("FUSION_URL"),
+        "user": os.getenv("FUSION_USER"),
+        "password": os.getenv("FUSION_PASSWORD"),
+    }]
+
+
+def _account_slug(account: dict) -> str:
+    return hashlib.sha1(f"{account['url']}|{account['user']}".encode()).hexdigest()[:12]
+
 
+def _build_driver(download_dir: str, profile_dir: str):
     chrome_options = webdriver.ChromeOptions()
-    chrome_options.binary_location = "/usr/bin/chromium"  # In Docker, Chromium usually lives here
+    chrome_options.binary_location = os.getenv("CHROME_BIN", "/usr/bin/chromium")  # In Docker, Chromium usually lives here
     chrome_options.add_argument("--headless")
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
-
-    # Set downloads folder
-    download_dir = os.getenv("DAGSTER_DOWNLOAD_DIR", "/dagster-home/downloads")
-    os.makedirs(download_dir, exist_ok=True)
+    # A persistent profile per account keeps the portal session cookies between runs,
+    # so most runs skip the login and approval steps entirely.
+    chrome_options.add_argument(f"--user-data-dir={profile_dir}")
 
     chrome_options.add_experimental_option("prefs", {
         "download.default_directory": download_dir,
@@ -31,60 +69,116 @@ def run_fusionsolar_scraper() -> str:
         "directory_upgrade": True
     })
 
-    driver = webdriver.Chrome(
-        service=Service("/usr/local/bin/chromedriver"),
+    return webdriver.Chrome(
+        service=Service(os.getenv("CHROMEDRIVER_PATH", "/usr/local/bin/chromedriver")),
         options=chrome_options
     )
 
+
+def _completed_download(download_dir: str, sizes: dict):
+    if glob.glob(os.path.join(download_dir, "*.crdownload")):
+        return False
+    for path in glob.glob(os.path.join(download_dir, "*.xlsx")):
+        size = os.path.getsize(path)
+        # Finished once the file exists and its size did not change since the previous poll
+        if size > 0 and sizes.get(path) == size:
+            return path
+        sizes[path] = size
+    return False
+
+
+def wait_for_download(driver, download_dir: str, timeout: int = DOWNLOAD_TIMEOUT_S) -> str:
+    sizes = {}
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=0.5).until(
+            lambda _: _completed_download(download_dir, sizes)
+        )
+    except TimeoutException:
+        raise Exception(f"No completed .xlsx download in {download_dir} after {timeout}s")
+
+
+def _login(driver, wait, account: dict):
+    wait.until(EC.element_to_be_clickable(LOGIN_USERNAME)).send_keys(account["user"])
+    driver.find_element(*LOGIN_PASSWORD).send_keys(account["password"], Keys.RETURN)
+
+    # Either the device approval prompt or the portal itself shows up after a login
+    wait.until(EC.any_of(
+        EC.element_to_be_clickable(APPROVE_BUTTON),
+        EC.presence_of_element_located(REPORT_MENU),
+    ))
     try:
-        driver.get(os.getenv("FUSION_URL"))
-        time.sleep(2)
+        WebDriverWait(driver, 1).until(EC.element_to_be_clickable(APPROVE_BUTTON)).click()
+    except TimeoutException:
+        pass
 
-        driver.find_element(By.ID, "usernameInput").find_element(By.ID, "username").send_keys(os.getenv("FUSION_USER"))
-        driver.find_element(By.ID, "passwordInput").find_element(By.ID, "value").send_keys(os.getenv("FUSION_PASSWORD"), Keys.RETURN)
 
+def export_inverter_report(account: dict) -> str:
+    """Downloads the inverter report of one account and returns the path of the .xlsx file."""
+    slug = _account_slug(account)
+    # A fresh directory per export, so the finished file is identified without guessing by ctime
+    download_dir = os.path.join(_download_base_dir(), f"{slug}-{int(time.time() * 1000)}")
+    profile_dir = os.path.join(os.getenv("FUSION_PROFILE_DIR", "/dagster-home/chrome-profiles"), slug)
+    os.makedirs(download_dir, exist_ok=True)
+    os.makedirs(profile_dir, exist_ok=True)
+
+    driver = _build_driver(download_dir, profile_dir)
+    wait = WebDriverWait(driver, WAIT_TIMEOUT_S)
+
+    try:
+        driver.get(account["url"])
+
+        wait.until(EC.any_of(
+            EC.presence_of_element_located(LOGIN_USERNAME),
+            EC.presence_of_element_located(REPORT_MENU),
+        ))
+        if driver.find_elements(*LOGIN_USERNAME):
+            _login(driver, wait, account)
+
+        # The announcement modal is not shown on every visit
         try:
-            approve_btn = WebDriverWait(driver, 10).until(
-                EC.element_to_be_clickable((By.XPATH, '//button[contains(@class, "dpdesign-btn-primary") and contains(text(), "Approve")]'))
-            )
-            approve_btn.click()
-            time.sleep(5)
+            WebDriverWait(driver, 5).until(EC.element_to_be_clickable(MODAL_CLOSE)).click()
+            wait.until(EC.invisibility_of_element_located(MODAL_CLOSE))
         except TimeoutException:
             pass
 
-        time.sleep(10)
-        driver.find_element(By.XPATH, '//button[@class="dpdesign-modal-close" and @aria-label="Close"]').click()
-        time.sleep(5)
+        ActionChains(driver).move_to_element(wait.until(EC.visibility_of_element_located(REPORT_MENU))).perform()
+        wait.until(EC.element_to_be_clickable(INVERTER_REPORT_LINK)).click()
+        wait.until(EC.element_to_be_clickable(TREE_TOGGLE)).click()
+        wait.until(EC.element_to_be_clickable(EXPORT_BUTTON)).click()
+        wait.until(EC.element_to_be_clickable(DOWNLOAD_LINK)).click()
 
-        actions = ActionChains(driver)
-        actions.move_to_element(driver.find_element(By.ID, "pvmsReport")).perform()
-        time.sleep(3)
+        return wait_for_download(driver, download_dir)
 
-        driver.find_element(By.XPATH, '//a[span[@id="pvmsInverterReport"]]').click()
-        time.sleep(5)
+    except Exception:
+        shutil.rmtree(download_dir, ignore_errors=True)
+        raise
+    finally:
+        driver.quit()
 
-        WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.CLASS_NAME, "tree-toggle-show"))
-        ).click()
-        time.sleep(5)
 
-        WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, "//button[contains(@class, 'ant-btn') and contains(text(), 'Export')]"))
-        ).click()
-        time.sleep(5)
+def discard_export(report_path: str):
+    """Removes the download directory of an export once its report has been read."""
+    base_dir = os.path.realpath(_download_base_dir())
+    export_dir = os.path.dirname(os.path.realpath(report_path))
+    # Only a per-export subdirectory, never the download dir itself or anything outside it
+    if os.path.dirname(export_dir) == base_dir:
+        shutil.rmtree(export_dir, ignore_errors=True)
 
-        WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, "//a[@title='Download']"))
-        ).click()
-        time.sleep(5)
 
-        list_of_files = glob.glob(os.path.join(download_dir, '*.xlsx'))
-        if not list_of_files:
-            raise Exception("No .xlsx files found in the download directory")
+def run_fusionsolar_scraper(accounts: list = None, max_browsers: int = MAX_BROWSERS) -> list:
+    """Exports the inverter report of every account, using at most `max_browsers` browsers at once."""
+    accounts = accounts or load_fusion_accounts()
 
-        latest_file = max(list_of_files, key=os.path.getctime)
-        
-        return latest_file
+    with ThreadPoolExecutor(max_workers=max(1, min(max_browsers, len(accounts)))) as executor:
+        futures = [executor.submit(export_inverter_report, account) for account in accounts]
 
-    finally:
-        driver.quit()
+    report_paths = []
+    for account, future in zip(accounts, futures):
+        try:
+            report_paths.append(future.result())
+        except Exception as e:
+            print(f"FusionSolar export failed for {account.get('user')}: {e}")
+
+    if not report_paths:
+        raise Exception("No FusionSolar report could be exported")
+    return report_paths
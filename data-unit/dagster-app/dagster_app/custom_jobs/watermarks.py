@@ -0,0 +1,34 @@
+from dagster_app.custom_jobs.csv_db_write import PLANTDATA_WRITE_LOCK
+
+
+def lock_watermark(cur, name: str) -> int:
+    """Returns the watermark and locks its row until the transaction ends, so runs of one job never overlap."""
+    cur.execute("""
+        INSERT INTO apiapp_pipelinewatermark (name, value, updated_at)
+        VALUES (%s, 0, NOW())
+        ON CONFLICT (name) DO NOTHING
+    """, (name,))
+    cur.execute("SELECT value FROM apiapp_pipelinewatermark WHERE name = %s FOR UPDATE", (name,))
+    return cur.fetchone()[0]
+
+
+def set_watermark(cur, name: str, value: int):
+    # Never moves back, even if an overlapping run computed its high-water mark earlier
+    cur.execute("""
+        UPDATE apiapp_pipelinewatermark
+        SET value = GREATEST(value, %s), updated_at = NOW()
+        WHERE name = %s
+    """, (value, name))
+
+
+def plantdata_high_water_mark(conn) -> int:
+    """
+    The highest PlantData id below which every row is committed. Loads in progress are
+    waited out in a transaction of its own, so the job does not block new loads afterwards.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (PLANTDATA_WRITE_LOCK,))
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM apiapp_plantdata")
+        high = cur.fetchone()[0]
+    conn.commit()
+    return high
@@ -0,0 +1,144 @@
+import os
+import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from openpyxl import load_workbook
+
+from dagster_app.custom_jobs.fusionsolar_mapping import REPORT_COLUMNS
+
+# FusionSolar reports start with a title row; the column names are on the second row
+HEADER_ROW = 2
+# Sheets of workbooks larger than this are parsed in parallel across a process pool. Sheets are
+# not split further into row ranges: a read-only worksheet has to parse the XML of every row
+# before min_row anyway, so a row range costs almost as much as the whole sheet.
+PARALLEL_MIN_BYTES = int(os.getenv("XLSX_PARALLEL_MIN_BYTES", 20 * 1024 * 1024))
+PARALLEL_WORKERS = int(os.getenv("XLSX_PARSE_WORKERS", os.cpu_count() or 1))
+# Workers spool the rows of their sheet to a temporary file in pickled chunks of this many rows,
+# so neither the worker nor the parent ever holds a whole sheet in memory
+SPOOL_CHUNK_ROWS = 1000
+
+EMPTY_VALUES = {"", "-", "--", "N/A"}
+# Identifiers that only look numeric, such as serial numbers; they are kept as text
+TEXT_COLUMNS = frozenset(REPORT_COLUMNS["serial_number"])
+
+
+def _coerce(value):
+    if isinstance(value, str):
+        value = value.strip()
+        if value in EMPTY_VALUES:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _coerce_text(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return None if value in EMPTY_VALUES else value
+
+
+def _read_header(worksheet, header_row: int) -> list:
+    for row in worksheet.iter_rows(min_row=header_row, max_row=header_row, values_only=True):
+        return [str(cell).strip() if cell is not None else None for cell in row]
+    return []
+
+
+def _iter_sheet(path: str, sheet_name: str, header_row: int):
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name]
+        header = _read_header(worksheet, header_row)
+        coercers = [_coerce_text if name in TEXT_COLUMNS else _coerce for name in header]
+        for row in worksheet.iter_rows(min_row=header_row + 1, values_only=True):
+            if all(cell is None for cell in row):
+                continue
+            yield {name: coerce(cell) for name, coerce, cell in zip(header, coercers, row) if name}
+    finally:
+        workbook.close()
+
+
+def report_sheet_names(path: str, header_row: int = HEADER_ROW) -> list:
+    """The first sheet and every later one with the same header, as long exports continue over several sheets."""
+    workbook = load_workbook(path, read_only=True)
+    try:
+        headers = [(sheet_name, _read_header(workbook[sheet_name], header_row)) for sheet_name in workbook.sheetnames]
+    finally:
+        workbook.close()
+    return [sheet_name for sheet_name, header in headers if header == headers[0][1]]
+
+
+def _spool_sheet(args) -> str:
+    """Parses one sheet in a pool worker and returns the path of the file holding its rows."""
+    spool = tempfile.NamedTemporaryFile(prefix="xlsx-rows-", suffix=".pickle", delete=False)
+    try:
+        with spool:
+            chunk = []
+            for row in _iter_sheet(*args):
+                chunk.append(row)
+                if len(chunk) >= SPOOL_CHUNK_ROWS:
+                    pickle.dump(chunk, spool, protocol=pickle.HIGHEST_PROTOCOL)
+                    chunk = []
+            if chunk:
+                pickle.dump(chunk, spool, protocol=pickle.HIGHEST_PROTOCOL)
+    except BaseException:
+        _discard_spool(spool.name)
+        raise
+    return spool.name
+
+
+def _iter_spool(spool_path: str):
+    try:
+        with open(spool_path, "rb") as spool:
+            while True:
+                try:
+                    chunk = pickle.load(spool)
+                except EOFError:
+                    return
+                yield from chunk
+    finally:
+        _discard_spool(spool_path)
+
+
+def _discard_spool(spool_path: str):
+    try:
+        os.unlink(spool_path)
+    except FileNotFoundError:
+        pass
+
+
+def iter_xlsx_rows(path: str, sheet_names: list = None, header_row: int = HEADER_ROW):
+    """
+    Yields every data row of the report sheets (by default those of report_sheet_names) as a dict
+    keyed by the header row, with typed cell values. Rows are streamed from a read-only workbook;
+    the sheets of large files are parsed across a process pool that spools them to temporary
+    files, and rows are still yielded in workbook order.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"File not found: {path}")
+
+    if sheet_names is None:
+        sheet_names = report_sheet_names(path, header_row)
+
+    if len(sheet_names) < 2 or PARALLEL_WORKERS < 2 or os.path.getsize(path) < PARALLEL_MIN_BYTES:
+        for sheet_name in sheet_names:
+            yield from _iter_sheet(path, sheet_name, header_row)
+        return
+
+    sheets = [(path, sheet_name, header_row) for sheet_name in sheet_names]
+    with ProcessPoolExecutor(max_workers=min(PARALLEL_WORKERS, len(sheets))) as executor:
+        futures = [executor.submit(_spool_sheet, sheet) for sheet in sheets]
+        try:
+            for future in futures:
+                yield from _iter_spool(future.result())
+        finally:
+            # Sheets left unread when the caller stops early or another sheet fails
+            for future in futures:
+                if not future.cancel() and future.exception() is None:
+                    _discard_spool(future.result())
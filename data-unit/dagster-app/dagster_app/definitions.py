@@ -1,11 +1,16 @@
-from dagster import define_asset_job, Definitions, load_assets_from_modules, ScheduleDefinition
+import os
+from dagster import define_asset_job, Definitions, load_assets_from_modules, ScheduleDefinition, EnvVar, sensor, RunRequest, SkipReason, SensorResult
 from dagster_app import assets
+from dagster_app.resources import PostgresResource
+from dagster_app.partitions import plant_partitions
+from dagster_app.custom_jobs.ingestion_queue import queue_stats, QUEUE_BATCH_SIZE, QUEUE_WINDOW_SECONDS
+from dagster_app.custom_jobs.s3_ingestion import claim_due_plants
 
 all_assets = load_assets_from_modules([assets])
 
 fusionsolar_job = define_asset_job(
     "fusionsolar_pipeline", 
-    selection=["download_fusionsolar_report", "convert_report_to_csv"]
+    selection=["download_fusionsolar_report", "write_report_to_db"]
 )
 
 file_ingestion_job = define_asset_job(
@@ -13,9 +18,35 @@ file_ingestion_job = define_asset_job(
     selection=["ingest_file_asset", "write_to_db_asset"],
 )
 
+ingestion_queue_job = define_asset_job(
+    "ingestion_queue_pipeline",
+    selection=["drain_ingestion_queue"],
+)
+
+aws_ingestion_job = define_asset_job(
+    "aws_ingestion_pipeline",
+    selection=["poll_aws_ingestion"],
+)
+
 alerts_job = define_asset_job(
     "alerts_pipeline",
-    selection=["delete_old_alerts", "insert_alerts"],
+    selection=["insert_alerts"],
+)
+
+retention_job = define_asset_job(
+    "retention_pipeline",
+    selection=["future_partitions", "retention_cleanup"],
+)
+
+fusionsolar_schedule = ScheduleDefinition(
+    job=fusionsolar_job,
+    cron_schedule=os.getenv("FUSIONSOLAR_CRON", "30 * * * *"),  # hourly by default
+)
+
+# Backfill target for reprocessing plants and date ranges, one run per plant-day
+plant_day_job = define_asset_job(
+    "plant_day_pipeline",
+    selection=["plant_day_data", "plant_day_alerts"],
 )
 
 alert_schedule = ScheduleDefinition(
@@ -23,8 +54,73 @@ alert_schedule = ScheduleDefinition(
     cron_schedule="*/15 * * * *",  # every 15 minutes
 )
 
+retention_schedule = ScheduleDefinition(
+    job=retention_job,
+    cron_schedule=os.getenv("RETENTION_CRON", "30 3 * * *"),  # nightly by default
+)
+
+@sensor(job=ingestion_queue_job, minimum_interval_seconds=15)
+def ingestion_queue_sensor(context, postgres: PostgresResource):
+    # Launch a drain run once a full batch is waiting or the oldest item has waited a whole window
+    with postgres.get_connection() as conn:
+        pending, oldest_age, queue_key = queue_stats(conn)
+
+    if pending == 0:
+        return SkipReason("Ingestion queue is empty")
+    if pending < QUEUE_BATCH_SIZE and oldest_age < QUEUE_WINDOW_SECONDS:
+        return SkipReason(f"{pending} queued payloads, oldest waiting {oldest_age:.0f}s")
+
+    # Keyed on the head of the claimable set so ticks before the run claims it do not launch
+    # duplicates, while every claim, including of items released by a failed run, gives a new key
+    return RunRequest(
+        run_key=f"ingestion-queue-{queue_key}",
+        run_config={"ops": {"drain_ingestion_queue": {"config": {"batch_size": QUEUE_BATCH_SIZE}}}},
+    )
+
+@sensor(job=aws_ingestion_job, minimum_interval_seconds=60)
+def aws_ingestion_sensor(context, postgres: PostgresResource):
+    # Due plants are claimed here, which also schedules their next jittered poll
+    with postgres.get_connection() as conn:
+        plant_ids = claim_due_plants(conn)
+
+    if not plant_ids:
+        return SkipReason("No AWS plant is due for polling")
+
+    return RunRequest(
+        run_config={"ops": {"poll_aws_ingestion": {"config": {"plant_ids": plant_ids}}}},
+    )
+
+@sensor(minimum_interval_seconds=300)
+def plant_partitions_sensor(context, postgres: PostgresResource):
+    with postgres.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM apiapp_plant")
+            plant_keys = {str(row[0]) for row in cur.fetchall()}
+
+    known_keys = set(context.instance.get_dynamic_partitions(plant_partitions.name))
+    added, removed = sorted(plant_keys - known_keys), sorted(known_keys - plant_keys)
+    if not added and not removed:
+        return SkipReason("Plant partitions are up to date")
+
+    return SensorResult(dynamic_partitions_requests=[
+        plant_partitions.build_add_request(added),
+        plant_partitions.build_delete_request(removed),
+    ])
+
 defs = Definitions(
     assets=all_assets,
-    jobs=[fusionsolar_job, file_ingestion_job, alerts_job],
-    schedules=[alert_schedule],
+    jobs=[fusionsolar_job, file_ingestion_job, ingestion_queue_job, aws_ingestion_job, alerts_job, retention_job, plant_day_job],
+    schedules=[fusionsolar_schedule, alert_schedule, retention_schedule],
+    sensors=[ingestion_queue_sensor, aws_ingestion_sensor, plant_partitions_sensor],
+    resources={
+        "postgres": PostgresResource(
+            dbname=EnvVar("POSTGRES_DB"),
+            user=EnvVar("POSTGRES_USER"),
+            password=EnvVar("POSTGRES_PASSWORD"),
+            host=EnvVar("HOST_DB"),
+            port=EnvVar("PORT_DB"),
+            max_connections=int(os.getenv("POSTGRES_POOL_MAX_CONNECTIONS", 5)),
+            statement_timeout_ms=int(os.getenv("POSTGRES_STATEMENT_TIMEOUT_MS", 5 * 60 * 1000)),
+        ),
+    },
 )
@@ -0,0 +1,16 @@
+import os
+from dagster import DailyPartitionsDefinition, DynamicPartitionsDefinition, MultiPartitionsDefinition
+
+PARTITIONS_START_DATE = os.getenv("PARTITIONS_START_DATE", "2024-01-01")
+# Partitioned assets share this pool, so backfills run at most the pool limit of partitions at once
+PLANT_PARTITION_POOL = "plant_partitions"
+
+daily_partitions = DailyPartitionsDefinition(start_date=PARTITIONS_START_DATE)
+# Keys are apiapp_plant ids, kept in sync with the plant table by plant_partitions_sensor
+plant_partitions = DynamicPartitionsDefinition(name="plant")
+plant_day_partitions = MultiPartitionsDefinition({"date": daily_partitions, "plant": plant_partitions})
+
+
+def plant_day(partition_key) -> tuple:
+    keys = partition_key.keys_by_dimension
+    return int(keys["plant"]), keys["date"]
@@ -0,0 +1,108 @@
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions, pool
+from dagster import ConfigurableResource
+
+# Pools are process-wide and keyed by connection settings, so every asset, sensor and
+# schedule evaluated in the same process borrows from one set of warm connections.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class _BoundedPool:
+    def __init__(self, min_connections: int, max_connections: int, **connect_kwargs):
+        self.pool = pool.ThreadedConnectionPool(min_connections, max_connections, **connect_kwargs)
+        # ThreadedConnectionPool raises when exhausted; the semaphore makes callers wait instead.
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.last_used = {}
+
+
+def _close_pools():
+    with _pools_lock:
+        for bounded in _pools.values():
+            bounded.pool.closeall()
+        _pools.clear()
+
+
+atexit.register(_close_pools)
+
+
+class PostgresResource(ConfigurableResource):
+    """Pooled access to the application database for the custom jobs."""
+
+    dbname: str
+    user: str
+    password: str
+    host: str
+    port: str = "5432"
+    min_connections: int = 1
+    max_connections: int = 5
+    connect_timeout_s: int = 10
+    statement_timeout_ms: int = 5 * 60 * 1000
+    # Connections idle for longer than this are pinged before being handed out.
+    health_check_after_s: int = 30
+
+    def _get_pool(self) -> _BoundedPool:
+        key = (self.dbname, self.user, self.host, self.port, self.min_connections,
+               self.max_connections, self.statement_timeout_ms)
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = _BoundedPool(
+                    self.min_connections,
+                    self.max_connections,
+                    dbname=self.dbname,
+                    user=self.user,
+                    password=self.password,
+                    host=self.host,
+                    port=self.port,
+                    connect_timeout=self.connect_timeout_s,
+                    options=f"-c statement_timeout={self.statement_timeout_ms}",
+                )
+            return _pools[key]
+
+    def _is_healthy(self, bounded: _BoundedPool, conn) -> bool:
+        if conn.closed:
+            return False
+        last_used = bounded.last_used.get(id(conn))
+        if last_used is None or time.monotonic() - last_used < self.health_check_after_s:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    @contextmanager
+    def get_connection(self):
+        """Borrow a connection from the pool; callers commit their own work."""
+        bounded = self._get_pool()
+        bounded.slots.acquire()
+        conn = None
+        try:
+            conn = bounded.pool.getconn()
+            while not self._is_healthy(bounded, conn):
+                bounded.last_used.pop(id(conn), None)
+                bounded.pool.putconn(conn, close=True)
+                conn = bounded.pool.getconn()
+
+            yield conn
+        finally:
+            if conn is not None:
+                discard = bool(conn.closed)
+                if not discard and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    try:
+                        conn.rollback()
+                    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                        discard = True
+                if discard:
+                    bounded.last_used.pop(id(conn), None)
+                else:
+                    bounded.last_used[id(conn)] = time.monotonic()
+                bounded.pool.putconn(conn, close=discard)
+            bounded.slots.release()
@@ -0,0 +1,79 @@
+import os
+
+import psycopg2
+import pytest
+
+from dagster_app import resources
+from dagster_app.resources import PostgresResource
+
+# Jobs that need the application schema are tested against a scratch database migrated by the API
+# (POSTGRES_DB=<name> python manage.py migrate). Every test empties its tables first, so the tests
+# are skipped unless TEST_POSTGRES_DB names such a database.
+TEST_POSTGRES_DB = os.getenv("TEST_POSTGRES_DB")
+
+
+def connect():
+    return psycopg2.connect(
+        dbname=TEST_POSTGRES_DB,
+        user=os.getenv("POSTGRES_USER"),
+        password=os.getenv("POSTGRES_PASSWORD"),
+        host=os.getenv("HOST_DB"),
+        port=os.getenv("PORT_DB", "5432"),
+    )
+
+
+@pytest.fixture
+def conn():
+    if not TEST_POSTGRES_DB:
+        pytest.skip("TEST_POSTGRES_DB is not set")
+    conn = connect()
+    with conn.cursor() as cur:
+        # Cascades to the plants and everything that belongs to them
+        cur.execute("TRUNCATE apiapp_user, apiapp_pipelinewatermark CASCADE")
+    conn.commit()
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def insert_plant(conn, name: str = "Plant") -> int:
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO apiapp_user (password, is_superuser, email, first_name, last_name, address, city,
+                                     country, is_active, is_staff, is_email_confirmed)
+            VALUES ('', FALSE, %s, 'Test', 'User', 'Street 1', 'Cluj', 'Romania', TRUE, FALSE, TRUE)
+            RETURNING id
+        """, (f"{name.lower().replace(' ', '-')}@example.com",))
+        user_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO apiapp_plant (ingestion_type, plant_name, created_at, devices_count, user_id)
+            VALUES ('API', %s, NOW(), 0, %s)
+            RETURNING id
+        """, (name, user_id))
+        plant_id = cur.fetchone()[0]
+    conn.commit()
+    return plant_id
+
+
+@pytest.fixture
+def plant_id(conn) -> int:
+    return insert_plant(conn)
+
+
+@pytest.fixture
+def postgres():
+    """A PostgresResource on the scratch database with a small pool; its pools are closed afterwards."""
+    if not TEST_POSTGRES_DB:
+        pytest.skip("TEST_POSTGRES_DB is not set")
+    yield PostgresResource(
+        dbname=TEST_POSTGRES_DB,
+        user=os.getenv("POSTGRES_USER"),
+        password=os.getenv("POSTGRES_PASSWORD") or "",
+        host=os.getenv("HOST_DB"),
+        port=os.getenv("PORT_DB", "5432"),
+        max_connections=2,
+        statement_timeout_ms=1500,
+    )
+    resources._close_pools()
@@ -0,0 +1,139 @@
+import random
+from datetime import date, timedelta
+
+import numpy as np
+
+from dagster_app.custom_jobs.alert_rules import METRICS, evaluate_rules
+
+EPOCH = date(1970, 1, 1)
+
+
+def build_rules(alarms: list) -> dict:
+    """alarms: (alarm_id, plant_id, metric_type, threshold_pct, window_days, min_days), sorted by plant_id."""
+    return {
+        "alarm_id": np.array([alarm[0] for alarm in alarms], dtype=np.int64),
+        "plant_id": np.array([alarm[1] for alarm in alarms], dtype=np.int64),
+        "metric": np.array([METRICS.index(alarm[2]) for alarm in alarms], dtype=np.int64),
+        "threshold_pct": np.array([alarm[3] for alarm in alarms], dtype=np.float64),
+        "window_days": np.array([alarm[4] for alarm in alarms], dtype=np.int64),
+        "min_days": np.array([alarm[5] for alarm in alarms], dtype=np.int64),
+    }
+
+
+def build_series(readings: dict) -> tuple:
+    """
+    readings: {plant_id: {day: (yield, power, specific_energy)}}. Returns (targets, window) as the
+    alert job loads them: the latest day of every plant, and all rows sorted by (plant_id, day).
+    """
+    keys = sorted((plant_id, day) for plant_id, days in readings.items() for day in days)
+    window = {
+        "plant_id": np.array([plant_id for plant_id, _ in keys], dtype=np.int64),
+        "day": np.array([day for _, day in keys], dtype=np.int64),
+        "values": np.array([readings[plant_id][day] for plant_id, day in keys], dtype=np.float64).reshape(-1, len(METRICS)).T,
+    }
+    latest = [(plant_id, max(readings[plant_id])) for plant_id in sorted(readings)]
+    targets = {
+        "plant_data_id": np.array([plant_id * 1000 + day for plant_id, day in latest], dtype=np.int64),
+        "plant_id": np.array([plant_id for plant_id, _ in latest], dtype=np.int64),
+        "read_date": np.array([EPOCH + timedelta(days=day) for _, day in latest], dtype=object),
+        "day": np.array([day for _, day in latest], dtype=np.int64),
+        "values": np.array([readings[plant_id][day] for plant_id, day in latest], dtype=np.float64).reshape(-1, len(METRICS)).T,
+    }
+    return targets, window
+
+
+def test_metric_is_compared_with_its_trailing_window():
+    readings = {1: {day: (10.0, 5.0, 1.0) for day in range(100, 107)}}
+    readings[1][107] = (4.0, 5.0, 1.0)
+    targets, window = build_series(readings)
+
+    results = evaluate_rules(build_rules([(11, 1, "yield", 80, 7, 5)]), targets, window)
+
+    # The window [day - 7, day] holds eight days, the target day included
+    assert results["avg_value"][0] == (7 * 10.0 + 4.0) / 8
+    assert results["threshold_value"][0] == results["avg_value"][0] * 0.8
+    assert results["actual_value"][0] == 4.0
+    assert results["status"].tolist() == ["triggered"]
+    assert results["triggered"].tolist() == [True]
+    assert results["plant_data_id"].tolist() == [1107]
+    assert results["read_date"].tolist() == [date(1970, 1, 1) + timedelta(days=107)]
+
+
+def test_every_alarm_of_a_plant_is_evaluated_on_its_own_metric_and_window():
+    readings = {1: {day: (10.0, 8.0, 2.0) for day in range(90, 107)}}
+    readings[1][107] = (5.0, 8.0, 2.0)
+    readings[1][104] = (1.0, 8.0, 2.0)
+    targets, window = build_series(readings)
+
+    results = evaluate_rules(build_rules([
+        (11, 1, "yield", 80, 7, 5),
+        (12, 1, "power", 80, 7, 5),
+        (13, 1, "yield", 40, 2, 1),
+        (14, 1, "yield", 40, 14, 1),
+    ]), targets, window)
+
+    assert results["status"].tolist() == ["triggered", "ok", "ok", "ok"]
+    assert results["actual_value"].tolist() == [5.0, 8.0, 5.0, 5.0]
+    assert results["avg_value"].tolist() == [(6 * 10.0 + 1.0 + 5.0) / 8, 8.0, (2 * 10.0 + 5.0) / 3, (13 * 10.0 + 1.0 + 5.0) / 15]
+
+
+def test_gaps_count_only_the_days_with_data():
+    readings = {1: {100: (10.0, 5.0, 1.0), 103: (20.0, 5.0, 1.0), 107: (3.0, 5.0, 1.0)}}
+    targets, window = build_series(readings)
+
+    results = evaluate_rules(build_rules([
+        (11, 1, "yield", 50, 7, 5),
+        (12, 1, "yield", 50, 7, 3),
+        (13, 1, "yield", 50, 3, 1),
+    ]), targets, window)
+
+    assert results["status"].tolist() == ["n/a", "triggered", "ok"]
+    assert results["avg_value"].tolist() == [-1.0, 11.0, 3.0]
+    assert results["threshold_value"].tolist() == [-1.0, 5.5, 1.5]
+    assert results["triggered"].tolist() == [False, True, False]
+
+
+def test_windows_do_not_reach_into_neighbouring_plants():
+    readings = {
+        1: {day: (100.0, 5.0, 1.0) for day in range(200, 208)},
+        2: {day: (10.0, 5.0, 1.0) for day in range(100, 104)},
+        3: {204: (10.0, 5.0, 1.0)},
+    }
+    targets, window = build_series(readings)
+
+    results = evaluate_rules(build_rules([
+        (21, 2, "yield", 80, 200, 1),
+        (31, 3, "yield", 80, 7, 2),
+    ]), targets, window)
+
+    assert results["avg_value"].tolist() == [10.0, -1.0]
+    assert results["status"].tolist() == ["ok", "n/a"]
+
+
+def test_matches_a_day_by_day_evaluation():
+    generator = random.Random(7)
+    readings = {}
+    for plant_id in range(1, 30):
+        days = sorted(generator.sample(range(1000, 1060), generator.randint(1, 40)))
+        readings[plant_id] = {day: tuple(generator.uniform(0, 50) for _ in METRICS) for day in days}
+    alarms = [
+        (alarm_id, generator.randint(1, 29), generator.choice(METRICS), generator.uniform(50, 100),
+         generator.randint(1, 30), generator.randint(0, 10))
+        for alarm_id in range(200)
+    ]
+    alarms.sort(key=lambda alarm: alarm[1])
+    targets, window = build_series(readings)
+
+    results = evaluate_rules(build_rules(alarms), targets, window)
+
+    for index, (_, plant_id, metric_type, threshold_pct, window_days, min_days) in enumerate(alarms):
+        metric = METRICS.index(metric_type)
+        target_day = max(readings[plant_id])
+        values = [values[metric] for day, values in readings[plant_id].items() if target_day - window_days <= day <= target_day]
+        actual = readings[plant_id][target_day][metric]
+        if len(values) < max(min_days, 1):
+            assert results["status"][index] == "n/a"
+            continue
+        average = sum(values) / len(values)
+        assert np.isclose(results["avg_value"][index], average)
+        assert results["status"][index] == ("triggered" if actual < average * threshold_pct / 100 else "ok")
@@ -1 +1,68 @@
+from dagster import DagsterInstance, MultiPartitionKey, SensorResult, SkipReason, build_sensor_context, materialize
 
+from dagster_app.assets import plant_day_data, plant_day_alerts
+from dagster_app.custom_jobs.csv_db_write import bulk_load_plant_data
+from dagster_app.definitions import plant_partitions_sensor
+from dagster_app.partitions import plant_day, plant_day_partitions, plant_partitions
+from dagster_app_tests.conftest import insert_plant
+
+READING = {
+    "total_string_capacity_kwp": 10.0,
+    "yield_kwh": 41.5,
+    "total_yield_kwh": 1200.0,
+    "specific_energy_kwh_per_kwp": 4.15,
+    "peak_ac_power_kw": 9.2,
+    "grid_connection_duration_h": 11.0,
+}
+
+
+def materialized(instance, partition_key: str, postgres) -> set:
+    result = materialize([plant_day_data, plant_day_alerts], partition_key=partition_key,
+                         instance=instance, resources={"postgres": postgres})
+    assert result.success
+    return {event.asset_key.path[-1] for event in result.get_asset_materialization_events()}
+
+
+def test_plant_day_reads_both_dimensions():
+    assert plant_day(MultiPartitionKey({"date": "2025-05-01", "plant": "42"})) == (42, "2025-05-01")
+    # Dimensions are joined in name order in the stored partition keys
+    assert plant_day(plant_day_partitions.get_partition_key_from_str("2025-05-01|42")) == (42, "2025-05-01")
+
+
+def test_sensor_keeps_plant_partitions_in_sync(conn, postgres):
+    first, second = insert_plant(conn, "First"), insert_plant(conn, "Second")
+    instance = DagsterInstance.ephemeral()
+    instance.add_dynamic_partitions(plant_partitions.name, [str(first), "999999"])
+
+    result = plant_partitions_sensor(build_sensor_context(instance=instance, resources={"postgres": postgres}))
+    assert isinstance(result, SensorResult)
+    add_request, delete_request = result.dynamic_partitions_requests
+    assert add_request.partition_keys == [str(second)]
+    assert delete_request.partition_keys == ["999999"]
+
+    instance.add_dynamic_partitions(plant_partitions.name, add_request.partition_keys)
+    instance.delete_dynamic_partition(plant_partitions.name, "999999")
+    assert sorted(instance.get_dynamic_partitions(plant_partitions.name)) == sorted([str(first), str(second)])
+    result = plant_partitions_sensor(build_sensor_context(instance=instance, resources={"postgres": postgres}))
+    assert isinstance(result, SkipReason)
+
+
+def test_plant_day_is_materialized_only_when_its_data_changes(conn, plant_id, postgres):
+    instance = DagsterInstance.ephemeral()
+    instance.add_dynamic_partitions(plant_partitions.name, [str(plant_id)])
+    partition_key = f"2025-05-01|{plant_id}"
+
+    # No data yet, so neither asset is materialized
+    assert materialized(instance, partition_key, postgres) == set()
+
+    bulk_load_plant_data([{"plant_id": plant_id, "read_date": "2025-05-01", **READING}], conn)
+    assert materialized(instance, partition_key, postgres) == {"plant_day_data", "plant_day_alerts"}
+    record = instance.get_latest_data_version_record(plant_day_data.key, partition_key=partition_key)
+    assert record.asset_materialization.partition == partition_key
+
+    assert materialized(instance, partition_key, postgres) == set()
+
+    bulk_load_plant_data([{"plant_id": plant_id, "read_date": "2025-05-01", **READING, "yield_kwh": 44.0}], conn)
+    assert materialized(instance, partition_key, postgres) == {"plant_day_data", "plant_day_alerts"}
+    # Other days of the plant are untouched
+    assert materialized(instance, f"2025-05-02|{plant_id}", postgres) == set()
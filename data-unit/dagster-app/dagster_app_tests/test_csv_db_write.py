@@ -0,0 +1,101 @@
+from datetime import date
+
+from dagster_app.custom_jobs.csv_db_write import bulk_load_plant_data, row_content_hash, NUMERIC_COLUMNS
+from dagster_app_tests.conftest import insert_plant
+
+READING = {
+    "total_string_capacity_kwp": 10.0,
+    "yield_kwh": 41.5,
+    "total_yield_kwh": 1200.0,
+    "specific_energy_kwh_per_kwp": 4.15,
+    "peak_ac_power_kw": 9.2,
+    "grid_connection_duration_h": 11.0,
+}
+
+
+def reading(plant_id: int, read_date: str, **changes) -> dict:
+    return {"plant_id": plant_id, "read_date": read_date, **READING, **changes}
+
+
+def plant_rows(conn, plant_id: int) -> list:
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT read_date::text, yield_kwh, is_valid, content_hash
+            FROM apiapp_plantdata
+            WHERE plant_id = %s
+            ORDER BY id
+        """, (plant_id,))
+        return cur.fetchall()
+
+
+def month_rollup(conn, plant_id: int) -> tuple:
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT days, yield_kwh
+            FROM apiapp_plantdatarollup
+            WHERE plant_id = %s AND granularity = 'month'
+        """, (plant_id,))
+        return cur.fetchone()
+
+
+def data_version(conn, plant_id: int) -> int:
+    with conn.cursor() as cur:
+        cur.execute("SELECT data_version FROM apiapp_plantversion WHERE plant_id = %s", (plant_id,))
+        row = cur.fetchone()
+        return row[0] if row else 0
+
+
+def test_duplicate_plant_days_keep_the_last_row(conn, plant_id):
+    result = bulk_load_plant_data([
+        reading(plant_id, "2025-05-01", yield_kwh=30.0),
+        reading(plant_id, "2025-05-02"),
+        reading(plant_id, "2025-05-01", yield_kwh=35.0),
+    ], conn)
+
+    assert result == {"rows_loaded": 2, "rows_unchanged": 0, "rows_superseded": 1, "rows_rejected": 0}
+    assert [row[:3] for row in plant_rows(conn, plant_id)] == [("2025-05-01", 35.0, True), ("2025-05-02", 41.5, True)]
+    assert month_rollup(conn, plant_id) == (2, 76.5)
+    assert data_version(conn, plant_id) == 1
+
+
+def test_unchanged_rows_are_skipped(conn, plant_id):
+    bulk_load_plant_data([reading(plant_id, "2025-05-01")], conn)
+    # Same values as text, as a CSV sends them
+    result = bulk_load_plant_data([{key: str(value) for key, value in reading(plant_id, "2025-05-01").items()}], conn)
+
+    assert result == {"rows_loaded": 0, "rows_unchanged": 1, "rows_superseded": 0, "rows_rejected": 0}
+    values = [READING[column] for column in NUMERIC_COLUMNS]
+    assert plant_rows(conn, plant_id) == [
+        ("2025-05-01", 41.5, True, row_content_hash(plant_id, values, date(2025, 5, 1))),
+    ]
+    assert month_rollup(conn, plant_id) == (1, 41.5)
+    assert data_version(conn, plant_id) == 1
+
+
+def test_changed_rows_supersede_the_stored_row(conn, plant_id):
+    other_plant_id = insert_plant(conn, "Other plant")
+    bulk_load_plant_data([reading(plant_id, "2025-05-01"), reading(other_plant_id, "2025-05-01")], conn)
+    result = bulk_load_plant_data([reading(plant_id, "2025-05-01", yield_kwh=40.0)], conn)
+
+    assert result == {"rows_loaded": 1, "rows_unchanged": 0, "rows_superseded": 1, "rows_rejected": 0}
+    assert [row[:3] for row in plant_rows(conn, plant_id)] == [("2025-05-01", 41.5, False), ("2025-05-01", 40.0, True)]
+    assert month_rollup(conn, plant_id) == (1, 40.0)
+    assert data_version(conn, plant_id) == 2
+    # Untouched plants keep their rows, rollups and version
+    assert [row[:3] for row in plant_rows(conn, other_plant_id)] == [("2025-05-01", 41.5, True)]
+    assert data_version(conn, other_plant_id) == 1
+
+
+def test_unusable_rows_are_rejected(conn, plant_id):
+    result = bulk_load_plant_data([
+        reading(plant_id, "2025-05-01"),
+        reading(plant_id, "not a date"),
+        reading(plant_id, "2025-05-02", yield_kwh="abc"),
+        {"plant_id": plant_id, "read_date": "2025-05-03"},
+        reading(plant_id + 1000, "2025-05-04"),
+        5,
+        "row",
+    ], conn)
+
+    assert result == {"rows_loaded": 1, "rows_unchanged": 0, "rows_superseded": 0, "rows_rejected": 6}
+    assert [row[0] for row in plant_rows(conn, plant_id)] == ["2025-05-01"]
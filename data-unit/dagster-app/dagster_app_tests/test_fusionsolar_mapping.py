@@ -0,0 +1,79 @@
+from datetime import date
+
+import pytest
+
+from dagster_app.custom_jobs.fusionsolar_mapping import rollup_inverter_rows
+
+DEVICE_PLANTS = {"SN-1": 7, "SN-2": 7, "SN-3": 8}
+
+
+def inverter_row(serial_number, read_date="2025-05-01", **values) -> dict:
+    row = {
+        "Inverter SN": serial_number,
+        "Statistical Period": read_date,
+        "Total String Capacity (kWp)": 10.0,
+        "Yield (kWh)": 40.0,
+        "Total Yield (kWh)": 1000.0,
+        "Peak AC Power (kW)": 8.0,
+        "Grid Connection Duration (h)": 11.0,
+    }
+    row.update(values)
+    return row
+
+
+def test_inverters_roll_up_per_plant_and_day():
+    plant_rows, stats = rollup_inverter_rows([
+        inverter_row("SN-1"),
+        inverter_row("sn-2 ", **{"Yield (kWh)": 20.0, "Peak AC Power (kW)": 9.5}),
+        inverter_row("SN-3", "2025/05/02"),
+        inverter_row("SN-1", "2025-05-02 00:00:00"),
+    ], DEVICE_PLANTS)
+
+    rows = {(row["plant_id"], row["read_date"]): row for row in plant_rows}
+    assert rows[(7, date(2025, 5, 1))] == {
+        "plant_id": 7,
+        "read_date": date(2025, 5, 1),
+        "total_string_capacity_kwp": 20.0,
+        "yield_kwh": 60.0,
+        "total_yield_kwh": 2000.0,
+        "peak_ac_power_kw": 9.5,
+        "grid_connection_duration_h": 11.0,
+        "specific_energy_kwh_per_kwp": 3.0,
+    }
+    assert rows[(8, date(2025, 5, 2))]["yield_kwh"] == 40.0
+    assert rows[(7, date(2025, 5, 2))]["yield_kwh"] == 40.0
+    assert stats == {"inverter_rows": 4, "unknown_devices": 0, "unusable_rows": 0, "plant_days": 3}
+
+
+def test_unknown_and_unusable_rows_are_skipped():
+    plant_rows, stats = rollup_inverter_rows([
+        inverter_row("SN-1"),
+        inverter_row("SN-9"),
+        inverter_row("SN-2", "not a date"),
+        inverter_row("SN-2", **{"Yield (kWh)": None}),
+        inverter_row("SN-2", **{"Peak AC Power (kW)": "n/a"}),
+    ], DEVICE_PLANTS)
+
+    assert [(row["plant_id"], row["yield_kwh"]) for row in plant_rows] == [(7, 40.0)]
+    assert stats == {"inverter_rows": 5, "unknown_devices": 1, "unusable_rows": 3, "plant_days": 1}
+
+
+def test_plant_day_without_usable_rows_is_not_loaded_as_zeros():
+    plant_rows, stats = rollup_inverter_rows([inverter_row("SN-3", **{"Yield (kWh)": None})], DEVICE_PLANTS)
+    assert plant_rows == []
+    assert stats["unusable_rows"] == 1
+
+
+def test_missing_report_column_raises():
+    row = inverter_row("SN-1")
+    del row["Total Yield (kWh)"]
+    with pytest.raises(ValueError, match="total_yield_kwh"):
+        rollup_inverter_rows([row], DEVICE_PLANTS)
+
+
+def test_alternative_column_names_are_recognised():
+    row = inverter_row("SN-1")
+    row["Energy (kWh)"] = row.pop("Yield (kWh)")
+    row["SN"] = row.pop("Inverter SN")
+    plant_rows, _ = rollup_inverter_rows([row], DEVICE_PLANTS)
+    assert plant_rows[0]["yield_kwh"] == 40.0
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import threading
+
+import pytest
+
+from dagster_app.custom_jobs import file_handling, ingestion_queue
+from dagster_app_tests.conftest import connect
+
+READING = {
+    "total_string_capacity_kwp": 10.0,
+    "yield_kwh": 41.5,
+    "total_yield_kwh": 1200.0,
+    "specific_energy_kwh_per_kwp": 4.15,
+    "peak_ac_power_kw": 9.2,
+    "grid_connection_duration_h": 11.0,
+}
+
+
+@pytest.fixture
+def staging_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_handling, "STAGING_DIR", str(tmp_path))
+    return tmp_path
+
+
+def stage(staging_dir, body: bytes, file_type: str = "json") -> str:
+    # Content-addressed like the API's shared payloads
+    ref = f"{hashlib.sha256(body).hexdigest()}.{file_type}"
+    (staging_dir / ref).write_bytes(body)
+    return ref
+
+
+def enqueue(conn, plant_id: int, payload_ref: str, file_type: str = "json") -> int:
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO apiapp_ingestionqueueitem (plant_id, payload_ref, file_type, status, enqueued_at, batch_id, attempts)
+            VALUES (%s, %s, %s, 'pending', NOW(), '', 0)
+            RETURNING id
+        """, (plant_id, payload_ref, file_type))
+        item_id = cur.fetchone()[0]
+    conn.commit()
+    return item_id
+
+
+def statuses(conn) -> dict:
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, status FROM apiapp_ingestionqueueitem")
+        return dict(cur.fetchall())
+
+
+def stored_yields(conn, plant_id: int) -> list:
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT read_date::text, yield_kwh
+            FROM apiapp_plantdata
+            WHERE plant_id = %s AND is_valid = TRUE
+            ORDER BY read_date
+        """, (plant_id,))
+        return cur.fetchall()
+
+
+def test_unreadable_payloads_fail_without_the_batch(conn, plant_id, staging_dir):
+    good = enqueue(conn, plant_id, stage(staging_dir, json.dumps([{**READING, "read_date": "2025-05-01"}]).encode()))
+    not_objects = enqueue(conn, plant_id, stage(staging_dir, b"[5]"))
+    not_json = enqueue(conn, plant_id, stage(staging_dir, b'"abc"'))
+    bad_csv = enqueue(conn, plant_id, stage(staging_dir, b"read_date,yield_kwh\n\xff\xfe\n", "csv"), "csv")
+
+    result = ingestion_queue.drain_ingestion_queue_batch(conn, "batch-1")
+
+    assert result["payloads_claimed"] == 4
+    assert result["payloads_invalid"] == 3
+    assert result["rows_loaded"] == 1
+    assert statuses(conn) == {good: "done", not_objects: "failed", not_json: "failed", bad_csv: "failed"}
+    assert stored_yields(conn, plant_id) == [("2025-05-01", 41.5)]
+    assert os.listdir(staging_dir) == []
+
+
+def test_later_payloads_win_within_a_batch(conn, plant_id, staging_dir):
+    for yield_kwh in (30.0, 35.0, 41.5):
+        enqueue(conn, plant_id, stage(staging_dir, json.dumps(
+            [{**READING, "yield_kwh": yield_kwh, "read_date": "2025-05-01"}]
+        ).encode()))
+
+    items = ingestion_queue.claim_queue_batch(conn, "batch-1", 10)
+    assert [item["id"] for item in items] == sorted(item["id"] for item in items)
+    with conn.cursor() as cur:
+        cur.execute("UPDATE apiapp_ingestionqueueitem SET status = 'pending'")
+    conn.commit()
+
+    ingestion_queue.drain_ingestion_queue_batch(conn, "batch-2")
+    assert stored_yields(conn, plant_id) == [("2025-05-01", 41.5)]
+
+
+def test_shared_payload_is_kept_while_queued(conn, plant_id, staging_dir):
+    ref = stage(staging_dir, json.dumps([{**READING, "read_date": "2025-05-01"}]).encode())
+    enqueue(conn, plant_id, ref)
+    enqueue(conn, plant_id, ref)
+
+    ingestion_queue.drain_ingestion_queue_batch(conn, "batch-1", limit=1)
+    assert (staging_dir / ref).exists()
+
+    ingestion_queue.drain_ingestion_queue_batch(conn, "batch-2", limit=1)
+    assert not (staging_dir / ref).exists()
+
+
+def test_cleanup_waits_for_a_payload_being_queued(conn, plant_id, staging_dir):
+    ref = stage(staging_dir, json.dumps([{**READING, "read_date": "2025-05-01"}]).encode())
+    enqueue(conn, plant_id, ref)
+
+    # Stands in for an API request that publishes the same payload again and queues it
+    api_conn = connect()
+    try:
+        with api_conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", (file_handling.STAGED_PAYLOAD_LOCK, ref))
+        drain = threading.Thread(target=ingestion_queue.drain_ingestion_queue_batch, args=(conn, "batch-1"))
+        drain.start()
+        drain.join(timeout=1)
+        assert drain.is_alive()
+
+        enqueue(api_conn, plant_id, ref)
+        drain.join(timeout=10)
+    finally:
+        api_conn.close()
+
+    assert not drain.is_alive()
+    assert (staging_dir / ref).exists()
+
+
+def test_failed_load_releases_the_batch(conn, plant_id, staging_dir, monkeypatch):
+    item_id = enqueue(conn, plant_id, stage(staging_dir, json.dumps([{**READING, "read_date": "2025-05-01"}]).encode()))
+
+    def broken_load(rows, conn):
+        conn.rollback()
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(ingestion_queue, "bulk_load_plant_data", broken_load)
+    with pytest.raises(RuntimeError):
+        ingestion_queue.drain_ingestion_queue_batch(conn, "batch-1")
+    assert statuses(conn) == {item_id: "pending"}
+    assert len(os.listdir(staging_dir)) == 1
@@ -0,0 +1,83 @@
+import threading
+
+from psycopg2 import extensions
+
+from dagster_app_tests.conftest import connect
+
+
+def backend_pid(conn) -> int:
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_backend_pid()")
+        return cur.fetchone()[0]
+
+
+def test_connections_are_reused_with_the_configured_timeout(postgres):
+    with postgres.get_connection() as conn:
+        first = backend_pid(conn)
+        with conn.cursor() as cur:
+            cur.execute("SHOW statement_timeout")
+            assert cur.fetchone()[0] == "1500ms"
+        conn.commit()
+    with postgres.get_connection() as conn:
+        assert backend_pid(conn) == first
+
+
+def test_uncommitted_work_is_rolled_back_on_return(postgres):
+    with postgres.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("CREATE TEMP TABLE leftover (id int)")
+    with postgres.get_connection() as conn:
+        assert conn.get_transaction_status() == extensions.TRANSACTION_STATUS_IDLE
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('pg_temp.leftover')")
+            assert cur.fetchone()[0] is None
+
+
+def test_broken_connections_are_replaced(postgres):
+    with postgres.get_connection() as conn:
+        conn.close()
+    with postgres.get_connection() as conn:
+        first = backend_pid(conn)
+        conn.commit()
+
+    # Terminated behind the pool's back, as a database restart would; found by the health check
+    killer = connect()
+    try:
+        with killer.cursor() as cur:
+            cur.execute("SELECT pg_terminate_backend(%s)", (first,))
+        killer.commit()
+    finally:
+        killer.close()
+    postgres_checked = postgres.model_copy(update={"health_check_after_s": 0})
+    with postgres_checked.get_connection() as conn:
+        assert backend_pid(conn) != first
+
+
+def test_borrowers_wait_for_a_free_connection(postgres):
+    holding = threading.Semaphore(0)
+    release = threading.Event()
+    borrowed = threading.Event()
+
+    def hold():
+        with postgres.get_connection():
+            holding.release()
+            release.wait(5)
+
+    def borrow():
+        with postgres.get_connection():
+            borrowed.set()
+
+    # Both connections of the pool are taken, so a third borrower waits instead of failing
+    holders = [threading.Thread(target=hold) for _ in range(2)]
+    for holder in holders:
+        holder.start()
+    for _ in holders:
+        assert holding.acquire(timeout=5)
+    borrower = threading.Thread(target=borrow)
+    borrower.start()
+    assert not borrowed.wait(0.3)
+
+    release.set()
+    assert borrowed.wait(5)
+    for thread in holders + [borrower]:
+        thread.join()
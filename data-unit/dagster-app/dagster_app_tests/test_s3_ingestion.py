@@ -0,0 +1,125 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from botocore.exceptions import ClientError
+from moto.server import ThreadedMotoServer
+
+from dagster_app.custom_jobs import s3_ingestion
+from dagster_app.custom_jobs.file_handling import iter_staged_rows
+
+BUCKET = "plant-exports"
+SETTINGS = {
+    "region": "eu-central-1",
+    "access_key_id": "testing",
+    "secret_access_key": "testing",
+}
+
+
+@pytest.fixture(scope="module")
+def s3_endpoint():
+    """A local S3-compatible stand-in, reached over HTTP like AWS or MinIO."""
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+@pytest.fixture
+def client(s3_endpoint, monkeypatch):
+    monkeypatch.setattr(s3_ingestion, "S3_ENDPOINT_URL", s3_endpoint)
+    client = s3_ingestion._s3_client(SETTINGS)
+    client.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": SETTINGS["region"]})
+    client.put_object(Bucket=BUCKET, Key="plant-7/2025-05-01.csv",
+                      Body=b"read_date,yield_kwh\n2025-05-01,41.5\n")
+    client.put_object(Bucket=BUCKET, Key="plant-7/2025-05-02.json",
+                      Body=json.dumps([{"read_date": "2025-05-02", "yield_kwh": 38.0}]).encode())
+    client.put_object(Bucket=BUCKET, Key="plant-7/notes.txt", Body=b"not a payload")
+    client.put_object(Bucket=BUCKET, Key="plant-8/2025-05-01.csv", Body=b"read_date,yield_kwh\n")
+    yield client
+
+    for obj in client.list_objects_v2(Bucket=BUCKET).get("Contents", []):
+        client.delete_object(Bucket=BUCKET, Key=obj["Key"])
+    client.delete_bucket(Bucket=BUCKET)
+
+
+@pytest.fixture
+def staging_dir(tmp_path, monkeypatch):
+    # Not created: the poller has to cope with an empty staging volume
+    staging = tmp_path / "staging"
+    monkeypatch.setattr(s3_ingestion, "STAGING_DIR", str(staging))
+    return staging
+
+
+def test_lists_only_new_or_changed_payloads(client):
+    objects = s3_ingestion.list_new_objects(client, BUCKET, "plant-7/", {})
+    assert [(obj["key"], obj["file_type"]) for obj in objects] == [
+        ("plant-7/2025-05-01.csv", "csv"),
+        ("plant-7/2025-05-02.json", "json"),
+    ]
+
+    checkpoint = {obj["key"]: obj["etag"] for obj in objects}
+    assert s3_ingestion.list_new_objects(client, BUCKET, "plant-7/", checkpoint) == []
+
+    client.put_object(Bucket=BUCKET, Key="plant-7/2025-05-01.csv",
+                      Body=b"read_date,yield_kwh\n2025-05-01,42.0\n")
+    changed = s3_ingestion.list_new_objects(client, BUCKET, "plant-7/", checkpoint)
+    assert [obj["key"] for obj in changed] == ["plant-7/2025-05-01.csv"]
+
+
+def test_downloads_into_a_missing_staging_dir(client, staging_dir):
+    objects = s3_ingestion.list_new_objects(client, BUCKET, "plant-7/", {})
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        paths = s3_ingestion._download_all(executor, client, BUCKET, objects)
+
+    assert all(os.path.dirname(path) == str(staging_dir) for path in paths)
+    rows = [row for obj, path in zip(objects, paths) for row in iter_staged_rows(path, obj["file_type"], 7)]
+    assert [(row["read_date"], float(row["yield_kwh"]), row["plant_id"]) for row in rows] == [
+        ("2025-05-01", 41.5, 7),
+        ("2025-05-02", 38.0, 7),
+    ]
+
+
+def test_failed_download_discards_the_plants_other_downloads(client, staging_dir):
+    objects = s3_ingestion.list_new_objects(client, BUCKET, "plant-7/", {})
+    objects.append(dict(objects[0], key="plant-7/deleted-meanwhile.csv"))
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        with pytest.raises(ClientError):
+            s3_ingestion._download_all(executor, client, BUCKET, objects)
+    assert os.listdir(staging_dir) == []
+
+
+def test_unreadable_objects_are_checkpointed_without_failing_the_poll(client, staging_dir, conn, plant_id):
+    client.put_object(Bucket=BUCKET, Key="plant-7/2025-05-03.json", Body=b"[5]")
+    client.put_object(Bucket=BUCKET, Key="plant-7/2025-05-04.json", Body=b"{broken")
+    client.put_object(Bucket=BUCKET, Key="plant-7/2025-05-05.csv", Body=b"read_date,yield_kwh\n\xff\xfe\n")
+    client.put_object(Bucket=BUCKET, Key="plant-7/2025-05-06.json", Body=json.dumps([{
+        "read_date": "2025-05-06", "total_string_capacity_kwp": 10.0, "yield_kwh": 41.5, "total_yield_kwh": 1200.0,
+        "specific_energy_kwh_per_kwp": 4.15, "peak_ac_power_kw": 9.2, "grid_connection_duration_h": 11.0,
+    }]).encode())
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO apiapp_awsingestionsettings (plant_id, bucket_name, region, access_key_id, secret_access_key,
+                                                     file_prefix, polling_interval_minutes)
+            VALUES (%s, %s, %s, %s, %s, 'plant-7/', 60)
+        """, (plant_id, BUCKET, SETTINGS["region"], SETTINGS["access_key_id"], SETTINGS["secret_access_key"]))
+    conn.commit()
+
+    result = s3_ingestion.poll_s3_plants(conn, [plant_id])
+    assert result["plants_failed"] == 0
+    assert result["objects_downloaded"] == 6
+    assert result["objects_unreadable"] == 3
+    assert result["rows_loaded"] == 1
+    # The fixture's objects lack the other PlantData columns, so the loader rejects their rows
+    assert result["rows_rejected"] == 2
+    with conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM apiapp_awsingestedobject WHERE plant_id = %s", (plant_id,))
+        assert cur.fetchone()[0] == 6
+
+    result = s3_ingestion.poll_s3_plants(conn, [plant_id])
+    assert result["objects_downloaded"] == 0
+    assert result["objects_unreadable"] == 0
+    assert os.listdir(staging_dir) == []
@@ -0,0 +1,88 @@
+import functools
+import os
+import shutil
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openpyxl import Workbook
+
+from dagster_app.custom_jobs.scrape_inverter import run_fusionsolar_scraper, discard_export
+from dagster_app.custom_jobs.xlsx_reader import iter_xlsx_rows
+
+PORTAL_DIR = os.path.join(os.path.dirname(__file__), "fusionsolar_portal")
+CHROME_BIN = os.getenv("CHROME_BIN", "/usr/bin/chromium")
+CHROMEDRIVER_PATH = os.getenv("CHROMEDRIVER_PATH", "/usr/local/bin/chromedriver")
+
+REPORT_HEADER = ["Statistical Period", "Inverter SN", "Yield (kWh)", "Peak AC Power (kW)"]
+REPORT_ROWS = [
+    ["2025-05-01", "102345", 41.5, 9.2],
+    ["2025-05-01", "102346", 38.0, 8.7],
+]
+
+
+@pytest.fixture
+def portal(tmp_path):
+    """Serves the static stand-in of the FusionSolar portal, with a small inverter report to download."""
+    site = tmp_path / "site"
+    shutil.copytree(PORTAL_DIR, site)
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.append(["Inverter Report"])
+    worksheet.append(REPORT_HEADER)
+    for row in REPORT_ROWS:
+        worksheet.append(row)
+    workbook.save(site / "Inverter Report.xlsx")
+
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=str(site))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def download_dirs(tmp_path, monkeypatch):
+    downloads = tmp_path / "downloads"
+    downloads.mkdir()
+    monkeypatch.setenv("DAGSTER_DOWNLOAD_DIR", str(downloads))
+    monkeypatch.setenv("FUSION_PROFILE_DIR", str(tmp_path / "profiles"))
+    return downloads
+
+
+@pytest.mark.skipif(not (os.path.exists(CHROME_BIN) and os.path.exists(CHROMEDRIVER_PATH)),
+                    reason="Chromium and chromedriver are not installed")
+def test_exports_inverter_report_from_stand_in_portal(portal, download_dirs):
+    account = {"url": f"{portal}/index.html", "user": "operator", "password": "secret"}
+    [report_path] = run_fusionsolar_scraper([account])
+
+    assert os.path.dirname(os.path.dirname(report_path)) == str(download_dirs)
+    rows = list(iter_xlsx_rows(report_path))
+    assert [(row["Inverter SN"], row["Yield (kWh)"]) for row in rows] == [("102345", 41.5), ("102346", 38.0)]
+
+    discard_export(report_path)
+    assert os.listdir(download_dirs) == []
+
+
+def test_discard_export_removes_only_the_export_directory(download_dirs, tmp_path):
+    export_dir = download_dirs / "account-1"
+    export_dir.mkdir()
+    report = export_dir / "Inverter Report.xlsx"
+    report.write_bytes(b"report")
+    outside = tmp_path / "elsewhere"
+    outside.mkdir()
+    stray = outside / "Inverter Report.xlsx"
+    stray.write_bytes(b"report")
+    loose = download_dirs / "Inverter Report.xlsx"
+    loose.write_bytes(b"report")
+
+    discard_export(str(report))
+    discard_export(str(stray))
+    discard_export(str(loose))
+
+    assert not export_dir.exists()
+    assert stray.exists()
+    assert loose.exists()
@@ -0,0 +1,155 @@
+import threading
+
+import pytest
+
+from dagster_app.custom_jobs import insert_alerts
+from dagster_app.custom_jobs.csv_db_write import PLANTDATA_WRITE_LOCK, bulk_load_plant_data
+from dagster_app.custom_jobs.insert_alerts import ALERTS_WATERMARK, insert_new_alert_logs
+from dagster_app.custom_jobs.watermarks import lock_watermark, set_watermark, plantdata_high_water_mark
+from dagster_app_tests.conftest import connect, insert_plant
+
+READING = {
+    "total_string_capacity_kwp": 10.0,
+    "yield_kwh": 41.5,
+    "total_yield_kwh": 1200.0,
+    "specific_energy_kwh_per_kwp": 4.15,
+    "peak_ac_power_kw": 9.2,
+    "grid_connection_duration_h": 11.0,
+}
+
+
+def insert_alarm(conn, plant_id: int):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO apiapp_alarmplant (threshold_value, metric_type, plant_id, is_active, min_days, window_days)
+            VALUES (80, 'yield', %s, TRUE, 1, 7)
+        """, (plant_id,))
+    conn.commit()
+
+
+def load(conn, plant_id: int, read_date: str):
+    bulk_load_plant_data([{"plant_id": plant_id, "read_date": read_date, **READING}], conn)
+
+
+def watermark(conn, name: str = ALERTS_WATERMARK):
+    with conn.cursor() as cur:
+        cur.execute("SELECT value FROM apiapp_pipelinewatermark WHERE name = %s", (name,))
+        row = cur.fetchone()
+    conn.commit()
+    return row[0] if row else None
+
+
+def max_plantdata_id(conn) -> int:
+    with conn.cursor() as cur:
+        cur.execute("SELECT MAX(id) FROM apiapp_plantdata")
+        high = cur.fetchone()[0]
+    conn.commit()
+    return high
+
+
+def test_watermark_starts_at_zero_and_never_moves_back(conn):
+    with conn.cursor() as cur:
+        assert lock_watermark(cur, "test") == 0
+        set_watermark(cur, "test", 10)
+        set_watermark(cur, "test", 5)
+    conn.commit()
+    assert watermark(conn, "test") == 10
+
+
+def test_overlapping_runs_wait_for_the_watermark(conn):
+    with conn.cursor() as cur:
+        lock_watermark(cur, "test")
+    conn.commit()
+
+    with conn.cursor() as cur:
+        lock_watermark(cur, "test")
+        locked = threading.Event()
+
+        def overlapping_run():
+            other = connect()
+            try:
+                with other.cursor() as other_cur:
+                    lock_watermark(other_cur, "test")
+                    locked.set()
+                other.rollback()
+            finally:
+                other.close()
+
+        thread = threading.Thread(target=overlapping_run)
+        thread.start()
+        assert not locked.wait(0.5)
+        set_watermark(cur, "test", 7)
+    conn.commit()
+    assert locked.wait(5)
+    thread.join()
+
+
+def test_high_water_mark_waits_for_loads_in_progress(conn, plant_id):
+    load(conn, plant_id, "2025-05-01")
+    loader = connect()
+    try:
+        with loader.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (PLANTDATA_WRITE_LOCK,))
+        result = []
+
+        def alert_run():
+            alert_conn = connect()
+            try:
+                result.append(plantdata_high_water_mark(alert_conn))
+            finally:
+                alert_conn.close()
+
+        thread = threading.Thread(target=alert_run)
+        thread.start()
+        thread.join(0.5)
+        assert thread.is_alive()
+
+        load(loader, plant_id, "2025-05-02")
+        thread.join(5)
+    finally:
+        loader.close()
+    assert result == [max_plantdata_id(conn)]
+
+
+def test_alerts_count_evaluated_and_skipped_plants(conn):
+    with_data, without_data, without_alarm = (insert_plant(conn, name) for name in ("With data", "Without data", "Without alarm"))
+    insert_alarm(conn, with_data)
+    insert_alarm(conn, without_data)
+    load(conn, with_data, "2025-05-01")
+    load(conn, without_alarm, "2025-05-01")
+
+    result = insert_new_alert_logs(conn)
+    assert (result["plants_evaluated"], result["plants_skipped"], result["alarms_evaluated"]) == (1, 1, 1)
+    assert watermark(conn) == max_plantdata_id(conn)
+
+    # Nothing new since the watermark
+    result = insert_new_alert_logs(conn)
+    assert (result["plants_evaluated"], result["plants_skipped"], result["alarms_evaluated"]) == (0, 2, 0)
+
+    # A partition run evaluates its plant-day again and leaves the watermark alone
+    result = insert_new_alert_logs(conn, with_data, "2025-05-01")
+    assert (result["plants_evaluated"], result["plants_skipped"]) == (1, 0)
+    load(conn, with_data, "2025-05-02")
+    high = watermark(conn)
+    insert_new_alert_logs(conn, with_data, "2025-05-02")
+    assert watermark(conn) == high
+
+
+def test_watermark_moves_only_after_a_successful_evaluation(conn, plant_id, monkeypatch):
+    insert_alarm(conn, plant_id)
+    load(conn, plant_id, "2025-05-01")
+
+    def failing_evaluation(rules, targets, window):
+        raise RuntimeError("evaluation failed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(insert_alerts, "evaluate_rules", failing_evaluation)
+        with pytest.raises(RuntimeError):
+            insert_new_alert_logs(conn)
+    conn.rollback()
+    assert watermark(conn) is None
+
+    # The next run picks up the same rows
+    result = insert_new_alert_logs(conn)
+    assert result["plants_evaluated"] == 1
+    assert watermark(conn) == max_plantdata_id(conn)
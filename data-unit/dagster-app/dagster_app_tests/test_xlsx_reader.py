@@ -0,0 +1,82 @@
+import tempfile
+
+import pytest
+from openpyxl import Workbook
+
+from dagster_app.custom_jobs import xlsx_reader
+from dagster_app.custom_jobs.xlsx_reader import iter_xlsx_rows, report_sheet_names
+
+REPORT_HEADER = ["Statistical Period", "Inverter SN", "Yield (kWh)", "Peak AC Power (kW)"]
+# More rows than fit in one spooled chunk
+ROWS_PER_SHEET = xlsx_reader.SPOOL_CHUNK_ROWS + 500
+
+
+@pytest.fixture
+def report_path(tmp_path):
+    """An export continued over two sheets, followed by a summary sheet with another header."""
+    workbook = Workbook()
+    for index, sheet_name in enumerate(["Report", "Report (2)"]):
+        worksheet = workbook.active if index == 0 else workbook.create_sheet(sheet_name)
+        worksheet.title = sheet_name
+        worksheet.append(["Inverter Report"])
+        worksheet.append(REPORT_HEADER)
+        for n in range(ROWS_PER_SHEET):
+            # Serials stored as numbers, as spreadsheet programs save them
+            worksheet.append(["2025-05-01", 100000 + index * ROWS_PER_SHEET + n, f" {n % 50} ", "-"])
+        worksheet.append([None, None, None, None])
+    summary = workbook.create_sheet("Summary")
+    summary.append(["Inverter Report"])
+    summary.append(["Total Yield (kWh)"])
+    summary.append([1234.5])
+    path = tmp_path / "Inverter Report.xlsx"
+    workbook.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch):
+    # Set through the environment so that pool workers pick it up however they are started
+    spool_dir = tmp_path / "spool"
+    spool_dir.mkdir()
+    monkeypatch.setenv("TMPDIR", str(spool_dir))
+    monkeypatch.setattr(tempfile, "tempdir", None)
+    return spool_dir
+
+
+@pytest.fixture
+def parallel(monkeypatch):
+    monkeypatch.setattr(xlsx_reader, "PARALLEL_MIN_BYTES", 0)
+    monkeypatch.setattr(xlsx_reader, "PARALLEL_WORKERS", 2)
+
+
+def expected_rows():
+    return [
+        {"Statistical Period": "2025-05-01", "Inverter SN": str(100000 + n),
+         "Yield (kWh)": float(n % ROWS_PER_SHEET % 50), "Peak AC Power (kW)": None}
+        for n in range(2 * ROWS_PER_SHEET)
+    ]
+
+
+def test_report_sheets_share_the_first_header(report_path):
+    assert report_sheet_names(report_path) == ["Report", "Report (2)"]
+
+
+def test_rows_are_typed_and_read_in_workbook_order(report_path):
+    assert list(iter_xlsx_rows(report_path)) == expected_rows()
+
+
+def test_pool_yields_the_same_rows_and_leaves_no_spool(report_path, spool_dir, parallel):
+    assert list(iter_xlsx_rows(report_path)) == expected_rows()
+    assert list(spool_dir.iterdir()) == []
+
+
+def test_pool_spool_is_removed_when_reading_stops_early(report_path, spool_dir, parallel):
+    rows = iter_xlsx_rows(report_path)
+    assert next(rows)["Inverter SN"] == "100000"
+    rows.close()
+    assert list(spool_dir.iterdir()) == []
+
+
+def test_missing_report_is_an_error(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        list(iter_xlsx_rows(str(tmp_path / "missing.xlsx")))
@@ -7,5 +7,5 @@ setup(
         "dagster",
         "dagster-cloud"
     ],
-    extras_require={"dev": ["dagster-webserver", "pytest"]},
+    extras_require={"dev": ["dagster-webserver", "pytest", "moto[server]"]},
 )